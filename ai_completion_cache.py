@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from common import log_to_file
+
+AI_CACHE_DIR = 'ai_cache'
+AI_CACHE_MEMORY_SIZE = 256  # Wpisy trzymane w pamięci (LRU)
+AI_CACHE_DISK_SIZE = 5000  # Wpisy na dysku; najdawniej używane są usuwane
+AI_CACHE_RESCAN_INTERVAL = 100  # Zapisy, po których indeks dysku jest budowany od nowa (wpisy innych procesów)
+
+
+def normalize_message_text(message_text):
+    """Tekst do klucza cache - ta sama wiadomość z innymi odstępami daje ten sam klucz"""
+    return " ".join(str(message_text or "").split())
+
+
+def completion_key(message_text, partial_signal_data, model):
+    """Adres treści: skrót SHA-256 znormalizowanej wiadomości, znanych pól i modelu"""
+    payload = json.dumps({
+        "text": normalize_message_text(message_text),
+        "fields": partial_signal_data,
+        "model": model,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AICompletionCache:
+    """
+    Cache odpowiedzi modelu uzupełniającego pola sygnału, adresowany treścią (completion_key).
+
+    Dwa poziomy: LRU w pamięci oraz pliki ai_cache/<2 znaki klucza>/<klucz>.json.
+    Odczyt z dysku odświeża czas modyfikacji pliku, a po przekroczeniu max_disk usuwane są
+    pliki najdawniej używane. Zapis przez plik tymczasowy i os.replace, więc kilka procesów
+    (np. batch_parsing) może współdzielić katalog: klucz spoza indeksu jest jeszcze sprawdzany
+    na dysku, a przed usuwaniem (i co rescan_interval zapisów) indeks jest budowany od nowa.
+    """
+
+    def __init__(self, cache_dir=AI_CACHE_DIR, max_memory=AI_CACHE_MEMORY_SIZE, max_disk=AI_CACHE_DISK_SIZE,
+                 rescan_interval=AI_CACHE_RESCAN_INTERVAL):
+        self.cache_dir = cache_dir
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.rescan_interval = rescan_interval
+        self._puts_since_scan = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk_index = None  # klucz -> mtime, budowany przy pierwszym użyciu dysku
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_disk_index(self):
+        if self._disk_index is not None:
+            return
+        index = {}
+        if os.path.isdir(self.cache_dir):
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.json'):
+                        try:
+                            index[entry.name[:-5]] = entry.stat().st_mtime
+                        except OSError:
+                            pass  # Usunięty przez inny proces w trakcie skanowania
+        self._disk_index = index
+        self._puts_since_scan = 0
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        self._puts_since_scan += 1
+        if len(self._disk_index) <= self.max_disk and self._puts_since_scan < self.rescan_interval:
+            return
+        # Indeks zna tylko własne zapisy - liczba i czasy użycia z bieżącego stanu katalogu
+        self._disk_index = None
+        self._load_disk_index()
+        excess = len(self._disk_index) - self.max_disk
+        if excess <= 0:
+            return
+        for key in sorted(self._disk_index, key=self._disk_index.get)[:excess]:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._disk_index[key]
+
+    def get(self, key):
+        """Zapisane pola dla klucza albo None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            self._load_disk_index()
+            path = self._path(key)
+            # Wpis mógł zapisać inny proces po zbudowaniu indeksu
+            if key not in self._disk_index and not os.path.exists(path):
+                self.misses += 1
+                return None
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    value = json.load(file)
+                os.utime(path)
+                self._disk_index[key] = os.path.getmtime(path)
+            except FileNotFoundError:
+                # Usunięty przez inny proces (jego eviction) - zwykły brak wpisu
+                self._disk_index.pop(key, None)
+                self.misses += 1
+                return None
+            except (OSError, ValueError) as e:
+                log_to_file(f"Nieczytelny wpis cache AI {key}: {e}")
+                self._disk_index.pop(key, None)
+                self.misses += 1
+                return None
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            self._load_disk_index()
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(value, file, ensure_ascii=False)
+                os.replace(tmp_path, path)
+                self._disk_index[key] = os.path.getmtime(path)
+            except OSError as e:
+                log_to_file(f"Nie udało się zapisać wpisu cache AI {key}: {e}")
+                return
+            self._evict_disk()
+
+
+ai_completion_cache = AICompletionCache()
@@ -0,0 +1,109 @@
+"""
+Lokalna atrapa endpointu OpenAI /v1/chat/completions do testowania uzupełniania pól sygnału
+bez sieci i bez kosztów.
+
+Atrapa odpowiada stałym JSON-em z polami (--fields) po zadanym opóźnieniu (--delay-ms),
+imitującym czas odpowiedzi modelu, i liczy otrzymane zapytania.
+
+    python ai_stub_server.py --port 8089
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python main.py
+
+Tryb --check uruchamia atrapę w tle i wywołuje ask_AI_to_fill_the_signal_fields dla tej samej
+wiadomości kilka razy (z cache w katalogu tymczasowym). Raportuje czasy wywołań i liczbę
+zapytań, które dotarły do atrapy - przy działającym cache powinno to być jedno zapytanie.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FIELDS = {"signal_type": "LONG", "stop_loss": 0.95}
+
+CHECK_MESSAGE = "SIGNAL ID: #1400\nCOIN: $ARB/USDT\nEntry: 1.00\nTarget 1: 1.05\nTarget 2: 1.10"
+CHECK_PARTIAL = {"signal_id": "1400", "currency": "ARBUSDT", "signal_type": None, "entry": 1.0,
+                 "targets": [1.1], "stop_loss": None, "breakeven": None, "profit_percentage": None}
+
+
+def make_handler(fields, delay_ms, counter):
+    class StubCompletionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            with counter["lock"]:
+                counter["requests"] += 1
+            time.sleep(delay_ms / 1000)
+            body = json.dumps({
+                "id": f"chatcmpl-stub-{counter['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(fields)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubCompletionHandler
+
+
+def start_stub_server(port=0, fields=None, delay_ms=1500):
+    """Uruchamia atrapę w wątku; zwraca (serwer, bazowy URL, licznik zapytań)"""
+    counter = {"requests": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fields or DEFAULT_FIELDS, delay_ms, counter))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1", counter
+
+
+def run_check(fields, delay_ms, calls):
+    server, base_url, counter = start_stub_server(fields=fields, delay_ms=delay_ms)
+    # Klient OpenAI w common jest tworzony przy pierwszym użyciu, więc wystarczy ustawić środowisko przed wywołaniem
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    import ai_completion_cache
+    from common import ask_AI_to_fill_the_signal_fields
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ai_completion_cache.ai_completion_cache = ai_completion_cache.AICompletionCache(cache_dir)
+        for i in range(calls):
+            started = time.perf_counter()
+            # Kolejne wywołania różnią się tylko odstępami - klucz cache jest ten sam
+            result = ask_AI_to_fill_the_signal_fields(CHECK_MESSAGE + " " * i, dict(CHECK_PARTIAL))
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"Wywołanie {i + 1}: {elapsed:.1f} ms, signal_type={result.get('signal_type')}, "
+                  f"stop_loss={result.get('stop_loss')}")
+    server.shutdown()
+    print(f"Zapytania, które dotarły do atrapy: {counter['requests']} (oczekiwane: 1)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Lokalna atrapa endpointu OpenAI chat completions")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay-ms', type=float, default=1500, help="Sztuczny czas odpowiedzi modelu")
+    parser.add_argument('--fields', type=json.loads, default=DEFAULT_FIELDS, help="JSON z polami zwracanymi przez atrapę")
+    parser.add_argument('--check', action='store_true', help="Sprawdź cache ask_AI_to_fill_the_signal_fields na atrapie")
+    parser.add_argument('--calls', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.check:
+        run_check(args.fields, args.delay_ms, args.calls)
+    else:
+        server, base_url, _ = start_stub_server(args.port, args.fields, args.delay_ms)
+        print(f"Atrapa OpenAI nasłuchuje: OPENAI_BASE_URL={base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -1,7 +1,7 @@
 import json
 import re
 import os
-from binance_trading import execute_trade
+from trade_executor import execute_trade_async, record_signal_async
 from datetime import datetime
 
 # Plik do przechowywania historii sygnałów
@@ -101,14 +101,9 @@ async def process_algo_bot_message(message):
     if is_signal_new(signal_data, history):
         print(f"New signal found: {signal_data}")
         # Wykonaj transakcję
-        execute_trade(signal_data, percentage=20)
-        # Dodaj sygnał do historii
-        history.append(signal_data)
-        # Ogranicz historię do MAX_HISTORY_SIZE
-        if len(history) > MAX_HISTORY_SIZE:
-            history = history[-MAX_HISTORY_SIZE:]
-        # Zapisz historię
-        save_signal_history(history)
+        await execute_trade_async(signal_data, percentage=20)
+        # Dodaj sygnał do aktualnej historii (ograniczonej do MAX_HISTORY_SIZE)
+        await record_signal_async(signal_data)
     else:
         print(f"Signal already exists in history: {signal_data}")
 
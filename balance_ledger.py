@@ -0,0 +1,128 @@
+import threading
+import time
+
+DEFAULT_SNAPSHOT_MAX_AGE = 60  # Sekundy bez zdarzeń, po których pobierany jest nowy snapshot konta
+
+
+class BalanceLedger:
+    """
+    Pamięciowa księga sald konta.
+
+    Stan bazowy pochodzi ze snapshotu get_account, a potem jest aktualizowany zdarzeniami:
+    danymi realizacji zleceń (fills z odpowiedzi MARKET) i zdarzeniami outboundAccountPosition
+    ze strumienia danych użytkownika. Nowy snapshot pobierany jest dopiero, gdy księga jest
+    starsza niż max_age albo została unieważniona operacją, której skutków nie modelujemy
+    (np. złożenie/anulowanie OCO blokuje/odblokowuje środki).
+
+    Przy zsynchronizowanym strumieniu użytkownika (set_stream_synced) księga widzi każdą zmianę
+    sald, więc odczyt fresh=True nie pobiera wtedy snapshotu.
+    """
+
+    def __init__(self, client, metadata, max_age=DEFAULT_SNAPSHOT_MAX_AGE):
+        self.client = client
+        self.metadata = metadata
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._balances = {}
+        self._updated_at = None
+        self._stream_synced = False
+
+    def refresh(self):
+        """Pobiera pełny snapshot sald z get_account"""
+        account = self.client.get_account()
+        with self._lock:
+            self._balances = {
+                b['asset']: {"free": float(b['free']), "locked": float(b['locked'])}
+                for b in account['balances']
+            }
+            self._updated_at = time.monotonic()
+
+    def invalidate(self):
+        """Wymusza pobranie snapshotu przy następnym odczycie"""
+        with self._lock:
+            self._updated_at = None
+
+    def set_stream_synced(self, synced):
+        """
+        Stan strumienia użytkownika. Po połączeniu snapshot jest pobierany od nowa,
+        bo zdarzenia z czasu przerwy nie dotarły do księgi.
+        """
+        with self._lock:
+            if synced and not self._stream_synced:
+                self._updated_at = None
+            self._stream_synced = synced
+
+    def _ensure_fresh(self):
+        with self._lock:
+            stale = self._updated_at is None or time.monotonic() - self._updated_at > self.max_age
+        if stale:
+            self.refresh()
+
+    def get_free(self, asset, fresh=False):
+        """
+        Wolne saldo aktywa. fresh=True pobiera snapshot przed odczytem - do wyliczania ilości
+        zamykających zleceń, bo bez strumienia użytkownika księga nie widzi realizacji OCO.
+        Przy zsynchronizowanym strumieniu księga jest aktualna i snapshot nie jest potrzebny.
+        """
+        with self._lock:
+            force_refresh = fresh and not self._stream_synced
+        if force_refresh:
+            self.refresh()
+        else:
+            self._ensure_fresh()
+        with self._lock:
+            return self._balances.get(asset, {}).get("free", 0.0)
+
+    def get_total(self, asset):
+        self._ensure_fresh()
+        with self._lock:
+            entry = self._balances.get(asset, {})
+            return entry.get("free", 0.0) + entry.get("locked", 0.0)
+
+    def totals(self):
+        """Pełne saldo (wolne + zablokowane) dla wszystkich niezerowych aktywów"""
+        self._ensure_fresh()
+        with self._lock:
+            return {
+                asset: entry["free"] + entry["locked"]
+                for asset, entry in self._balances.items()
+                if entry["free"] + entry["locked"] > 0
+            }
+
+    def _adjust_free(self, asset, delta):
+        entry = self._balances.setdefault(asset, {"free": 0.0, "locked": 0.0})
+        entry["free"] = max(0.0, entry["free"] + delta)
+
+    def apply_order_fill(self, order):
+        """
+        Uwzględnia realizację zlecenia (odpowiedź create_order typu FULL) w saldach.
+        Bez listy fills prowizja jest nieznana, więc księga jest tylko unieważniana.
+        """
+        executed_qty = float(order.get('executedQty', 0))
+        if executed_qty <= 0:
+            return
+        filters = self.metadata.get_filters(order['symbol'])
+        if filters is None or 'fills' not in order:
+            self.invalidate()
+            return
+
+        quote_qty = float(order.get('cummulativeQuoteQty', 0))
+        with self._lock:
+            if self._updated_at is None:
+                return  # Brak snapshotu - pierwszy odczyt i tak pobierze aktualny stan
+            if order['side'] == 'BUY':
+                self._adjust_free(filters.base_asset, executed_qty)
+                self._adjust_free(filters.quote_asset, -quote_qty)
+            else:
+                self._adjust_free(filters.base_asset, -executed_qty)
+                self._adjust_free(filters.quote_asset, quote_qty)
+            for fill in order['fills']:
+                self._adjust_free(fill['commissionAsset'], -float(fill['commission']))
+
+    def apply_account_position(self, event):
+        """Zdarzenie outboundAccountPosition - autorytatywne salda zmienionych aktywów"""
+        with self._lock:
+            for balance in event.get('B', []):
+                self._balances[balance['a']] = {"free": float(balance['f']), "locked": float(balance['l'])}
+            if self._updated_at is not None:
+                self._updated_at = time.monotonic()
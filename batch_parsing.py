@@ -0,0 +1,98 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+from common import capture_logs, batched_logs, write_log_lines
+from signal_dispatcher import parse_message, SIGNAL_FORMATS, CHANNEL_FORMATS
+
+BATCH_CHUNK_SIZE = 100  # Wiadomości na jedno zadanie procesu roboczego
+MIN_PARALLEL_MESSAGES = 200  # Poniżej tej liczby start puli kosztuje więcej niż parsowanie
+REQUIRED_FIELDS = ('currency', 'signal_type', 'entry', 'targets', 'stop_loss')
+
+
+def _parse_chunk(texts, formats, offline):
+    """Parsuje porcję wiadomości w procesie roboczym; logi wracają razem z wynikami"""
+    with capture_logs() as lines:
+        results = [parse_message(text, formats, offline) for text in texts]
+    return results, lines
+
+
+def _chunks(texts, chunk_size):
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_messages(texts, formats=SIGNAL_FORMATS, workers=None, chunk_size=BATCH_CHUNK_SIZE, offline=True):
+    """
+    Parsuje wiele wiadomości naraz; zwraca iterator (format, dane sygnału) w kolejności wejścia.
+
+    Domyślnie offline: sygnały z 1-2 brakującymi polami (Binance Killers) są zwracane niepełne,
+    bez szablonów i bez modelu. offline=False uzupełnia je jak w trybie na żywo - każda taka
+    wiadomość nowego układu to płatne zapytanie OpenAI (do ~15 s) z każdego procesu roboczego
+    oraz zapis signal_templates.json i ai_cache.
+
+    Wiadomości są dzielone na porcje po chunk_size i parsowane w puli procesów. Każdy proces
+    zbiera logi swojej porcji, a proces nadrzędny zapisuje je jednym zapisem na porcję.
+    W toku jest najwyżej 2 * workers porcji, więc wejściem może być długi generator.
+    Krótkie wejście (< MIN_PARALLEL_MESSAGES) parsowane jest w bieżącym procesie.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(texts, chunk_size)
+
+    head = list(islice(chunks, -(-MIN_PARALLEL_MESSAGES // chunk_size)))
+    if workers == 1 or sum(len(chunk) for chunk in head) < MIN_PARALLEL_MESSAGES:
+        for chunk in chain(head, chunks):
+            with batched_logs():
+                results = [parse_message(text, formats, offline) for text in chunk]
+            yield from results
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in head:
+            pending.append(pool.submit(_parse_chunk, chunk, formats, offline))
+        for chunk in chunks:
+            if len(pending) >= 2 * workers:
+                results, lines = pending.popleft().result()
+                write_log_lines(lines)
+                yield from results
+            pending.append(pool.submit(_parse_chunk, chunk, formats, offline))
+        while pending:
+            results, lines = pending.popleft().result()
+            write_log_lines(lines)
+            yield from results
+
+
+if __name__ == '__main__':
+    from channel_registry import CONFIGURED_CHANNELS
+    from telegram_backfill import iter_corpus
+
+    parser = argparse.ArgumentParser(description="Parsuje korpus kanału (telegram_backfill.py) w trybie wsadowym")
+    parser.add_argument('--channel', action='append', help="Nazwa kanału (domyślnie wszystkie skonfigurowane)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument('--online', action='store_true',
+                        help="Uzupełniaj brakujące pola szablonem/modelem (płatne zapytania OpenAI)")
+    args = parser.parse_args()
+
+    for name in args.channel or CONFIGURED_CHANNELS:
+        texts = [record["text"] for record in iter_corpus(name) if record.get("text")]
+        started = time.perf_counter()
+        counts = {}
+        results = parse_messages(texts, CHANNEL_FORMATS[name], workers=args.workers, chunk_size=args.chunk_size,
+                                 offline=not args.online)
+        for signal_format, signal_data in results:
+            key = signal_format if signal_data else None
+            if signal_data and any(signal_data.get(field) is None for field in REQUIRED_FIELDS):
+                key = f"{signal_format} (niepełne)"
+            counts[key] = counts.get(key, 0) + 1
+        elapsed = time.perf_counter() - started
+        rate = len(texts) / elapsed if elapsed else 0
+        print(f"{name}: {len(texts)} wiadomości w {elapsed:.2f} s ({rate:,.0f}/s), sygnały: {counts}")
@@ -0,0 +1,194 @@
+"""
+Mikrobenchmark parsera Binance Killers: poprzednia implementacja (pętle re.search/re.findall
+po wzorcach budowanych przy każdym wywołaniu) kontra prekompilowany silnik jednego przejścia.
+
+Porównywana jest sama ekstrakcja pól (bez uzupełniania przez AI i walidacji). Skrypt sprawdza
+też, że obie implementacje zwracają identyczne wyniki dla każdej wiadomości.
+
+Wiadomości testowe poniżej są skonstruowane ręcznie na wzór formatów obsługiwanych przez
+parser - zrzuty w repozytorium nie zawierają wiadomości z tego kanału. Jeśli istnieje korpus
+z telegram_backfill.py (corpus/binance_killers.jsonl.gz), jego wiadomości są dołączane.
+
+    python binance_killers_parser_benchmark.py --repeat 2000
+"""
+import argparse
+import re
+import time
+
+from binance_killers_signal_chanel import _extract_binance_killers_fields
+from text_normalization import normalize_signal_text
+
+SAMPLE_MESSAGES = [
+    "📍SIGNAL ID: #1298📍\nCOIN: $ARB/USDT (3-5x)\nDirection: LONG📈\nENTRY: 0.7120 - 0.7400\n"
+    "Entry Zone: 0.7120\nTarget 1: 0.7560\nTarget 2: 0.7720\nTarget 3: 0.7950\nTarget 4: 0.8300\n"
+    "Stop-Loss: 0.6850\nMove to breakeven after hitting 0.7560",
+    "SIGNAL ID: #1301\n**COIN: ****$DOGE****/USDT** (2-5x)\nDirection: SHORT📉\nEntry: 0.3910\n"
+    "Target 1: 0.3850✅\nTarget 2: 0.3790✅\nTarget 3: 0.3700\nStop Loss: 0.4050",
+    "#SOLUSDT | LONG\nEntry: 182.40\nTargets: 186.0, 190.5, 197.0\nSL: 175.20\nBreakeven: 186.0",
+    "Crypto Signal Alert: #LINKUSDT\nDirection: LONG\nTarget 1: 14.20\nTarget 2: 14.85\nTarget 3: 15.60\n"
+    "Stop-Loss: 13.40",
+    "SIGNAL ID: #1305\nCOIN: $XRP/USDT\nDirection: LONG\nEntry Zone: 2.310\nTarget 1: 2.380Target 2: 2.450\n"
+    "Target 3: 2.540\nStop-Loss: 2.210\n🔥12.5% Profit",
+    "SIGNAL ID: #1306 ✅ Target 2 reached\n$AVAX/USDT\n🔥34.2% Profit (10x)",
+    "Market update: BTC dominance keeps rising, no new signal today. Entry levels will follow.",
+    "SIGNAL ID: #1310\nCOIN: $OP/USDT\nDirection: SHORT\nEntry: 1.8.2\nTarget 1: 1.750\nStop-Loss: 1.950",
+]
+
+
+def legacy_extract_fields(message_text):
+    """Poprzednia implementacja ekstrakcji pól (do porównania wyników i wydajności)"""
+    try:
+        if not any(keyword in message_text for keyword in ["Entry", "Target", "Stop-Loss"]):
+            return None
+
+        try:
+            message_text = message_text.encode('latin1').decode('utf-8')
+        except Exception:
+            pass
+
+        signal_id_pattern = r"SIGNAL ID: #(\d+)"
+        coin_patterns = [
+            r"\$([A-Z]+)/USDT",
+            r"\*\*COIN: \*\*\*\*\$([A-Z]+)\*\*\*\*/USDT",
+            r"#([A-Z]+)USDT \|",
+            r"Crypto Signal Alert: #([A-Z]+)USDT"
+        ]
+        direction_patterns = [
+            r"Direction: (LONG|SHORT)",
+            r"\| (LONG|SHORT)",
+            r"#[A-Z]+ \| (LONG|SHORT)"
+        ]
+        targets_patterns = [
+            r"Target \d+: ([\d.]+)(?:[^\d.]|$)",
+            r"Target \d+: ([\d.]+)✅",
+            r"Targets?: ([\d., ]+)"
+        ]
+        entry_patterns = [
+            r"Entry Zone: ([\d.]+)",
+            r"Entry: ([\d.]+)",
+            r"Target 1: ([\d.]+)"
+        ]
+        stop_loss_patterns = [
+            r"Stop-Loss: ([\d.]+)",
+            r"Stop Loss: ([\d.]+)",
+            r"SL: ([\d.]+)"
+        ]
+        breakeven_patterns = [
+            r"Move to breakeven after hitting ([\d.]+)",
+            r"Breakeven: ([\d.]+)"
+        ]
+        profit_pattern = r"🔥([\d.]+)% Profit"
+
+        signal_id = re.search(signal_id_pattern, message_text)
+
+        coin = None
+        for pattern in coin_patterns:
+            coin = re.search(pattern, message_text)
+            if coin:
+                break
+
+        direction = None
+        for pattern in direction_patterns:
+            direction = re.search(pattern, message_text)
+            if direction:
+                break
+
+        entry = None
+        for pattern in entry_patterns:
+            entry = re.search(pattern, message_text)
+            if entry:
+                break
+
+        targets = []
+        for pattern in targets_patterns:
+            if "Targets?" in pattern:
+                target_match = re.search(pattern, message_text)
+                if target_match:
+                    targets = [float(t.strip()) for t in target_match.group(1).split(",")]
+                    break
+            else:
+                targets_found = re.findall(pattern, message_text)
+                if targets_found:
+                    targets = [float(t) for t in targets_found]
+                    break
+
+        if targets and direction:
+            if direction.group(1).upper() == "LONG":
+                targets = sorted(targets)
+            elif direction.group(1).upper() == "SHORT":
+                targets = sorted(targets, reverse=True)
+
+        stop_loss = None
+        for pattern in stop_loss_patterns:
+            stop_loss = re.search(pattern, message_text)
+            if stop_loss:
+                break
+
+        breakeven = None
+        for pattern in breakeven_patterns:
+            breakeven = re.search(pattern, message_text)
+            if breakeven:
+                break
+
+        profit = re.search(profit_pattern, message_text)
+
+        return {
+            "signal_id": signal_id.group(1) if signal_id else "unknown",
+            "currency": f"{coin.group(1)}USDT" if coin else None,
+            "signal_type": direction.group(1) if direction else None,
+            "entry": float(entry.group(1)) if entry else (targets[0] if targets else None),
+            "targets": targets[1:] if len(targets) > 1 else [],
+            "stop_loss": float(stop_loss.group(1)) if stop_loss else None,
+            "breakeven": float(breakeven.group(1)) if breakeven else None,
+            "profit_percentage": float(profit.group(1)) if profit else None
+        }
+    except Exception:
+        return None
+
+
+def engine_extract_fields(message_text):
+    """Nowa ścieżka: normalizacja tekstu z dyspozytora i bramka słów kluczowych parsera"""
+    try:
+        message_text = normalize_signal_text(message_text)
+        if not any(keyword in message_text for keyword in ["Entry", "Target", "Stop-Loss"]):
+            return None
+        return _extract_binance_killers_fields(message_text)
+    except Exception:
+        return None
+
+
+def load_messages():
+    messages = list(SAMPLE_MESSAGES)
+    try:
+        from telegram_backfill import iter_corpus
+        from channel_registry import BINANCE_KILLERS_CHANNEL
+        messages += [record["text"] for record in iter_corpus(BINANCE_KILLERS_CHANNEL) if record.get("text")]
+    except Exception as e:
+        print(f"Korpus niedostępny ({e}) - tylko wiadomości przykładowe")
+    return messages
+
+
+def measure(parse, messages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            parse(message)
+    elapsed = time.perf_counter() - started
+    return repeat * len(messages) / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mikrobenchmark parsera Binance Killers")
+    parser.add_argument('--repeat', type=int, default=2000, help="Liczba przebiegów po wszystkich wiadomościach")
+    args = parser.parse_args()
+
+    messages = load_messages()
+    mismatches = [m for m in messages if legacy_extract_fields(m) != engine_extract_fields(m)]
+    print(f"Wiadomości: {len(messages)}, różnice wyników: {len(mismatches)}")
+    for message in mismatches[:5]:
+        print(f"  RÓŻNICA: {message[:80]!r}")
+
+    legacy_rate = measure(legacy_extract_fields, messages, args.repeat)
+    engine_rate = measure(engine_extract_fields, messages, args.repeat)
+    print(f"Poprzednia implementacja: {legacy_rate:,.0f} wiadomości/s")
+    print(f"Silnik jednego przejścia: {engine_rate:,.0f} wiadomości/s ({engine_rate / legacy_rate:.1f}x)")
@@ -1,17 +1,17 @@
 import json
 import re, os
-from binance_trading import execute_trade
+from trade_executor import execute_trade_async, record_signal_async
 import logging
 from datetime import datetime
-from telethon.tl.types import Channel
-from common import log_to_file, MAX_HISTORY_SIZE, load_signal_history, save_signal_history, is_signal_new, last_message_ids, ask_AI_to_fill_the_signal_fields
+from message_watermarks import message_watermarks, fetch_new_messages
+from signal_dispatcher import process_message, BINANCE_KILLERS_FORMATS
+from signal_templates import signal_templates
+from channel_registry import channel_registry, BINANCE_KILLERS_CHANNEL
+from common import log_to_file, load_signal_history, is_signal_new, ask_AI_to_fill_the_signal_fields
 
 
 async def get_binance_killers_signals_channel(client_telegram):
-    async for dialog in client_telegram.iter_dialogs():
-        if dialog.name == "Binance Killers®" and isinstance(dialog.entity, Channel):
-            return dialog.entity
-    return None
+    return await channel_registry.get_channel(client_telegram, BINANCE_KILLERS_CHANNEL)
 
 async def display_last_messages(client_telegram, limit=20):
     channel = await get_binance_killers_signals_channel(client_telegram)
@@ -30,17 +30,20 @@ async def check_binance_killers_signals_messages(client_telegram):
         print("Kanał 'Binance Killers®' nie został znaleziony.")
         return
 
-    messages = await client_telegram.get_messages(channel, limit=3)
+    messages = await fetch_new_messages(client_telegram, channel, BINANCE_KILLERS_CHANNEL)
     
     for message in messages:
-        if message.text is not None and message.id not in last_message_ids and "SIGNAL ID:" in message.text:
-            log_to_file(f"Nowa wiadomość: {message.text}")
-            print(f"Nowy sygnał: {message.text}")
-            await process_binance_killers_signal_message({
-                "text": message.text,
-                "date": message.date.isoformat() if message.date else None
-            })
-            last_message_ids.add(message.id)
+        await handle_binance_killers_message(message)
+
+async def handle_binance_killers_message(message, edited=False):
+    """Obsługuje pojedynczą wiadomość kanału (z pollingu albo zdarzenia Telethon)"""
+    if not edited and not message_watermarks.is_new(BINANCE_KILLERS_CHANNEL, message.id):
+        return
+    await process_message({
+        "text": message.text,
+        "date": message.date.isoformat() if message.date else None
+    }, BINANCE_KILLERS_FORMATS)
+    message_watermarks.advance(BINANCE_KILLERS_CHANNEL, message.id)
 
 def validate_signal_data(signal_data):
     required_fields = ['currency', 'signal_type', 'entry', 'targets', 'stop_loss']
@@ -68,113 +71,101 @@ def validate_signal_data(signal_data):
 
     return True, "Sygnał jest poprawny"
 
-def parse_binance_killers_signal_message(message_text):
+# Silnik parsera Binance Killers: jeden prekompilowany wzorzec z alternatywą wszystkich pól,
+# przechodzony raz przez finditer. Każda gałąź pochłania tylko tekst, w którym nie może zacząć
+# się dopasowanie innego pola (np. "#XYZUSDT" sprawdza " |" przez lookahead, bo "| LONG" to
+# kierunek). Dla każdego pola zapamiętywane jest pierwsze (najbardziej lewe) dopasowanie każdego
+# wariantu i wygrywa wariant o najniższym indeksie - tak jak w poprzednich pętlach re.search.
+_BK_ENGINE = re.compile(
+    r"SIGNAL ID: #(?P<signal_id_0>\d+)"
+    r"|\$(?P<coin_0>[A-Z]+)/USDT"
+    r"|\*\*COIN: \*\*\*\*\$(?P<coin_1>[A-Z]+)\*\*\*\*/USDT"
+    r"|#(?P<coin_2>[A-Z]+)USDT(?= \|)"
+    r"|Crypto Signal Alert: (?=#(?P<coin_3>[A-Z]+)USDT)"
+    r"|Direction: (?P<direction_0>LONG|SHORT)"
+    # "#XYZ | LONG" zawiera zawsze "| LONG", więc osobny wariant z "#" nie jest potrzebny
+    r"|\| (?P<direction_1>LONG|SHORT)"
+    r"|Entry Zone: (?P<entry_0>[\d.]+)"
+    r"|Entry: (?P<entry_1>[\d.]+)"
+    # "Target N: x" daje jednocześnie listę targetów i (dla N == 1) zapasowe entry;
+    # wariant z "✅" był podzbiorem tego wzorca
+    r"|Target (?P<target_number>\d+): (?P<target>[\d.]+)"
+    r"|Targets?: (?P<targets_inline>[\d., ]+)"
+    r"|Stop-Loss: (?P<stop_loss_0>[\d.]+)"
+    r"|Stop Loss: (?P<stop_loss_1>[\d.]+)"
+    r"|SL: (?P<stop_loss_2>[\d.]+)"
+    r"|Move to breakeven after hitting (?P<breakeven_0>[\d.]+)"
+    r"|Breakeven: (?P<breakeven_1>[\d.]+)"
+    r"|🔥(?P<profit_0>[\d.]+)% Profit"
+)
+
+
+def _extract_binance_killers_fields(message_text):
+    """
+    Czysta ekstrakcja pól sygnału (bez uzupełniania stop loss, AI i walidacji).
+    Wyjątek przy konwersji liczby jest przekazywany wyżej, jak w poprzedniej implementacji.
+    """
+    first = {}
+    target_values = []
+    target_1_entry = None
+    consumed_at = -1
+
+    for match in _BK_ENGINE.finditer(message_text):
+        name = match.lastgroup
+        if name == "target":
+            value = match.group("target")
+            if target_1_entry is None and match.group("target_number") == "1":
+                target_1_entry = value
+            # re.findall pochłaniał znak po wartości - target zaczynający się na nim był pomijany
+            if match.start() != consumed_at:
+                target_values.append(value)
+                consumed_at = match.end()
+        elif name not in first:
+            first[name] = match.group(name)
+
+    if target_values:
+        targets = [float(t) for t in target_values]
+    elif "targets_inline" in first:
+        targets = [float(t.strip()) for t in first["targets_inline"].split(",")]
+    else:
+        targets = []
+
+    direction = first.get("direction_0") or first.get("direction_1")
+    if targets and direction:
+        if direction == "LONG":
+            targets = sorted(targets)
+        elif direction == "SHORT":
+            targets = sorted(targets, reverse=True)
+
+    coin = first.get("coin_0") or first.get("coin_1") or first.get("coin_2") or first.get("coin_3")
+    entry = first.get("entry_0") or first.get("entry_1") or target_1_entry
+    stop_loss = first.get("stop_loss_0") or first.get("stop_loss_1") or first.get("stop_loss_2")
+    breakeven = first.get("breakeven_0") or first.get("breakeven_1")
+    profit = first.get("profit_0")
+
+    return {
+        "signal_id": first.get("signal_id_0", "unknown"),
+        "currency": f"{coin}USDT" if coin else None,
+        "signal_type": direction,
+        "entry": float(entry) if entry else (targets[0] if targets else None),
+        "targets": targets[1:] if len(targets) > 1 else [],
+        "stop_loss": float(stop_loss) if stop_loss else None,
+        "breakeven": float(breakeven) if breakeven else None,
+        "profit_percentage": float(profit) if profit else None
+    }
+
+
+def parse_binance_killers_signal_message(message_text, offline=False):
+    """
+    Dane sygnału albo None. Przy 1-2 brakujących polach uzupełnia je szablon albo model;
+    offline=True pomija to uzupełnianie (bez zapytań i zapisu stanu) i zwraca niepełny sygnał.
+    """
     try:
         # Sprawdzenie, czy wiadomość wygląda jak sygnał
         if not any(keyword in message_text for keyword in ["Entry", "Target", "Stop-Loss"]):
             return None
 
-        try:
-            message_text = message_text.encode('latin1').decode('utf-8')
-        except Exception:
-            pass
-
-        signal_id_pattern = r"SIGNAL ID: #(\d+)"
-        coin_patterns = [
-            r"\$([A-Z]+)/USDT",
-            r"\*\*COIN: \*\*\*\*\$([A-Z]+)\*\*\*\*/USDT",
-            r"#([A-Z]+)USDT \|",
-            r"Crypto Signal Alert: #([A-Z]+)USDT"
-        ]
-        direction_patterns = [
-            r"Direction: (LONG|SHORT)",
-            r"\| (LONG|SHORT)",
-            r"#[A-Z]+ \| (LONG|SHORT)"
-        ]
-        targets_patterns = [
-            r"Target \d+: ([\d.]+)(?:[^\d.]|$)",
-            r"Target \d+: ([\d.]+)✅",
-            r"Targets?: ([\d., ]+)"
-        ]
-        entry_patterns = [
-            r"Entry Zone: ([\d.]+)",
-            r"Entry: ([\d.]+)",
-            r"Target 1: ([\d.]+)"
-        ]
-        stop_loss_patterns = [
-            r"Stop-Loss: ([\d.]+)",
-            r"Stop Loss: ([\d.]+)",
-            r"SL: ([\d.]+)"
-        ]
-        breakeven_patterns = [
-            r"Move to breakeven after hitting ([\d.]+)",
-            r"Breakeven: ([\d.]+)"
-        ]
-        profit_pattern = r"🔥([\d.]+)% Profit"
-
-        signal_id = re.search(signal_id_pattern, message_text)
-        
-        coin = None
-        for pattern in coin_patterns:
-            coin = re.search(pattern, message_text)
-            if coin:
-                break
-
-        direction = None
-        for pattern in direction_patterns:
-            direction = re.search(pattern, message_text)
-            if direction:
-                break
-
-        entry = None
-        for pattern in entry_patterns:
-            entry = re.search(pattern, message_text)
-            if entry:
-                break
-
-        targets = []
-        for pattern in targets_patterns:
-            if "Targets?" in pattern:
-                target_match = re.search(pattern, message_text)
-                if target_match:
-                    targets = [float(t.strip()) for t in target_match.group(1).split(",")]
-                    break
-            else:
-                targets_found = re.findall(pattern, message_text)
-                if targets_found:
-                    targets = [float(t) for t in targets_found]
-                    break
-
-        if targets and direction:
-            if direction.group(1).upper() == "LONG":
-                targets = sorted(targets)
-            elif direction.group(1).upper() == "SHORT":
-                targets = sorted(targets, reverse=True)
-
-        stop_loss = None
-        for pattern in stop_loss_patterns:
-            stop_loss = re.search(pattern, message_text)
-            if stop_loss:
-                break
-
-        breakeven = None
-        for pattern in breakeven_patterns:
-            breakeven = re.search(pattern, message_text)
-            if breakeven:
-                break
-
-        profit = re.search(profit_pattern, message_text)
-
-        signal_data = {
-            "signal_id": signal_id.group(1) if signal_id else "unknown",
-            "currency": f"{coin.group(1)}USDT" if coin else None,
-            "signal_type": direction.group(1) if direction else None,
-            "entry": float(entry.group(1)) if entry else (targets[0] if targets else None),
-            "targets": targets[1:] if len(targets) > 1 else [],
-            "stop_loss": float(stop_loss.group(1)) if stop_loss else None,
-            "breakeven": float(breakeven.group(1)) if breakeven else None,
-            "profit_percentage": float(profit.group(1)) if profit else None
-        }
+        signal_data = _extract_binance_killers_fields(message_text)
 
         if signal_data["stop_loss"] is None and signal_data["entry"] is not None:
             if signal_data["signal_type"] == "LONG":
@@ -185,7 +176,11 @@ def parse_binance_killers_signal_message(message_text):
         required_keys = ['currency', 'signal_type', 'entry', 'targets', 'stop_loss']
         missing_fields = [key for key in required_keys if signal_data.get(key) is None]
         if missing_fields and len(missing_fields) <= 2:
-            signal_data = ask_AI_to_fill_the_signal_fields(message_text, signal_data)
+            if offline:
+                return signal_data
+            # Znany układ wiadomości uzupełniany jest lokalnie; model tylko dla nowych układów
+            signal_data = signal_templates.fill(BINANCE_KILLERS_CHANNEL, message_text, signal_data,
+                                                ask_AI_to_fill_the_signal_fields)
 
         is_valid, validation_message = validate_signal_data(signal_data)
         if not is_valid:
@@ -210,11 +205,8 @@ async def process_binance_killers_signal_message(message):
 
             if is_signal_new(signal_data, history):
                 print(f"Nowy sygnał znaleziony: {signal_data}")
-                execute_trade(signal_data, percentage=20)
-                history.append(signal_data)
-                if len(history) > MAX_HISTORY_SIZE:
-                    history = history[-MAX_HISTORY_SIZE:]
-                save_signal_history(history)
+                await execute_trade_async(signal_data, percentage=20)
+                await record_signal_async(signal_data)
             else:
                 print(f"Sygnał już istnieje w historii: {signal_data}")
         else:
@@ -0,0 +1,138 @@
+import hashlib
+import hmac
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from request_scheduler import PRIORITY_MONITOR, PRIORITY_ORDER
+
+LIVE_BASE_URL = 'https://api.binance.com'
+TESTNET_BASE_URL = 'https://testnet.binance.vision'
+
+DEFAULT_TIMEOUT = 10  # Sekundy
+DEFAULT_POOL_SIZE = 10
+
+
+@dataclass
+class RestResponse:
+    """Jednolity wynik zapytania REST, niezależnie od endpointu"""
+    ok: bool
+    status_code: int
+    data: object = None
+    error: str = None
+    error_code: int = None
+    headers: dict = field(default_factory=dict)
+    url: str = None
+
+
+class BinanceRestTransport:
+    """
+    Wspólna warstwa transportowa dla ręcznie budowanych zapytań do API Binance.
+
+    Trzyma jedną sesję requests z pulą połączeń keep-alive (bez ponownego TCP/TLS
+    handshake przy każdym zapytaniu), jedną procedurę podpisu HMAC i jeden
+    przełącznik adresu bazowego testnet/produkcja. Opcjonalny scheduler rozlicza
+    wagę każdego zapytania i odczytuje nagłówki X-MBX-USED-WEIGHT.
+    """
+
+    def __init__(self, api_key, api_secret, testnet=False, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, scheduler=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = TESTNET_BASE_URL if testnet else LIVE_BASE_URL
+        self.timeout = timeout
+        self.scheduler = scheduler
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if api_key:
+            self.session.headers['X-MBX-APIKEY'] = api_key
+
+    def sign(self, params: dict) -> str:
+        """Dodaje timestamp i zwraca podpisany query string (dokładnie ten, który zostanie wysłany)"""
+        params = dict(params)
+        params['timestamp'] = int(time.time() * 1000)
+        query_string = urlencode(params)
+        signature = hmac.new(
+            bytes(self.api_secret, 'utf-8'),
+            bytes(query_string, 'utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return f"{query_string}&signature={signature}"
+
+    def request(self, method: str, path: str, params: dict = None, signed: bool = True, weight: int = 1) -> RestResponse:
+        """
+        Wysyła zapytanie i zwraca RestResponse; wyjątki sieciowe nie są propagowane.
+        ok=True oznacza status 200 z poprawnym JSON-em, więc data nigdy nie jest wtedy None.
+        """
+        params = params or {}
+        if self.scheduler is not None:
+            # Zapytania zmieniające stan (POST/DELETE) to składanie/anulowanie zleceń
+            default_priority = PRIORITY_MONITOR if method == 'GET' else PRIORITY_ORDER
+            self.scheduler.acquire(weight, self.scheduler.current_priority(default_priority))
+
+        query_string = self.sign(params) if signed else urlencode(params)
+        url = f"{self.base_url}{path}"
+        if query_string:
+            url = f"{url}?{query_string}"
+
+        try:
+            response = self.session.request(method, url, timeout=self.timeout)
+        except requests.RequestException as e:
+            return RestResponse(ok=False, status_code=0, error=str(e), url=url)
+
+        if self.scheduler is not None:
+            self.scheduler.update_from_headers(response.headers)
+            self.scheduler.record_ban(response.status_code, response.headers)
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+
+        if response.status_code != 200:
+            error_code = data.get('code') if isinstance(data, dict) else None
+            return RestResponse(
+                ok=False,
+                status_code=response.status_code,
+                data=data,
+                error=response.text,
+                error_code=error_code,
+                headers=dict(response.headers),
+                url=response.url,
+            )
+
+        if data is None:
+            # Odpowiedź 200 bez poprawnego JSON-a (np. strona pośrednika) - błąd, a nie pusty sukces
+            return RestResponse(
+                ok=False,
+                status_code=response.status_code,
+                error=f"Niepoprawna odpowiedź JSON: {response.text[:200]}",
+                headers=dict(response.headers),
+                url=response.url,
+            )
+
+        return RestResponse(
+            ok=True,
+            status_code=response.status_code,
+            data=data,
+            headers=dict(response.headers),
+            url=response.url,
+        )
+
+    def get(self, path: str, params: dict = None, signed: bool = True, weight: int = 1) -> RestResponse:
+        return self.request('GET', path, params, signed, weight)
+
+    def post(self, path: str, params: dict = None, signed: bool = True, weight: int = 1) -> RestResponse:
+        return self.request('POST', path, params, signed, weight)
+
+    def delete(self, path: str, params: dict = None, signed: bool = True, weight: int = 1) -> RestResponse:
+        return self.request('DELETE', path, params, signed, weight)
+
+    def warm_up(self) -> bool:
+        """Otwiera połączenie z wyprzedzeniem, aby pierwsze zlecenie nie płaciło za handshake"""
+        return self.get('/api/v3/ping', signed=False).ok
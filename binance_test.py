@@ -2,7 +2,7 @@ from binance.client import Client
 from binance.enums import SIDE_BUY, SIDE_SELL, ORDER_TYPE_MARKET
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from common import get_oco_order_by_orderListId, get_all_oco_orders_for_symbol, get_all_oco_orders
+from common import get_oco_order_by_orderListId, get_all_oco_orders_for_symbol, get_all_oco_orders, trade_history
 
 
 import os, time, json
@@ -195,7 +195,7 @@ def cancel_position(symbol: str, days_back: int = 7):
         
         # Pobierz historię zleceń z ostatniego tygodnia
         start_time = int((datetime.now() - timedelta(days=days_back)).timestamp() * 1000)
-        orders_history = client.get_all_orders(symbol=symbol, startTime=start_time)
+        orders_history = trade_history.get_orders(symbol, start_time)
         
         # Znajdź ostatnie zlecenie MARKET (otwierające pozycję)
         market_orders = [o for o in orders_history if o['type'] == 'MARKET' and o['status'] == 'FILLED']
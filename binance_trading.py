@@ -1,14 +1,17 @@
 from binance.enums import SIDE_BUY, SIDE_SELL, ORDER_TYPE_MARKET
-from common import client, log_to_file, adjust_quantity, adjust_price, get_order_details, check_binance_pair_and_price, create_oco_order_direct
+from common import client, log_to_file, adjust_quantity, adjust_price, get_order_details, check_binance_pair_and_price, create_oco_order_direct, exchange_metadata, weight_scheduler, balance_ledger, store_signal
+from request_scheduler import PRIORITY_ORDER
+from user_data_stream import order_mirror
+from signal_fingerprint import signal_fingerprints
 import time, math, json
-from signal_history_manager import load_signal_history, save_signal_history
 import traceback
 
+FINAL_ORDER_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
 
 def get_available_balance(asset):
     try:
-        balance = client.get_asset_balance(asset=asset)
-        return float(balance['free'])
+        return balance_ledger.get_free(asset)
     except Exception as e:
         log_to_file(f"Błąd podczas pobierania salda: {e}")
         return 0.0
@@ -32,6 +35,44 @@ def has_open_position(symbol):
         log_to_file(f"Błąd podczas sprawdzania otwartych pozycji: {e}")
         return False
 
+def confirm_market_fill(order, base_asset):
+    """
+    Ustala realizację zlecenia MARKET bez czekania na aktualizację salda.
+
+    Źródła w kolejności: lista fills z odpowiedzi create_order (FULL), pola executedQty
+    z odpowiedzi, zdarzenie executionReport ze strumienia danych użytkownika, a na końcu get_order. Zwraca {'executedQty', 'netQty'
+    (po odjęciu prowizji pobranej w walucie bazowej), 'price' (średnia), 'status'} albo None.
+    """
+    fills = order.get('fills')
+    if fills:
+        executed_qty = sum(float(f['qty']) for f in fills)
+        quote_qty = sum(float(f['qty']) * float(f['price']) for f in fills)
+        commission = sum(float(f['commission']) for f in fills if f.get('commissionAsset') == base_asset)
+        status = order.get('status')
+    else:
+        # Bez listy fills prowizja nie jest znana - netQty równe executedQty
+        source = order if float(order.get('executedQty', 0)) > 0 else None
+        if source is None and order_mirror.synced:
+            source = order_mirror.get_order(order.get('orderId'))
+        if source is None or float(source.get('executedQty', 0)) <= 0:
+            source = get_order_details(order['symbol'], order['orderId'])
+        if not source:
+            return None
+        executed_qty = float(source.get('executedQty', 0))
+        quote_qty = float(source.get('cummulativeQuoteQty', 0))
+        commission = 0.0
+        status = source.get('status')
+
+    if executed_qty <= 0:
+        return None
+    return {
+        'executedQty': executed_qty,
+        'netQty': executed_qty - commission,
+        'price': quote_qty / executed_qty,
+        'status': status,
+    }
+
+
 def add_order_to_history(signal: dict, order: dict, order_type: str) -> None:
     if "orders" not in signal:
         signal["orders"] = []
@@ -62,7 +103,11 @@ def add_order_to_history(signal: dict, order: dict, order_type: str) -> None:
             except KeyError as ke:
                 log_to_file(f"Błąd przetwarzania raportu: {ke}")
     else:
-        full_order = get_order_details(order['symbol'], order['orderId']) if 'orderId' in order else None
+        # Odpowiedź ze stanem końcowym (np. MARKET typu FULL) nie wymaga dodatkowego get_order
+        if order.get('status') in FINAL_ORDER_STATUSES and 'origQty' in order:
+            full_order = order
+        else:
+            full_order = get_order_details(order['symbol'], order['orderId']) if 'orderId' in order else None
         
         if full_order:
             executed_qty = float(full_order.get('executedQty', 0))
@@ -97,42 +142,38 @@ def add_order_to_history(signal: dict, order: dict, order_type: str) -> None:
         
         signal["orders"].append(order_record)
     
-    history = load_signal_history()
-    updated = False
-    for i, s in enumerate(history):
-        if s["currency"] == signal["currency"] and s["date"] == signal["date"]:
-            history[i] = signal
-            updated = True
-            break
-    
-    if not updated:
-        history.append(signal)
-    
-    save_signal_history(history)
+    store_signal(signal)
 
     
 def get_min_notional(symbol):
-    info = client.get_symbol_info(symbol)
-    for f in info['filters']:
-        if f['filterType'] == 'NOTIONAL':
-            return float(f['minNotional'])
-        elif f['filterType'] == 'MIN_NOTIONAL':  # dla kompatybilności wstecznej
-            return float(f['minNotional'])
-    return 0.0  # jeśli nie znaleziono żadnego filtru notional, pozwalamy na handel
+    # 0.0 jeśli nie znaleziono żadnego filtru notional - pozwalamy na handel
+    return exchange_metadata.get_filters(symbol).min_notional
 
 
 def execute_trade(signal, percentage=20):
+    """Wykonuje transakcję dla sygnału; wszystkie zapytania idą z priorytetem zleceń"""
+    # Ten sam sygnał z innego kanału (inny format) odrzucamy przed jakimkolwiek zapytaniem do giełdy
+    if not signal_fingerprints.check_and_add(signal):
+        log_to_file(f"Duplikat sygnału {signal.get('currency')} {signal.get('signal_type')} (inny kanał lub format) - pomijam")
+        signal["status"] = "CLOSED"
+        signal["error"] = "Duplikat sygnału z innego kanału"
+        return False
+    with weight_scheduler.priority(PRIORITY_ORDER):
+        result = _execute_trade(signal, percentage)
+    if not result and signal.get("real_amount") is None:
+        # Nic nie kupiono (brak pary, saldo, błąd sieci) - kopia sygnału może jeszcze zostać obsłużona
+        signal_fingerprints.discard(signal)
+    return result
+
+
+def _execute_trade(signal, percentage):
     try:
         symbol = signal["currency"]
         log_to_file(f"Rozpoczynam przetwarzanie sygnału:\n{json.dumps(signal, indent=2)}")
         log_to_file(f"Procent kapitału: {percentage}%")
         
-        # Dodajemy explicit logowanie przed każdą operacją API
-        log_to_file("Pobieram exchange_info...")
-        exchange_info = client.get_exchange_info()
-        
         log_to_file("Szukam informacji o symbolu...")
-        symbol_info = next((s for s in exchange_info['symbols'] if s['symbol'] == symbol), None)
+        symbol_filters = exchange_metadata.get_filters(symbol)
         
         log_to_file("wykonuję walidację pary handlowej")
         validation_result = check_binance_pair_and_price(client, symbol, signal["entry"])
@@ -143,7 +184,7 @@ def execute_trade(signal, percentage=20):
             return False
         
         
-        if not symbol_info:
+        if not symbol_filters:
             log_to_file(f"Para {symbol} nie istnieje na Binance")
             signal["status"] = "CLOSED"
             signal["error"] = f"Para {symbol} nie istnieje na Binance"
@@ -165,12 +206,8 @@ def execute_trade(signal, percentage=20):
         log_to_file("Sygnał jest typu LONG")
             
         # 2. Pobranie parametrów handlowych
-        filters = {f['filterType']: f for f in symbol_info['filters']}
-        tick_size = float(filters['PRICE_FILTER']['tickSize'])
-        lot_size = float(filters['LOT_SIZE']['stepSize'])
-        
-        # Używamy nowej funkcji get_min_notional zamiast bezpośredniego dostępu
-        min_notional = get_min_notional(symbol)
+        tick_size = symbol_filters.tick_size
+        min_notional = symbol_filters.min_notional
         log_to_file(f"Uzyskałęm filtry dla symbolu: {symbol}")
         
         ticker = client.get_symbol_ticker(symbol=symbol)
@@ -197,10 +234,6 @@ def execute_trade(signal, percentage=20):
         available_balance = get_available_balance("USDT")
         log_to_file(f"Stan konta USDT przed transakcją: {available_balance}")
 
-        currency = symbol.replace('USDT', '')
-        initial_currency_balance = get_available_balance(currency)
-        log_to_file(f"Początkowe saldo {currency}: {initial_currency_balance}")
-
         # Dodajemy zabezpieczenie przed zerowymi wartościami
         if current_price <= 0:
             log_to_file(f"Błędna cena rynkowa: {current_price}")
@@ -235,6 +268,9 @@ def execute_trade(signal, percentage=20):
         log_to_file(f"Wymagane minimum (MIN_NOTIONAL): {min_notional} USDT")
 
         
+        # Zlecenie MARKET ponawiamy tylko przy błędzie wywołania - odpowiedź (nawet częściowa
+        # realizacja) oznacza, że zlecenie trafiło na rynek i nie wolno go składać drugi raz
+        market_order = None
         max_retries = 3
         for attempt in range(max_retries):
             try:
@@ -244,9 +280,7 @@ def execute_trade(signal, percentage=20):
                     type=ORDER_TYPE_MARKET,
                     quantity=quantity
                 )
-                if market_order.get('status') == 'FILLED':
-                    break
-                time.sleep(2 ** attempt)  # exponential backoff
+                break
             except Exception as e:
                 if attempt == max_retries - 1:
                     log_to_file(f"Wszystkie próby wykonania zlecenia MARKET nieudane: {str(e)}")
@@ -254,17 +288,17 @@ def execute_trade(signal, percentage=20):
                     signal["error"] = f"Wszystkie próby wykonania zlecenia MARKET nieudane: {str(e)}"
                     return False
                 continue
-        
-        time.sleep(2)  # Czekamy na aktualizację salda
-        final_balance = get_available_balance(currency)
-        balance_diff = final_balance - initial_currency_balance
-        
-        if balance_diff > 0:
-            avg_price = float(market_order.get('cummulativeQuoteQty', 0)) / balance_diff
-            log_to_file(f"Zlecenie MARKET zrealizowane. Kupiono: {balance_diff} po średniej cenie: {avg_price}")
-            
+
+        balance_ledger.apply_order_fill(market_order)
+        fill = confirm_market_fill(market_order, symbol_filters.base_asset)
+
+        if fill:
+            bought_qty = fill['netQty']
+            avg_price = fill['price']
+            log_to_file(f"Zlecenie MARKET zrealizowane ({fill['status']}). Kupiono: {bought_qty} po średniej cenie: {avg_price}")
+
             #Dodajemy real amount do sygnału
-            signal["real_amount"] = balance_diff
+            signal["real_amount"] = bought_qty
             # Dodajemy real_entry do sygnału
             signal["real_entry"] = avg_price
             if avg_price <= 0:
@@ -272,24 +306,20 @@ def execute_trade(signal, percentage=20):
                 signal["status"] = "CLOSED"
                 signal["error"] = f"Błędna cena rynkowa zakupu: {avg_price}"
                 return False
-            add_order_to_history(signal, market_order, "MARKET")
         else:
             log_to_file(f"Zlecenie MARKET nie powiodło się. Status: {market_order.get('status')}")
-            log_to_file(f"Brak zmiany salda {currency}: {initial_currency_balance} -> {final_balance}")
             signal["status"] = "CLOSED"
-            signal["error"] = f"Brak zmiany salda {currency}: {initial_currency_balance} -> {final_balance}"
-            return False    
-        
+            signal["error"] = f"Zlecenie MARKET {symbol} nie zostało zrealizowane. Status: {market_order.get('status')}"
+            return False
+
         add_order_to_history(signal, market_order, "MARKET")
-        
-        # 5. Realizacja OCO
-        time.sleep(2)
 
-        currency = symbol.replace('USDT', '')
+        # 5. Realizacja OCO - od razu po potwierdzeniu realizacji
+        currency = symbol_filters.base_asset
         currency_balance = get_available_balance(currency)
         log_to_file(f"Dostępne {currency}: {currency_balance}")
 
-        stop_loss_qty = min(balance_diff, currency_balance)
+        stop_loss_qty = min(bought_qty, currency_balance)
         oco_qty = adjust_quantity(symbol, stop_loss_qty * 0.998) 
         log_to_file(f"Użycie stop_loss_qty dla STOP_LOSS: {stop_loss_qty}")
 
@@ -306,9 +336,12 @@ def execute_trade(signal, percentage=20):
         log_to_file(f"Stop Price: {stop_price}, Stop Limit: {stop_limit_price}")
         log_to_file(f"Take Profit: {take_profit_price}")
 
-        # W sekcji realizacji OCO:
+        # W sekcji realizacji OCO (create_oco_order_direct nie rzuca wyjątków - błąd to None)
         max_retries = 3
+        last_error = None
         for attempt in range(max_retries):
+            if attempt > 0:
+                time.sleep(2 ** (attempt - 1))  # Exponential backoff tylko między próbami
             try:
                 oco_order = create_oco_order_direct(
                     client=client,
@@ -319,26 +352,27 @@ def execute_trade(signal, percentage=20):
                     stop_price=stop_price,
                     stop_limit_price=stop_limit_price
                 )
-                
-                if oco_order and 'orderListId' in oco_order:
-                    log_to_file("OCO order aktywowany pomyślnie")
-                    signal["oco_order_id"] = oco_order['orderListId']
-                    signal["status"] = "OPEN"
-                    add_order_to_history(signal, oco_order, "OCO_ORDER")
-                    return True  # Zmiana: natychmiastowy return po sukcesie
-                else:
-                     log_to_file(f"Nie udało się utworzyć OCO zlecenia, odpowiedź: {oco_order}")
-                    
             except Exception as e:
-                if attempt == max_retries - 1:
-                    log_to_file(f"Wszystkie próby utworzenia OCO nieudane: {str(e)}")
-                    signal["error"] = f"Wszystkie próby utworzenia OCO nieudane: {str(e)}"
-                    return False
+                oco_order = None
+                last_error = str(e)
 
-                
-                continue
-                        
-        return True
+            if oco_order and oco_order.get('orderListId') is not None:
+                log_to_file("OCO order aktywowany pomyślnie")
+                order_mirror.track_oco(oco_order)
+                signal["oco_order_id"] = oco_order['orderListId']
+                signal["status"] = "OPEN"
+                add_order_to_history(signal, oco_order, "OCO_ORDER")
+                return True  # Zmiana: natychmiastowy return po sukcesie
+            log_to_file(f"Nie udało się utworzyć OCO zlecenia (próba {attempt + 1}/{max_retries}), odpowiedź: {oco_order}")
+
+        # Kupiona pozycja bez stop-lossa - zamykamy ją od razu zamiast zostawiać bez ochrony
+        from signal_history_manager import handle_critical_error
+        log_to_file(f"Wszystkie próby utworzenia OCO dla {symbol} nieudane - awaryjne zamknięcie pozycji")
+        handle_critical_error(signal)
+        signal["status"] = "CLOSED"
+        reason = f": {last_error}" if last_error else ""
+        signal["error"] = f"Wszystkie próby utworzenia OCO nieudane{reason} - pozycja zamknięta awaryjnie"
+        return False
         
     except Exception as e:
         error_trace = traceback.format_exc()
@@ -349,17 +383,8 @@ def execute_trade(signal, percentage=20):
         return False
     
     finally:
-        # Aktualizacja historii sygnałów
-        history = load_signal_history()
-        
-        # Znajdujemy i nadpisujemy cały sygnał w historii
-        for idx, hist_signal in enumerate(history):
-            if (hist_signal["currency"] == signal["currency"] and 
-                hist_signal["date"] == signal["date"]):
-                history[idx] = signal
-                break
-                
-        save_signal_history(history)
+        # Aktualizacja historii sygnałów - nadpisujemy cały sygnał (pod wspólną blokadą historii)
+        store_signal(signal, append=False)
 
 
 
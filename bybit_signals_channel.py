@@ -1,14 +1,13 @@
-from telethon.tl.types import Channel
+from channel_registry import channel_registry, BYBIT_SIGNALS_CHANNEL
 import re, os
-from binance_trading import execute_trade
+from trade_executor import execute_trade_async, record_signal_async
 from datetime import datetime
-from common import log_to_file, MAX_HISTORY_SIZE, load_signal_history, save_signal_history, is_signal_new, last_message_ids, create_telegram_client
+from common import log_to_file, load_signal_history, is_signal_new, create_telegram_client
+from message_watermarks import message_watermarks, fetch_new_messages
+from signal_dispatcher import process_message, BYBIT_SIGNALS_FORMATS
 
 async def get_bybit_signals_channel(client):
-    async for dialog in client.iter_dialogs():
-        if dialog.name == "Bybit Crypto Signals (Free)" and isinstance(dialog.entity, Channel):
-            return dialog.entity
-    return None
+    return await channel_registry.get_channel(client, BYBIT_SIGNALS_CHANNEL)
 
 async def display_last_messages(client_telegram):
     channel = await get_bybit_signals_channel(client_telegram)
@@ -31,9 +30,6 @@ def parse_signal_message_byBit_standard(message_text):
 
         log_to_file(f"Rozpoczynam parsowanie wiadomości:\n{message_text}")
         
-        # Normalizacja tekstu
-        message_text = message_text.replace('ń…', 'x').replace('đź', '').replace('х', 'x').replace('👉', '')
-        
         # Wykrywanie negatywnych markerów
         negative_markers = ["All entry targets achieved", "All targets achieved", "targets achieved", "Cancelled"]
         if any(marker in message_text for marker in negative_markers):
@@ -231,11 +227,8 @@ async def process_byBit_standard_message(message):
     history = load_signal_history()
     if is_signal_new(signal_data, history):
         log_to_file(f"Processing new signal for {signal_data['currency']}")
-        execute_trade(signal_data, percentage=20)
-        history.append(signal_data)
-        if len(history) > MAX_HISTORY_SIZE:
-            history = history[-MAX_HISTORY_SIZE:]
-        save_signal_history(history)
+        await execute_trade_async(signal_data, percentage=20)
+        await record_signal_async(signal_data)
     else:
         log_to_file(f"Signal already exists in history for {signal_data['currency']}")
 
@@ -245,14 +238,17 @@ async def check_bybit_signals_messages(client_telegram):
         log_to_file("Kanał 'Bybit Crypto Signals (Free)' nie został znaleziony.")
         return
 
-    messages = await client_telegram.get_messages(channel, limit=5)
+    messages = await fetch_new_messages(client_telegram, channel, BYBIT_SIGNALS_CHANNEL, initial_limit=5)
     
     for message in messages:
-        if message and message.id not in last_message_ids and hasattr(message, 'text') and message.text:
-            if '#' in message.text and any(marker in message.text for marker in ['Entry', 'Take-Profit']):
-                log_to_file(f"Nowa wiadomość z Bybit: {message.text}")
-                await process_byBit_standard_message({
-                    "text": message.text,
-                    "date": message.date.isoformat() if message.date else None
-                })
-                last_message_ids.add(message.id)
+        await handle_bybit_signals_message(message)
+
+async def handle_bybit_signals_message(message, edited=False):
+    """Obsługuje pojedynczą wiadomość kanału (z pollingu albo zdarzenia Telethon)"""
+    if not message or (not edited and not message_watermarks.is_new(BYBIT_SIGNALS_CHANNEL, message.id)):
+        return
+    await process_message({
+        "text": getattr(message, 'text', None),
+        "date": message.date.isoformat() if message.date else None
+    }, BYBIT_SIGNALS_FORMATS)
+    message_watermarks.advance(BYBIT_SIGNALS_CHANNEL, message.id)
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+from telethon.errors import RPCError
+from telethon.tl.types import Channel, InputPeerChannel
+
+from common import log_to_file
+
+CHANNEL_REGISTRY_FILE = 'channel_registry.json'
+
+# Nazwy wyświetlane obsługiwanych kanałów
+CRYPTO_SIGNALS_CHANNEL = "Crypto Signals"
+BINANCE_KILLERS_CHANNEL = "Binance Killers®"
+BYBIT_SIGNALS_CHANNEL = "Bybit Crypto Signals (Free)"
+
+CONFIGURED_CHANNELS = (CRYPTO_SIGNALS_CHANNEL, BINANCE_KILLERS_CHANNEL, BYBIT_SIGNALS_CHANNEL)
+
+
+class ChannelRegistry:
+    """
+    Trwałe mapowanie nazwa kanału -> (peer id, access_hash).
+
+    Kanał jest wyszukiwany po nazwie w liście dialogów tylko raz; potem pobierany jest
+    bezpośrednio z InputPeerChannel (jedno zapytanie zamiast przeglądania wszystkich dialogów).
+    Wpis jest rozwiązywany ponownie wyłącznie wtedy, gdy pobranie po peer id się nie powiedzie.
+    """
+
+    def __init__(self, path=CHANNEL_REGISTRY_FILE, names=CONFIGURED_CHANNELS):
+        self.path = path
+        self.names = tuple(names)
+        self._lock = threading.Lock()
+        self._peers = self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except (OSError, ValueError) as e:
+                log_to_file(f"Nie udało się wczytać rejestru kanałów: {e}")
+        return {}
+
+    def _save(self):
+        with self._lock:
+            data = dict(self._peers)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _remember(self, name, entity):
+        with self._lock:
+            self._peers[name] = {"id": entity.id, "access_hash": entity.access_hash}
+
+    def forget(self, name):
+        with self._lock:
+            removed = self._peers.pop(name, None)
+        if removed is not None:
+            self._save()
+
+    def get_input_peer(self, name):
+        entry = self._peers.get(name)
+        if entry is None:
+            return None
+        return InputPeerChannel(channel_id=entry["id"], access_hash=entry["access_hash"])
+
+    async def _resolve_from_dialogs(self, client_telegram, name):
+        """Jedno przejście po dialogach; zapamiętuje przy okazji wszystkie brakujące kanały"""
+        wanted = set(self.names) | {name}
+        found = None
+        async for dialog in client_telegram.iter_dialogs():
+            if dialog.name in wanted and isinstance(dialog.entity, Channel):
+                self._remember(dialog.name, dialog.entity)
+                if dialog.name == name:
+                    found = dialog.entity
+                wanted.discard(dialog.name)
+                if not wanted:
+                    break
+        self._save()
+        return found
+
+    async def get_channel(self, client_telegram, name):
+        """Zwraca encję kanału o podanej nazwie albo None"""
+        peer = self.get_input_peer(name)
+        if peer is not None:
+            try:
+                return await client_telegram.get_entity(peer)
+            except (ValueError, RPCError) as e:
+                log_to_file(f"Kanał '{name}' niedostępny po zapisanym peer id ({e}) - ponowne wyszukiwanie")
+                self.forget(name)
+        return await self._resolve_from_dialogs(client_telegram, name)
+
+
+channel_registry = ChannelRegistry()
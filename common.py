@@ -1,21 +1,22 @@
 from binance.client import Client
 from dotenv import load_dotenv
-import os, math, time, json
+import os, math, time, json, threading
+from contextlib import contextmanager
 from datetime import datetime
 from telethon import TelegramClient
-import requests
-from urllib.parse import urlencode, quote
 
 from openai import OpenAI
 
-import traceback
-import hmac, hashlib
+
+from exchange_metadata import ExchangeMetadataCache
+from binance_rest import BinanceRestTransport
+from request_scheduler import RequestWeightScheduler, ScheduledClient
+from trade_history_cache import TradeHistoryCache
+from balance_ledger import BalanceLedger
 
 SIGNAL_HISTORY_FILE = 'signal_history.json'
 MAX_HISTORY_SIZE = 50  # Maksymalna liczba sygnałów w historii
 
-last_message_ids = set()
-
 currency_aliases = {
     "BSV": ["BCHSV"],     # Bitcoin SV
     "BTC": ["XBT"],       # Bitcoin
@@ -48,10 +49,53 @@ def create_telegram_client(session_name):
     return TelegramClient(session_name, api_id, api_hash)
 
 
+LOG_FILE = "logfile.txt"
+
+# Bufor linii logu bieżącego wątku, aktywny wewnątrz capture_logs()
+_log_capture = threading.local()
+
 def log_to_file(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("logfile.txt", "a", encoding="utf-8") as log_file:
-        log_file.write(f"[{timestamp}] {message}\n")
+    line = f"[{timestamp}] {message}\n"
+    lines = getattr(_log_capture, 'lines', None)
+    if lines is not None:
+        lines.append(line)
+        return
+    with open(LOG_FILE, "a", encoding="utf-8") as log_file:
+        log_file.write(line)
+
+def write_log_lines(lines):
+    """Zapisuje zebrane linie logu jednym otwarciem pliku (albo do aktywnego capture_logs)"""
+    active = getattr(_log_capture, 'lines', None)
+    if active is not None:
+        active.extend(lines)
+    elif lines:
+        with open(LOG_FILE, "a", encoding="utf-8") as log_file:
+            log_file.writelines(lines)
+
+@contextmanager
+def capture_logs():
+    """
+    Zbiera linie log_to_file z bieżącego wątku do listy zamiast zapisywać je do pliku.
+    Zebrane linie trzeba zapisać samodzielnie (write_log_lines) - np. w procesie nadrzędnym.
+    """
+    previous = getattr(_log_capture, 'lines', None)
+    lines = []
+    _log_capture.lines = lines
+    try:
+        yield lines
+    finally:
+        _log_capture.lines = previous
+
+@contextmanager
+def batched_logs():
+    """Logi z wnętrza bloku trafiają do pliku jednym zapisem na jego końcu"""
+    lines = []
+    try:
+        with capture_logs() as lines:
+            yield lines
+    finally:
+        write_log_lines(lines)
 
 load_dotenv()
 testmode = os.getenv('TESTMODE', 'false').lower() == 'true'
@@ -59,40 +103,61 @@ api_key = os.getenv('BINANCE_API_KEY')
 api_secret = os.getenv('BINANCE_API_SECRET')
 
 if testmode:
-    client = Client(api_key, api_secret, testnet=True)
+    raw_client = Client(api_key, api_secret, testnet=True)
 else:
-    client = Client(api_key, api_secret)
+    raw_client = Client(api_key, api_secret)
+
+# Cały ruch do Binance przechodzi przez planistę wagi zapytań (zlecenia przed monitoringiem)
+weight_scheduler = RequestWeightScheduler()
+client = ScheduledClient(raw_client, weight_scheduler)
+
+# Jeden cache exchangeInfo dla całego procesu
+exchange_metadata = ExchangeMetadataCache(client)
+
+# Przyrostowa historia transakcji/zleceń per para (kursory fromId/orderId)
+trade_history = TradeHistoryCache(client)
+
+# Księga sald: snapshot get_account + aktualizacje z realizacji zleceń i strumienia użytkownika
+balance_ledger = BalanceLedger(client, exchange_metadata)
+
+# Wspólny, podpisujący transport REST z pulą połączeń keep-alive dla ręcznych endpointów
+rest_transport = BinanceRestTransport(api_key, api_secret, testnet=testmode, scheduler=weight_scheduler)
 
 def adjust_quantity(symbol: str, quantity: float) -> float:
     """Dostosowuje ilość do wymogów LOT_SIZE"""
-    symbol_info = client.get_symbol_info(symbol)
-    lot_filter = next(filter(lambda x: x['filterType'] == 'LOT_SIZE', symbol_info['filters']))
-    
-    step_size = float(lot_filter['stepSize'])
-    min_qty = float(lot_filter['minQty'])
+    filters = exchange_metadata.get_filters(symbol)
+    step_size = filters.step_size
     
-    precision = int(round(-math.log(step_size, 10), 0))
-    quantity = max(min_qty, quantity)
+    quantity = max(filters.min_qty, quantity)
     quantity = round(quantity / step_size) * step_size
     
-    return float('{:.{}f}'.format(quantity, precision))
+    return float('{:.{}f}'.format(quantity, filters.quantity_precision))
 
 def adjust_price(symbol: str, price: float) -> float:
     """Dostosowuje cenę do wymogów PRICE_FILTER"""
-    symbol_info = client.get_symbol_info(symbol)
-    price_filter = next(filter(lambda x: x['filterType'] == 'PRICE_FILTER', symbol_info['filters']))
-    
-    tick_size = float(price_filter['tickSize'])
-    precision = int(round(-math.log(tick_size, 10), 0))
+    filters = exchange_metadata.get_filters(symbol)
+    tick_size = filters.tick_size
     price = round(price / tick_size) * tick_size
     
-    return float('{:.{}f}'.format(price, precision))
+    return float('{:.{}f}'.format(price, filters.price_precision))
+
+def get_price_snapshot(symbols=None) -> dict:
+    """
+    Pobiera jednym zapytaniem ceny wszystkich par (spójny obraz rynku dla całego cyklu).
+    Opcjonalnie zawęża wynik do podanych symboli.
+    """
+    tickers = client.get_symbol_ticker()
+    prices = {ticker['symbol']: float(ticker['price']) for ticker in tickers}
+    if symbols is not None:
+        prices = {symbol: prices[symbol] for symbol in symbols if symbol in prices}
+    return prices
 
 def get_order_details(symbol: str, order_id: int, max_retries: int = 3) -> dict:
     """Pobiera szczegóły zlecenia z obsługą ponownych prób"""
     for attempt in range(max_retries):
         try:
-            time.sleep(2 ** attempt)  # Exponential backoff
+            if attempt > 0:
+                time.sleep(2 ** (attempt - 1))  # Exponential backoff tylko między próbami
             order = client.get_order(**{
                 'symbol': symbol,
                 'orderId': order_id
@@ -117,10 +182,6 @@ def check_binance_pair_and_price(client, pair, entry_level):
         dict: Wynik sprawdzenia zawierający status i ewentualnie cenę lub błąd
     """
     try:
-        # Pobierz wszystkie dostępne pary handlowe z Binance
-        exchange_info = client.get_exchange_info()
-        symbols = [symbol['symbol'] for symbol in exchange_info['symbols']]
-
         # Usuń znak '/' z pary i rozdziel na base i quote
         formatted_pair = pair.replace('/', '')
         base_currency = formatted_pair.replace('USDT', '')
@@ -143,7 +204,7 @@ def check_binance_pair_and_price(client, pair, entry_level):
         # Znajdź pierwszą dostępną parę
         found_pair = None
         for test_pair in possible_pairs:
-            if test_pair in symbols:
+            if exchange_metadata.has_symbol(test_pair):
                 found_pair = test_pair
                 break
 
@@ -202,6 +263,78 @@ def save_signal_history(history):
     with open(SIGNAL_HISTORY_FILE, 'w') as file:
         json.dump(history, file, indent=4)
 
+TRADING_PROCESS_LOCK_FILE = 'trading_process.lock'
+_trading_process_lock = None
+
+def claim_trading_process(name):
+    """
+    Zajmuje blokadę procesu handlującego; False, jeśli trzyma ją inny proces.
+
+    main.py (polling/zdarzenia) i server.py (webhook) handlują na tych samych kanałach, a
+    history_lock i odciski sygnałów działają tylko w obrębie procesu - uruchomione razem
+    mogłyby kupić ten sam sygnał dwa razy. Blokada systemowa znika razem z procesem.
+    """
+    global _trading_process_lock
+    file = open(TRADING_PROCESS_LOCK_FILE, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        try:
+            file.seek(0)
+            owner = file.read().strip() or "inny proces"
+        except OSError:
+            owner = "inny proces"
+        file.close()
+        log_to_file(f"{name}: handel prowadzi już {owner} - webhook i main.py nie mogą działać razem")
+        return False
+    file.seek(0)
+    file.truncate()
+    file.write(f"{name} (pid {os.getpid()})")
+    file.flush()
+    _trading_process_lock = file
+    return True
+
+# Wspólna blokada pliku historii: monitor, wątek transakcji i przetwarzanie wiadomości zapisują
+# go równolegle, więc każde wczytanie -> zmiana -> zapis musi odbywać się pod tą blokadą
+history_lock = threading.RLock()
+
+def update_signal_history(modify):
+    """
+    Wczytuje historię, wywołuje modify(history) i zapisuje wynik - całość pod history_lock.
+    modify zmienia listę w miejscu albo zwraca nową listę. Zwraca zapisaną historię.
+    """
+    with history_lock:
+        history = load_signal_history()
+        result = modify(history)
+        if result is not None:
+            history = result
+        save_signal_history(history)
+        return history
+
+def store_signal(signal, append=True, limit=None):
+    """
+    Zastępuje w historii sygnał o tej samej parze i dacie; gdy go nie ma, dopisuje go (append=True).
+    Pozostałe wpisy są brane z pliku, więc zmiany zapisane w międzyczasie nie giną.
+    Przy podanym limit zachowywane jest tylko limit najnowszych wpisów.
+    """
+    def replace(history):
+        for i, existing_signal in enumerate(history):
+            if existing_signal["currency"] == signal["currency"] and existing_signal["date"] == signal["date"]:
+                history[i] = signal
+                break
+        else:
+            if append:
+                history.append(signal)
+        if limit is not None and len(history) > limit:
+            return history[-limit:]
+    return update_signal_history(replace)
+
 def is_signal_new(signal, history):
     """
     Sprawdza, czy sygnał jest nowy (nie istnieje w historii).
@@ -230,35 +363,11 @@ def verify_oco_order(client, symbol, order_list_id):
     Returns:
         dict: Status zlecenia OCO
     """
-    try:
-        params = {
-            'orderListId': order_list_id,
-            'timestamp': int(time.time() * 1000)
-        }
-        
-        query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-        signature = client._generate_signature(query_string)
-        params['signature'] = signature
-        
-        headers = {
-            'X-MBX-APIKEY': client.API_KEY
-        }
-        
-        response = requests.get(
-            f'{client.API_URL}/api/v3/orderList',
-            params=params,
-            headers=headers
-        )
-        
-        if response.status_code != 200:
-            log_to_file(f"Błąd podczas weryfikacji zlecenia OCO: {response.text}")
-            return None
-            
-        return response.json()
-        
-    except Exception as e:
-        log_to_file(f"Wyjątek podczas weryfikacji zlecenia OCO: {str(e)}")
+    response = rest_transport.get('/api/v3/orderList', {'orderListId': order_list_id}, weight=4)
+    if not response.ok:
+        log_to_file(f"Błąd podczas weryfikacji zlecenia OCO: {response.error}")
         return None
+    return response.data
     
 def test_api_keys():
     log_to_file("=== Testing API Keys ===")
@@ -288,6 +397,9 @@ def get_all_oco_orders_for_symbol(client, symbol, only_active=False):
     Pobiera i filtruje zlecenia OCO dla danego symbolu, z opcją filtrowania tylko aktywnych,
     oraz dodaje informacje o statusach zleceń.
 
+    Koszt jest stały: jedno pobranie list OCO i jedno pobranie zleceń symbolu,
+    zindeksowanych po orderListId (zamiast pobierania allOrders dla każdego OCO).
+
     Args:
         client: Obiekt klienta Binance.
         symbol (str): Symbol pary handlowej (np. "BTCUSDT").
@@ -304,6 +416,10 @@ def get_all_oco_orders_for_symbol(client, symbol, only_active=False):
     filtered_oco_orders = [
         order for order in all_oco_orders if order['symbol'] == symbol
     ]
+    if not filtered_oco_orders:
+        return filtered_oco_orders
+
+    reports_by_list_id = get_orders_by_list_id(client, symbol)
 
     if only_active:
         # Filtracja aktywnych zleceń. Status 'NEW', 'PARTIALLY_FILLED', 'PENDING_CANCEL' są aktywne
@@ -311,12 +427,12 @@ def get_all_oco_orders_for_symbol(client, symbol, only_active=False):
         filtered_oco_orders = [
             order for order in filtered_oco_orders
             if order['listStatusType'] in ['EXEC_STARTED', 'ALL_DONE'] and # Sprawdzamy status całej listy
-            any(report['status'] in active_statuses for report in get_order_reports(client, order['orderListId'],symbol)) # Sprawdzamy status każdego zlecenia
+            any(report['status'] in active_statuses for report in reports_by_list_id.get(order['orderListId'], [])) # Sprawdzamy status każdego zlecenia
         ]
 
     # Dodawanie statusów zleceń (orderReports)
     for oco_order in filtered_oco_orders:
-      oco_order['orderReports'] = get_order_reports(client, oco_order['orderListId'],symbol)
+        oco_order['orderReports'] = reports_by_list_id.get(oco_order['orderListId'], [])
 
     return filtered_oco_orders
 
@@ -324,137 +440,41 @@ def get_all_oco_orders(client):
     """
     Pobiera wszystkie zlecenia OCO dla konta, używając bezpośrednich zapytań HTTP do API Binance.
     """
-    try:
-        # Create base parameters (bez symbolu)
-        params = {
-            'timestamp': int(time.time() * 1000)
-        }
-
-        # Create query string with proper encoding
-        query_string = '&'.join([f"{k}={v}" for k, v in sorted(params.items())])
-
-        # Generate signature
-        signature = hmac.new(
-            bytes(client.API_SECRET, 'utf-8'),
-            bytes(query_string, 'utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Add signature to params after generating it
-        params['signature'] = signature
-
-        headers = {
-            'X-MBX-APIKEY': client.API_KEY
-        }
-
-        base_url = 'https://testnet.binance.vision' if testmode else 'https://api.binance.com' # Używaj globalnej zmiennej testmode
-
-        # Log full request details
-        #log_to_file("=== Request Details - Get All OCOs ===")
-        #log_to_file(f"Query string for signature: {query_string}")
-        #log_to_file(f"Generated signature: {signature}")
-
-        response = requests.get(
-            f'{base_url}/api/v3/allOrderList',  # Endpoint do pobierania wszystkich OCO
-            params=params,
-            headers=headers
-        )
-
-        #log_to_file("=== Response Details - Get All OCOs ===")
-        #log_to_file(f"Status Code: {response.status_code}")
-        #log_to_file(f"Response Text: {response.text}")
-        #log_to_file(f"Request URL: {response.url}")
-
-        if response.status_code != 200:
-            log_to_file(f"Błąd podczas pobierania OCO zleceń: {response.text}")
-            return None
-
-        json_response = response.json()
-        #log_to_file(f"Odpowiedź z serwera Binance: {json.dumps(json_response, indent=2)}")
-
-        return json_response  # Zwracamy całą odpowiedź JSON
-
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        log_to_file(f"Exception: {str(e)}")
-        log_to_file(f"Stack trace:\n{error_trace}")
+    response = rest_transport.get('/api/v3/allOrderList', weight=20)
+    if not response.ok:
+        log_to_file(f"Błąd podczas pobierania OCO zleceń: {response.error}")
         return None
+    return response.data  # Zwracamy całą odpowiedź JSON
 
 
 def get_min_notional(symbol):
-    info = client.get_symbol_info(symbol)
-    for f in info['filters']:
-        if f['filterType'] == 'NOTIONAL':
-            return float(f['minNotional'])
-        elif f['filterType'] == 'MIN_NOTIONAL':  # dla kompatybilności wstecznej
-            return float(f['minNotional'])
-    return 0.0  # jeśli nie znaleziono żadnego filtru notional, pozwalamy na handel
+    # 0.0 jeśli nie znaleziono żadnego filtru notional - pozwalamy na handel
+    return exchange_metadata.get_filters(symbol).min_notional
 
 
-def get_order_reports(client, orderListId, symbol):
+def get_orders_by_list_id(client, symbol):
     """
-    Pobiera statusy zleceń dla danego orderListId, używając GET /api/v3/allOrders.
+    Pobiera jednym zapytaniem GET /api/v3/allOrders wszystkie zlecenia symbolu
+    i indeksuje je po orderListId (zlecenia spoza list OCO są pomijane).
     """
-    try:
-        # Create base parameters
-        params = {
-            'symbol': symbol,
-            'timestamp': int(time.time() * 1000)
-        }
-
-        # Create query string with proper encoding
-        query_string = '&'.join([f"{k}={v}" for k, v in sorted(params.items())])
-
-        # Generate signature
-        signature = hmac.new(
-            bytes(client.API_SECRET, 'utf-8'),
-            bytes(query_string, 'utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Add signature to params after generating it
-        params['signature'] = signature
-
-        headers = {
-            'X-MBX-APIKEY': client.API_KEY
-        }
+    response = rest_transport.get('/api/v3/allOrders', {'symbol': symbol}, weight=20)
+    if not response.ok:
+        log_to_file(f"Błąd podczas pobierania zleceń: {response.error}")
+        return {}  # Zwracamy pusty indeks w przypadku błędu
 
-        base_url = 'https://testnet.binance.vision' if testmode else 'https://api.binance.com'
+    orders_by_list_id = {}
+    for order in response.data:
+        order_list_id = order.get('orderListId', -1)
+        if order_list_id != -1:
+            orders_by_list_id.setdefault(order_list_id, []).append(order)
+    return orders_by_list_id
 
-        # Log full request details
-        #log_to_file("=== Request Details - Get All Orders ===")
-        #log_to_file(f"Query string for signature: {query_string}")
-        #log_to_file(f"Generated signature: {signature}")
 
-        response = requests.get(
-            f'{base_url}/api/v3/allOrders',  # Endpoint do pobierania wszystkich zleceń
-            params=params,
-            headers=headers
-        )
-
-       # log_to_file("=== Response Details - Get All Orders ===")
-        #log_to_file(f"Status Code: {response.status_code}")
-        #log_to_file(f"Response Text: {response.text}")
-        #log_to_file(f"Request URL: {response.url}")
-
-        if response.status_code != 200:
-            log_to_file(f"Błąd podczas pobierania zleceń: {response.text}")
-            return []  # Zwracamy pustą listę w przypadku błędu
-
-        all_orders = response.json()
-
-        # Filtrujemy zlecenia, aby znaleźć tylko te z danego orderListId
-        order_reports = [order for order in all_orders if order.get('orderListId') == orderListId]
-
-        #log_to_file(f"Odpowiedź z serwera Binance: {json.dumps(order_reports, indent=2)}")
-
-        return order_reports  # Zwracamy listę statusów zleceń
-
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        log_to_file(f"Exception: {str(e)}")
-        log_to_file(f"Stack trace:\n{error_trace}")
-        return []  # Zwracamy pustą listę w przypadku błędu
+def get_order_reports(client, orderListId, symbol):
+    """
+    Pobiera statusy zleceń dla danego orderListId, używając GET /api/v3/allOrders.
+    """
+    return get_orders_by_list_id(client, symbol).get(orderListId, [])
 
 
 
@@ -462,144 +482,54 @@ def get_oco_order_by_orderListId(client, orderListId):
     """
     Pobiera informacje o zleceniu OCO na podstawie orderListId, używając bezpośrednich zapytań HTTP do API Binance.
     """
-    try:
-        # Create base parameters
-        params = {
-            'orderListId': orderListId,
-            'timestamp': int(time.time() * 1000)
-        }
-
-        # Create query string with proper encoding
-        query_string = '&'.join([f"{k}={v}" for k, v in sorted(params.items())])
-
-        # Generate signature
-        signature = hmac.new(
-            bytes(client.API_SECRET, 'utf-8'),
-            bytes(query_string, 'utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Add signature to params after generating it
-        params['signature'] = signature
-
-        headers = {
-            'X-MBX-APIKEY': client.API_KEY
-        }
-
-        base_url = 'https://testnet.binance.vision' if testmode else 'https://api.binance.com'  # Używaj globalnej zmiennej testmode
-
-        # Log full request details
-        #log_to_file("=== Request Details - Get OCO by ID ===")
-        #log_to_file(f"Query string for signature: {query_string}")
-        #log_to_file(f"Generated signature: {signature}")
-
-        response = requests.get(
-            f'{base_url}/api/v3/orderList',  # Endpoint do pobierania OCO po ID
-            params=params,
-            headers=headers
-        )
-
-        #log_to_file("=== Response Details - Get OCO by ID ===")
-        #log_to_file(f"Status Code: {response.status_code}")
-        #log_to_file(f"Response Text: {response.text}")
-        #log_to_file(f"Request URL: {response.url}")
-
-        if response.status_code != 200:
-            log_to_file(f"Błąd podczas pobierania OCO zlecenia: {response.text}")
-            return None
-
-        json_response = response.json()
-        #log_to_file(f"Odpowiedź z serwera Binance: {json.dumps(json_response, indent=2)}")
-
-        return json_response # Zwracamy całą odpowiedź JSON
-
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        log_to_file(f"Exception: {str(e)}")
-        log_to_file(f"Stack trace:\n{error_trace}")
+    response = rest_transport.get('/api/v3/orderList', {'orderListId': orderListId}, weight=4)
+    if not response.ok:
+        log_to_file(f"Błąd podczas pobierania OCO zlecenia: {response.error}")
         return None
+    return response.data  # Zwracamy całą odpowiedź JSON
 
     
 def create_oco_order_direct(client, symbol, side, quantity, take_profit_price, stop_price, stop_limit_price):
-    try:
-        # Create base parameters in alphabetical order
-        params = {
-            'abovePrice': format(float(take_profit_price), 'f'),
-            'aboveType': 'LIMIT_MAKER',
-            'belowPrice': format(float(stop_limit_price), 'f'),
-            'belowStopPrice': format(float(stop_price), 'f'),
-            'belowTimeInForce': 'GTC',
-            'belowType': 'STOP_LOSS_LIMIT',
-            'quantity': format(float(quantity), 'f'),
-            'side': side,
-            'symbol': symbol,
-            'timestamp': int(time.time() * 1000)
-        }
-        
-        # Create query string with proper encoding
-        query_string = '&'.join([f"{k}={v}" for k, v in sorted(params.items())])
-        
-        # Generate signature
-        signature = hmac.new(
-            bytes(client.API_SECRET, 'utf-8'),
-            bytes(query_string, 'utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Add signature to params after generating it
-        params['signature'] = signature
-        
-        headers = {
-            'X-MBX-APIKEY': client.API_KEY,
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        
-        base_url = 'https://testnet.binance.vision' if testmode else 'https://api.binance.com'
-        
-        # Log full request details
-        log_to_file("=== Request Details ===")
-        log_to_file(f"Query string for signature: {query_string}")
-        log_to_file(f"Generated signature: {signature}")
-        
-        response = requests.post(
-            f'{base_url}/api/v3/orderList/oco',
-            params=params,
-            headers=headers
-        )
-        
-        log_to_file("=== Response Details ===")
-        log_to_file(f"Status Code: {response.status_code}")
-        log_to_file(f"Response Text: {response.text}")
-        log_to_file(f"Request URL: {response.url}")
-        
-        if response.status_code != 200:
-            log_to_file(f"Błąd podczas tworzenia OCO zlecenia: {response.text}")
-            return None
-
-        json_response = response.json()
-        log_to_file(f"Odpowiedź z serwera Binance: {json.dumps(json_response, indent=2)}")
-
-        # Dodaj pełną odpowiedź z Binance do zwracanego obiektu
-        oco_order = {
-            'orderListId': json_response.get('orderListId'),
-            'contingencyType': json_response.get('contingencyType'),
-            'listStatusType': json_response.get('listStatusType'),
-            'listOrderStatus': json_response.get('listOrderStatus'),
-            'listClientOrderId': json_response.get('listClientOrderId'),
-            'transactionTime': json_response.get('transactionTime'),
-            'symbol': json_response.get('symbol'),
-            'orders': json_response.get('orders'),
-            'orderReports': json_response.get('orderReports')
-        }
+    params = {
+        'abovePrice': format(float(take_profit_price), 'f'),
+        'aboveType': 'LIMIT_MAKER',
+        'belowPrice': format(float(stop_limit_price), 'f'),
+        'belowStopPrice': format(float(stop_price), 'f'),
+        'belowTimeInForce': 'GTC',
+        'belowType': 'STOP_LOSS_LIMIT',
+        'quantity': format(float(quantity), 'f'),
+        'side': side,
+        'symbol': symbol,
+    }
 
-        return oco_order
+    log_to_file(f"=== Request Details === {params}")
+    response = rest_transport.post('/api/v3/orderList/oco', params)
+    log_to_file(f"=== Response Details === Status Code: {response.status_code}, URL: {response.url}")
 
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        log_to_file(f"Exception: {str(e)}")
-        log_to_file(f"Stack trace:\n{error_trace}")
+    if not response.ok:
+        log_to_file(f"Błąd podczas tworzenia OCO zlecenia: {response.error}")
         return None
 
+    json_response = response.data
+    log_to_file(f"Odpowiedź z serwera Binance: {json.dumps(json_response, indent=2)}")
+    # OCO blokuje środki - wolne saldo zostanie pobrane ponownie przy następnym odczycie
+    balance_ledger.invalidate()
+
+    # Dodaj pełną odpowiedź z Binance do zwracanego obiektu
+    oco_order = {
+        'orderListId': json_response.get('orderListId'),
+        'contingencyType': json_response.get('contingencyType'),
+        'listStatusType': json_response.get('listStatusType'),
+        'listOrderStatus': json_response.get('listOrderStatus'),
+        'listClientOrderId': json_response.get('listClientOrderId'),
+        'transactionTime': json_response.get('transactionTime'),
+        'symbol': json_response.get('symbol'),
+        'orders': json_response.get('orders'),
+        'orderReports': json_response.get('orderReports')
+    }
+
+    return oco_order
+
 
 
 def test_oco_order():
@@ -625,12 +555,37 @@ def test_oco_order():
     return result
 
 
+AI_MODEL = "gpt-4o-mini"
+AI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '15'))  # Sekundy na jedno zapytanie (i na czekanie na wolny slot)
+AI_MAX_IN_FLIGHT = 2  # Maksymalna liczba równoległych zapytań do OpenAI
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+ai_call_slots = threading.BoundedSemaphore(AI_MAX_IN_FLIGHT)
+
+def get_openai_client():
+    """
+    Jeden klient OpenAI na proces (pula połączeń HTTP jest reużywana), z limitem czasu.
+    OPENAI_API_KEY i OPENAI_BASE_URL są czytane ze środowiska - OPENAI_BASE_URL pozwala
+    wskazać lokalną atrapę (ai_stub_server.py).
+    """
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(timeout=AI_TIMEOUT, max_retries=1)
+        return _openai_client
+
 def ask_AI_to_fill_the_signal_fields(message_text, partial_signal_data):
     """
     Używa OpenAI API do uzupełnienia brakujących pól w sygnale tradingowym.
+    Odpowiedzi modelu są zapamiętywane (ai_completion_cache) - ponownie pobrana, edytowana
+    lub przesłana dalej wiadomość z tymi samymi znanymi polami nie trafia drugi raz do modelu.
     """
-    client = OpenAI()  # Automatycznie użyje OPENAI_API_KEY ze środowiska
-    
+    from ai_completion_cache import ai_completion_cache, completion_key
+
+    cache_key = completion_key(message_text, partial_signal_data, AI_MODEL)
+    new_fields = ai_completion_cache.get(cache_key)
+
     # Przygotowanie promptu
     system_prompt = """
     Jesteś ekspertem w analizie sygnałów tradingowych crypto. Twoim zadaniem jest przeanalizowanie wiadomości 
@@ -661,18 +616,26 @@ def ask_AI_to_fill_the_signal_fields(message_text, partial_signal_data):
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.1,  # Niższa temperatura dla bardziej deterministycznych odpowiedzi
-            response_format={"type": "json_object"}
-        )
-        
-        # Parsowanie odpowiedzi JSON
-        new_fields = json.loads(response.choices[0].message.content)
+        if new_fields is None:
+            if not ai_call_slots.acquire(timeout=AI_TIMEOUT):
+                log_to_file("Wszystkie sloty zapytań do OpenAI zajęte - pomijam uzupełnianie pól")
+                return partial_signal_data
+            try:
+                response = get_openai_client().chat.completions.create(
+                    model=AI_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.1,  # Niższa temperatura dla bardziej deterministycznych odpowiedzi
+                    response_format={"type": "json_object"}
+                )
+            finally:
+                ai_call_slots.release()
+
+            # Parsowanie odpowiedzi JSON
+            new_fields = json.loads(response.choices[0].message.content)
+            ai_completion_cache.put(cache_key, new_fields)
         
         # Aktualizacja partial_signal_data tylko dla brakujących pól
         updated_signal = partial_signal_data.copy()
@@ -1,10 +1,12 @@
 import json
 import re, os
-from binance_trading import execute_trade
+from trade_executor import execute_trade_async, record_signal_async
 import logging
 from datetime import datetime
-from telethon.tl.types import Channel
-from common import log_to_file, MAX_HISTORY_SIZE, load_signal_history, save_signal_history, is_signal_new, last_message_ids
+from channel_registry import channel_registry, CRYPTO_SIGNALS_CHANNEL
+from common import log_to_file, load_signal_history, is_signal_new
+from message_watermarks import message_watermarks, fetch_new_messages
+from signal_dispatcher import process_message, CRYPTO_SIGNALS_FORMATS
 
 
 
@@ -74,24 +76,31 @@ async def process_algo_bot_message(message):
     if is_signal_new(signal_data, history):
         print(f"New signal found: {signal_data}")
         # Wykonaj transakcję
-        execute_trade(signal_data, percentage=20)
-        # Dodaj sygnał do historii
-        history.append(signal_data)
-        # Ogranicz historię do MAX_HISTORY_SIZE
-        if len(history) > MAX_HISTORY_SIZE:
-            history = history[-MAX_HISTORY_SIZE:]
-        # Zapisz historię
-        save_signal_history(history)
+        await execute_trade_async(signal_data, percentage=20)
+        # Dodaj sygnał do aktualnej historii (ograniczonej do MAX_HISTORY_SIZE)
+        await record_signal_async(signal_data)
     else:
         print(f"Signal already exists in history: {signal_data}")
 
 
 
 async def get_crypto_signals_channel(client_telegram):
-    async for dialog in client_telegram.iter_dialogs():
-        if dialog.name == "Crypto Signals" and isinstance(dialog.entity, Channel):
-            return dialog.entity
-    return None
+    return await channel_registry.get_channel(client_telegram, CRYPTO_SIGNALS_CHANNEL)
+
+async def handle_crypto_signals_message(message, edited=False):
+    """
+    Obsługuje pojedynczą wiadomość kanału (z pollingu albo zdarzenia Telethon).
+    Edytowane wiadomości są przetwarzane ponownie - duplikaty odrzuca is_signal_new.
+    """
+    if not edited and not message_watermarks.is_new(CRYPTO_SIGNALS_CHANNEL, message.id):
+        return
+
+    await process_message({
+        "text": message.text,
+        "date": message.date.isoformat() if message.date else None
+    }, CRYPTO_SIGNALS_FORMATS)
+
+    message_watermarks.advance(CRYPTO_SIGNALS_CHANNEL, message.id)
 
 async def check_crypto_signals_messages(client_telegram):
     channel = await get_crypto_signals_channel(client_telegram)
@@ -99,28 +108,10 @@ async def check_crypto_signals_messages(client_telegram):
         print("Kanał 'Crypto Signals' nie został znaleziony.")
         return
 
-    messages = await client_telegram.get_messages(channel, limit=3)
+    messages = await fetch_new_messages(client_telegram, channel, CRYPTO_SIGNALS_CHANNEL)
     
     for message in messages:
-        if message.id not in last_message_ids and "Crypto Signal Alert:" in message.text:
-            from common import log_to_file
-            log_to_file(f"Nowa wiadomość: {message.text}")
-            print(f"Nowy sygnał: {message.text}")
-            await process_signal_message({
-                "text": message.text,
-                "date": message.date.isoformat() if message.date else None
-            })
-            last_message_ids.add(message.id)
-            
-        if message.id not in last_message_ids and "Powered by @AlgoBot" in message.text:
-            from common import log_to_file
-            log_to_file(f"Nowa wiadomość: {message.text}")
-            print(f"Nowy sygnał: {message.text}")
-            await process_algo_bot_message({
-                "text": message.text,
-                "date": message.date.isoformat() if message.date else None
-            })
-            last_message_ids.add(message.id)
+        await handle_crypto_signals_message(message)
 
 
 
@@ -184,13 +175,8 @@ async def process_signal_message(message):
     if is_signal_new(signal_data, history):
         print(f"Nowy sygnał znaleziony: {signal_data}")
         # Wykonaj transakcję
-        execute_trade(signal_data, percentage=20)
-        # Dodaj sygnał do historii
-        history.append(signal_data)
-        # Ogranicz historię do MAX_HISTORY_SIZE
-        if len(history) > MAX_HISTORY_SIZE:
-            history = history[-MAX_HISTORY_SIZE:]
-        # Zapisz historię
-        save_signal_history(history)
+        await execute_trade_async(signal_data, percentage=20)
+        # Dodaj sygnał do aktualnej historii (ograniczonej do MAX_HISTORY_SIZE)
+        await record_signal_async(signal_data)
     else:
         print(f"Sygnał już istnieje w historii: {signal_data}")
\ No newline at end of file
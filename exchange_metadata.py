@@ -0,0 +1,120 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+DEFAULT_METADATA_TTL = 3600  # Sekundy; exchangeInfo zmienia się rzadko
+MISS_REFRESH_INTERVAL = 60  # Minimalny odstęp wymuszonych odświeżeń przy nieznanej parze
+
+
+@dataclass(frozen=True)
+class SymbolFilters:
+    """Zwięzły rekord filtrów handlowych jednej pary"""
+    symbol: str
+    base_asset: str
+    quote_asset: str
+    tick_size: float
+    step_size: float
+    min_qty: float
+    price_precision: int
+    quantity_precision: int
+    min_notional: float
+
+
+def _precision_from_step(step: float) -> int:
+    return int(round(-math.log(step, 10), 0))
+
+
+def build_symbol_filters(symbol_info: dict) -> SymbolFilters:
+    """Buduje rekord SymbolFilters z pojedynczego wpisu exchangeInfo"""
+    filters = {f['filterType']: f for f in symbol_info['filters']}
+
+    tick_size = float(filters['PRICE_FILTER']['tickSize'])
+    step_size = float(filters['LOT_SIZE']['stepSize'])
+    min_qty = float(filters['LOT_SIZE']['minQty'])
+
+    # NOTIONAL ma pierwszeństwo, MIN_NOTIONAL dla kompatybilności wstecznej
+    notional_filter = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL')
+    min_notional = float(notional_filter['minNotional']) if notional_filter else 0.0
+
+    return SymbolFilters(
+        symbol=symbol_info['symbol'],
+        base_asset=symbol_info['baseAsset'],
+        quote_asset=symbol_info['quoteAsset'],
+        tick_size=tick_size,
+        step_size=step_size,
+        min_qty=min_qty,
+        price_precision=_precision_from_step(tick_size),
+        quantity_precision=_precision_from_step(step_size),
+        min_notional=min_notional,
+    )
+
+
+class ExchangeMetadataCache:
+    """
+    Wspólny dla całego procesu cache exchangeInfo.
+
+    Całe exchangeInfo pobierane jest jednym zapytaniem i trzymane przez `ttl` sekund.
+    Dla każdej pary przygotowywany jest z góry rekord SymbolFilters, więc funkcje
+    zaokrąglające ceny i ilości nie wykonują zapytań sieciowych.
+    """
+
+    def __init__(self, client, ttl: float = DEFAULT_METADATA_TTL):
+        self.client = client
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._symbol_info = {}
+        self._filters = {}
+        self._loaded_at = None
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self, force: bool = True) -> None:
+        """Przeładowuje exchangeInfo (zawsze przy force=True, inaczej tylko po upływie TTL)"""
+        with self._lock:
+            if not force and not self._is_stale():
+                return
+
+            exchange_info = self.client.get_exchange_info()
+            symbol_info = {}
+            filters = {}
+            for info in exchange_info['symbols']:
+                symbol_info[info['symbol']] = info
+                try:
+                    filters[info['symbol']] = build_symbol_filters(info)
+                except (KeyError, ValueError):
+                    # Pary bez PRICE_FILTER/LOT_SIZE nie nadają się do handlu spot
+                    continue
+
+            self._symbol_info = symbol_info
+            self._filters = filters
+            self._loaded_at = time.monotonic()
+
+    def _ensure_symbol(self, symbol: str) -> None:
+        self.refresh(force=False)
+        if symbol not in self._symbol_info and time.monotonic() - self._loaded_at > MISS_REFRESH_INTERVAL:
+            # Być może nowo dodana para - wymuszone odświeżenie, nie częściej niż co MISS_REFRESH_INTERVAL
+            self.refresh(force=True)
+
+    def get_symbol_info(self, symbol: str):
+        """Zwraca surowy wpis exchangeInfo dla pary (odpowiednik client.get_symbol_info)"""
+        with self._lock:
+            self._ensure_symbol(symbol)
+            return self._symbol_info.get(symbol)
+
+    def get_filters(self, symbol: str):
+        """Zwraca SymbolFilters dla pary lub None, jeśli para nie istnieje"""
+        with self._lock:
+            self._ensure_symbol(symbol)
+            return self._filters.get(symbol)
+
+    def has_symbol(self, symbol: str) -> bool:
+        with self._lock:
+            self.refresh(force=False)
+            return symbol in self._symbol_info
+
+    def invalidate(self) -> None:
+        """Oznacza cache jako nieaktualny; kolejne odczytanie wykona pobranie"""
+        with self._lock:
+            self._loaded_at = None
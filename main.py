@@ -1,23 +1,77 @@
 import asyncio
-from common import create_telegram_client, log_to_file
-from crypto_signals_channel import check_crypto_signals_messages
-from bybit_signals_channel import check_bybit_signals_messages
+import os
+from common import create_telegram_client, log_to_file, rest_transport, balance_ledger, claim_trading_process
 from signal_history_manager import check_and_update_signal_history
-from binance_killers_signal_chanel import check_binance_killers_signals_messages, display_last_messages
+from signal_queue import SignalWorkQueue, run_periodic
+from trade_executor import EventLoopLagMonitor
+from telegram_ingestion import DEFAULT_CHANNEL_HANDLERS
 
 client_telegram = create_telegram_client('session_name')
 
+# Monitorowanie pozycji ze strumienia cen WebSocket (okresowy cykl zostaje jako zabezpieczenie)
+use_market_data_stream = os.getenv('MARKET_DATA_STREAM', 'false').lower() == 'true'
+# Śledzenie realizacji zleceń ze strumienia danych użytkownika zamiast historii transakcji
+use_user_data_stream = os.getenv('USER_DATA_STREAM', 'false').lower() == 'true'
+# Odbiór wiadomości: 'poll' (get_messages co cykl) albo 'events' (zdarzenia Telethon + polling uzupełniający)
+telegram_ingestion_mode = os.getenv('TELEGRAM_INGESTION', 'poll').lower()
+# Kadencja zadań okresowych (sekundy) - każde zadanie działa niezależnie od pozostałych
+signal_poll_interval = float(os.getenv('SIGNAL_POLL_INTERVAL', '60'))
+monitor_interval = float(os.getenv('MONITOR_INTERVAL', '30'))
+
+async def monitor_positions(stream_monitor):
+    prices = None
+    if stream_monitor:
+        await stream_monitor.sync_open_signals()
+        prices = stream_monitor.fresh_prices(stream_monitor.stream.symbols)
+    # Cykl monitorowania wykonuje blokujące zapytania REST - poza pętlą zdarzeń
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, check_and_update_signal_history, prices)
+
 async def main():
     log_to_file("Start nowej wersji")
-    # NastÄ™pnie uruchom gĹ‚ĂłwnÄ… pÄ™tlÄ™ monitorowania
-    while True:
-        await check_crypto_signals_messages(client_telegram)
-        #await check_bybit_signals_messages(client_telegram)
-        await check_binance_killers_signals_messages(client_telegram)
-        check_and_update_signal_history()
-        await asyncio.sleep(30)
-        check_and_update_signal_history()
-        await asyncio.sleep(30)
+    # Otwarcie połączenia REST z wyprzedzeniem - pierwsze OCO po wejściu nie płaci za handshake
+    rest_transport.warm_up()
+
+    stream_monitor = None
+    if use_market_data_stream:
+        from position_stream_monitor import StreamPositionMonitor
+        stream_monitor = StreamPositionMonitor()
+        await stream_monitor.start()
+
+    # Wiadomości z kanałów trafiają do ograniczonej kolejki obsługiwanej przez osobny worker
+    work_queue = SignalWorkQueue()
+    tasks = [asyncio.create_task(work_queue.worker())]
+
+    if use_user_data_stream:
+        from user_data_stream import UserDataStream
+        user_stream = UserDataStream()
+        # Salda zmienione przez zlecenia trafiają do księgi bez osobnych zapytań get_account
+        user_stream.on_event('outboundAccountPosition', balance_ledger.apply_account_position)
+        # Przy aktywnym strumieniu zamykające zlecenia biorą saldo z księgi zamiast z get_account
+        user_stream.on_sync(balance_ledger.set_stream_synced)
+        tasks.append(asyncio.create_task(user_stream.run()))
+    # Okresowy wpis do logu z opóźnieniem pętli zdarzeń (p50/p99/max)
+    tasks.append(asyncio.create_task(EventLoopLagMonitor().run()))
+
+    if telegram_ingestion_mode == 'events':
+        from telegram_ingestion import TelegramIngestion
+        ingestion = TelegramIngestion(client_telegram, work_queue=work_queue)
+        await ingestion.start()
+    else:
+        tasks.append(asyncio.create_task(run_periodic(
+            "kanały", signal_poll_interval,
+            lambda: work_queue.poll_channels(client_telegram, DEFAULT_CHANNEL_HANDLERS)
+        )))
+
+    tasks.append(asyncio.create_task(run_periodic(
+        "monitorowanie pozycji", monitor_interval,
+        lambda: monitor_positions(stream_monitor)
+    )))
+    await asyncio.gather(*tasks)
+
+# Webhook (server.py) i main.py wykluczają się - oba handlują na tych samych kanałach
+if not claim_trading_process("main.py"):
+    raise SystemExit("Handel prowadzi już inny proces (server.py albo main.py) - zobacz logfile.txt")
 
 with client_telegram:
     client_telegram.loop.run_until_complete(main())
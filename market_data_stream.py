@@ -0,0 +1,237 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+import websockets
+
+from common import log_to_file, testmode
+
+LIVE_STREAM_URL = 'wss://stream.binance.com:9443/stream'
+TESTNET_STREAM_URL = 'wss://testnet.binance.vision/stream'
+
+STREAM_MINI_TICKER = 'miniTicker'  # Ostatnia cena (jak get_symbol_ticker), co ~1 s
+STREAM_BOOK_TICKER = 'bookTicker'  # Najlepszy bid/ask w czasie rzeczywistym
+
+RECONNECT_DELAY = 5  # Sekundy
+
+
+class PriceBoard:
+    """Bieżące ceny par zasilane ze strumienia (bezpieczne wątkowo)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = {}
+
+    def update(self, symbol, price, bid=None, ask=None, event_time=None):
+        with self._lock:
+            self._prices[symbol] = {
+                "price": price,
+                "bid": bid,
+                "ask": ask,
+                "event_time": event_time,
+                "received_at": time.monotonic(),
+            }
+
+    def get_price(self, symbol, max_age=None):
+        with self._lock:
+            entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        if max_age is not None and time.monotonic() - entry["received_at"] > max_age:
+            return None
+        return entry["price"]
+
+    def snapshot(self, symbols=None, max_age=None):
+        """Mapa symbol -> cena; przy max_age pomija nieświeże wpisy"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._prices.items())
+        return {
+            symbol: entry["price"]
+            for symbol, entry in items
+            if (symbols is None or symbol in symbols)
+            and (max_age is None or now - entry["received_at"] <= max_age)
+        }
+
+    def discard(self, symbol):
+        with self._lock:
+            self._prices.pop(symbol, None)
+
+
+def parse_stream_event(payload):
+    """Zwraca (symbol, cena, bid, ask, czas) z wiadomości strumienia lub None"""
+    data = payload.get("data", payload)
+    if not isinstance(data, dict) or "s" not in data:
+        return None
+
+    if "c" in data:  # 24hrMiniTicker
+        return data["s"], float(data["c"]), None, None, data.get("E")
+    if "b" in data and "a" in data:  # bookTicker - cena środkowa
+        bid = float(data["b"])
+        ask = float(data["a"])
+        return data["s"], (bid + ask) / 2, bid, ask, data.get("E")
+    return None
+
+
+class MarketDataStream:
+    """
+    Subskrypcja strumieni rynkowych Binance (combined stream) z dynamiczną listą par.
+
+    Pary dodawane i usuwane są w trakcie działania metodami SUBSCRIBE/UNSUBSCRIBE,
+    bez zrywania połączenia. Każda zmiana ceny aktualizuje PriceBoard i wywołuje
+    on_price(symbol, cena). Po zerwaniu połączenia następuje ponowne połączenie
+    z subskrypcją aktualnego zestawu par.
+    """
+
+    def __init__(self, url=None, stream_type=STREAM_MINI_TICKER, on_price=None, board=None):
+        self.url = url or (TESTNET_STREAM_URL if testmode else LIVE_STREAM_URL)
+        self.stream_type = stream_type
+        self.on_price = on_price
+        self.board = board or PriceBoard()
+        self._symbols = set()
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._running = False
+
+    def _stream_name(self, symbol):
+        return f"{symbol.lower()}@{self.stream_type}"
+
+    @property
+    def symbols(self):
+        return set(self._symbols)
+
+    async def _send_method(self, method, symbols):
+        if not symbols or self._ws is None:
+            return
+        message = {
+            "method": method,
+            "params": [self._stream_name(symbol) for symbol in sorted(symbols)],
+            "id": next(self._ids),
+        }
+        try:
+            await self._ws.send(json.dumps(message))
+        except Exception as e:
+            # Po ponownym połączeniu subskrypcja zostanie odtworzona z self._symbols
+            log_to_file(f"Błąd wysyłania {method} do strumienia rynkowego: {e}")
+
+    async def subscribe(self, symbols):
+        new_symbols = set(symbols) - self._symbols
+        self._symbols |= new_symbols
+        await self._send_method("SUBSCRIBE", new_symbols)
+
+    async def unsubscribe(self, symbols):
+        removed = set(symbols) & self._symbols
+        self._symbols -= removed
+        for symbol in removed:
+            self.board.discard(symbol)
+        await self._send_method("UNSUBSCRIBE", removed)
+
+    async def sync_symbols(self, symbols):
+        """Ustawia zestaw subskrybowanych par na dokładnie podany"""
+        symbols = set(symbols)
+        await self.unsubscribe(self._symbols - symbols)
+        await self.subscribe(symbols - self._symbols)
+
+    def _handle_message(self, raw):
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            return
+        event = parse_stream_event(payload)
+        if event is None:
+            return
+        symbol, price, bid, ask, event_time = event
+        if symbol not in self._symbols:
+            return
+
+        previous = self.board.get_price(symbol)
+        self.board.update(symbol, price, bid, ask, event_time)
+        if self.on_price and price != previous:
+            try:
+                self.on_price(symbol, price)
+            except Exception as e:
+                log_to_file(f"Błąd obsługi zmiany ceny {symbol}: {e}")
+
+    async def run(self):
+        """Pętla połączenia; działa do wywołania stop()"""
+        self._running = True
+        while self._running:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    self._ws = ws
+                    await self._send_method("SUBSCRIBE", self._symbols)
+                    log_to_file(f"Połączono ze strumieniem rynkowym {self.url}, pary: {sorted(self._symbols)}")
+                    async for raw in ws:
+                        self._handle_message(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_to_file(f"Strumień rynkowy rozłączony: {e}")
+            finally:
+                self._ws = None
+            if self._running:
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def stop(self):
+        self._running = False
+        if self._ws is not None:
+            await self._ws.close()
+
+
+class LocalMarketDataServer:
+    """
+    Lokalny zamiennik strumienia Binance do testów offline.
+
+    Obsługuje SUBSCRIBE/UNSUBSCRIBE jak combined stream Binance, a publish()
+    rozsyła zdarzenia miniTicker/bookTicker do klientów subskrybujących daną parę.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._clients = {}
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/stream"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handler(self, websocket, path=None):
+        streams = self._clients.setdefault(websocket, set())
+        try:
+            async for raw in websocket:
+                request = json.loads(raw)
+                if request.get("method") == "SUBSCRIBE":
+                    streams.update(request.get("params", []))
+                elif request.get("method") == "UNSUBSCRIBE":
+                    streams.difference_update(request.get("params", []))
+                await websocket.send(json.dumps({"result": None, "id": request.get("id")}))
+        finally:
+            self._clients.pop(websocket, None)
+
+    async def publish(self, symbol, price, bid=None, ask=None):
+        event_time = int(time.time() * 1000)
+        events = {
+            f"{symbol.lower()}@{STREAM_MINI_TICKER}": {"e": "24hrMiniTicker", "E": event_time, "s": symbol, "c": str(price)},
+            f"{symbol.lower()}@{STREAM_BOOK_TICKER}": {
+                "s": symbol,
+                "b": str(bid if bid is not None else price),
+                "a": str(ask if ask is not None else price),
+            },
+        }
+        for websocket, streams in list(self._clients.items()):
+            for stream, data in events.items():
+                if stream in streams:
+                    await websocket.send(json.dumps({"stream": stream, "data": data}))
@@ -0,0 +1,101 @@
+"""
+Test strumienia cen (market_data_stream.py) na lokalnym zamienniku LocalMarketDataServer.
+
+Sprawdza bez sieci i bez Binance:
+- cena opublikowana dla subskrybowanej pary trafia do PriceBoard i wywołuje on_price,
+- ceny par niesubskrybowanych (także po UNSUBSCRIBE) są pomijane,
+- po zerwaniu połączenia strumień łączy się ponownie, odnawia subskrypcję i znowu przyjmuje ceny.
+
+    python market_data_stream_test.py
+
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import asyncio
+import sys
+
+import market_data_stream
+from market_data_stream import LocalMarketDataServer, MarketDataStream, STREAM_BOOK_TICKER
+
+WAIT_TIMEOUT = 5  # Sekundy na dotarcie zdarzenia
+
+
+async def wait_for(condition, timeout=WAIT_TIMEOUT):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def run_checks():
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    # Krótka przerwa przed ponownym połączeniem, żeby test nie czekał domyślnych 5 s
+    market_data_stream.RECONNECT_DELAY = 0.1
+
+    server = await LocalMarketDataServer().start()
+    port = server.port
+    changes = []
+    stream = MarketDataStream(url=server.url, on_price=lambda symbol, price: changes.append((symbol, price)))
+    await stream.subscribe({"BTCUSDT", "ETHUSDT"})
+    task = asyncio.create_task(stream.run())
+
+    subscribed = lambda: any(len(streams) == 2 for streams in server._clients.values())
+    check("subskrypcja wysłana po połączeniu", await wait_for(subscribed))
+
+    await server.publish("BTCUSDT", 64000.5)
+    check("cena trafia do PriceBoard", await wait_for(lambda: stream.board.get_price("BTCUSDT") == 64000.5))
+    check("on_price wywołane dla zmiany ceny", ("BTCUSDT", 64000.5) in changes)
+
+    await server.publish("BTCUSDT", 64000.5)
+    await asyncio.sleep(0.1)
+    check("ta sama cena nie wywołuje on_price ponownie", changes.count(("BTCUSDT", 64000.5)) == 1)
+
+    await stream.unsubscribe({"ETHUSDT"})
+    await wait_for(lambda: any(len(streams) == 1 for streams in server._clients.values()))
+    await server.publish("ETHUSDT", 3100.0)
+    await asyncio.sleep(0.1)
+    check("para po UNSUBSCRIBE jest pomijana", stream.board.get_price("ETHUSDT") is None)
+
+    # Zerwanie połączenia: serwer znika i wraca na tym samym porcie
+    await server.stop()
+    server = await LocalMarketDataServer(port=port).start()
+    check("ponowne połączenie odnawia subskrypcję", await wait_for(lambda: any(server._clients.values())))
+
+    await server.publish("BTCUSDT", 65000.0)
+    check("ceny przyjmowane po ponownym połączeniu",
+          await wait_for(lambda: stream.board.get_price("BTCUSDT") == 65000.0))
+    check("subskrypcja po ponownym połączeniu bez usuniętej pary",
+          all(not any(name.startswith("ethusdt@") for name in streams) for streams in server._clients.values()))
+
+    await stream.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await server.stop()
+
+    # bookTicker: cena środkowa z bid/ask
+    server = await LocalMarketDataServer().start()
+    stream = MarketDataStream(url=server.url, stream_type=STREAM_BOOK_TICKER)
+    await stream.subscribe({"SOLUSDT"})
+    task = asyncio.create_task(stream.run())
+    await wait_for(lambda: any(server._clients.values()))
+    await server.publish("SOLUSDT", 150.0, bid=149.0, ask=151.0)
+    check("bookTicker daje cenę środkową", await wait_for(lambda: stream.board.get_price("SOLUSDT") == 150.0))
+    await stream.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await server.stop()
+
+    return failures
+
+
+if __name__ == '__main__':
+    failures = asyncio.run(run_checks())
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from common import log_to_file
+
+MESSAGE_WATERMARKS_FILE = 'message_watermarks.json'
+INITIAL_FETCH_LIMIT = 3  # Bez znacznika (pierwsze uruchomienie) pobieramy tylko najnowsze wiadomości
+MAX_SIGNAL_AGE = 1800  # Sekundy; starsze wiadomości z nadrabiania tylko przesuwają znacznik, bez transakcji
+
+
+class MessageWatermarks:
+    """
+    Trwały stan obsłużonych wiadomości per kanał: znacznik i zbiór id powyżej niego.
+
+    Znacznik oznacza, że obsłużono wszystkie wiadomości kanału do tego id włącznie. Zdarzenia
+    na żywo mogą przyjść przed nadrabianiem starszych wiadomości (np. po ponownym połączeniu),
+    więc obsłużone id trafiają najpierw do zbioru, a znacznik przesuwa dopiero fetch_new_messages
+    - tylko przez ciągły, w całości obsłużony początek pobranych wiadomości. Dzięki temu
+    wiadomość na żywo o wyższym id nie powoduje pominięcia niższych, jeszcze nieobsłużonych.
+    """
+
+    def __init__(self, path=MESSAGE_WATERMARKS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._marks, self._processed = self._load()
+
+    def _load(self):
+        marks, processed = {}, {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    for key, value in json.load(file).items():
+                        if isinstance(value, dict):
+                            if value.get("mark") is not None:
+                                marks[key] = int(value["mark"])
+                            processed[key] = {int(message_id) for message_id in value.get("processed", [])}
+                        else:
+                            marks[key] = int(value)  # Dawny format: sam znacznik
+            except (OSError, ValueError) as e:
+                log_to_file(f"Nie udało się wczytać znaczników wiadomości: {e}")
+        return marks, processed
+
+    def _save(self):
+        with self._lock:
+            data = {
+                key: {"mark": self._marks.get(key), "processed": sorted(self._processed.get(key, ()))}
+                for key in set(self._marks) | set(self._processed)
+            }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, channel):
+        with self._lock:
+            return self._marks.get(channel)
+
+    def is_new(self, channel, message_id):
+        with self._lock:
+            mark = self._marks.get(channel)
+            if mark is not None and message_id <= mark:
+                return False
+            return message_id not in self._processed.get(channel, ())
+
+    def advance(self, channel, message_id):
+        """Zapisuje wiadomość jako obsłużoną; znacznik przesuwa dopiero settle()"""
+        with self._lock:
+            mark = self._marks.get(channel)
+            processed = self._processed.setdefault(channel, set())
+            if (mark is not None and message_id <= mark) or message_id in processed:
+                return
+            processed.add(message_id)
+        self._save()
+
+    def settle(self, channel, message_ids):
+        """
+        Przesuwa znacznik przez obsłużone id z początku message_ids (wszystkich istniejących
+        wiadomości powyżej znacznika, rosnąco) - do pierwszej nieobsłużonej.
+        """
+        with self._lock:
+            mark = self._marks.get(channel)
+            processed = self._processed.setdefault(channel, set())
+            new_mark = mark
+            for message_id in message_ids:
+                if message_id not in processed:
+                    break
+                new_mark = message_id
+            if new_mark == mark:
+                return
+            self._marks[channel] = new_mark
+            self._processed[channel] = {message_id for message_id in processed if message_id > new_mark}
+        self._save()
+
+
+message_watermarks = MessageWatermarks()
+
+
+def is_stale(message, max_age=MAX_SIGNAL_AGE):
+    """Czy wiadomość jest za stara na transakcję (sygnał sprzed przerwy w działaniu)"""
+    if message.date is None:
+        return False
+    date = message.date if message.date.tzinfo else message.date.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - date).total_seconds() > max_age
+
+
+async def fetch_new_messages(client_telegram, channel, key, initial_limit=INITIAL_FETCH_LIMIT, max_age=MAX_SIGNAL_AGE):
+    """
+    Nieobsłużone wiadomości kanału powyżej znacznika, rosnąco po id (najstarsza pierwsza).
+    Powyżej znacznika pobierane są wszystkie, więc po przerwie żadna nie zostaje pominięta,
+    ale starsze niż max_age są tylko oznaczane jako obsłużone - nie trafiają do transakcji.
+    """
+    mark = message_watermarks.get(key)
+    if mark is None:
+        messages = await client_telegram.get_messages(channel, limit=initial_limit)
+    else:
+        messages = [message async for message in client_telegram.iter_messages(channel, min_id=mark, reverse=True)]
+    messages = sorted((message for message in messages if message), key=lambda message: message.id)
+
+    fresh = []
+    for message in messages:
+        if not message_watermarks.is_new(key, message.id):
+            continue
+        if is_stale(message, max_age):
+            log_to_file(f"Pomijam starą wiadomość {message.id} z kanału '{key}' ({message.date}) - bez transakcji")
+            message_watermarks.advance(key, message.id)
+            continue
+        fresh.append(message)
+    message_watermarks.settle(key, [message.id for message in messages])
+    return fresh
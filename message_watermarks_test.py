@@ -0,0 +1,113 @@
+"""
+Test znaczników wiadomości (message_watermarks.py) na zamienniku klienta Telegram.
+
+Sprawdzane przypadki:
+- zdarzenie na żywo o wyższym id przed nadrabianiem nie powoduje pominięcia niższych id,
+- znacznik przesuwa się dopiero przez ciągły, obsłużony początek wiadomości kanału,
+- wiadomości starsze niż MAX_SIGNAL_AGE z nadrabiania nie trafiają do obsługi, ale przesuwają znacznik,
+- stan zapisany na dysk (bez pozostawionego pliku tymczasowego) i wczytanie dawnego formatu.
+
+    python message_watermarks_test.py
+
+Plik znaczników i log trafiają do katalogu tymczasowego.
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHANNEL = "Crypto Signals"
+
+
+class StandInTelegram:
+    """Kanał jako lista wiadomości; get_messages/iter_messages jak w Telethon (min_id, reverse)"""
+
+    def __init__(self):
+        self.messages = []
+
+    def post(self, message_id, age_seconds=0):
+        date = datetime.now(timezone.utc) - timedelta(seconds=age_seconds)
+        self.messages.append(SimpleNamespace(id=message_id, date=date, text=f"wiadomość {message_id}"))
+
+    async def get_messages(self, channel, limit):
+        return sorted(self.messages, key=lambda message: message.id, reverse=True)[:limit]
+
+    async def iter_messages(self, channel, min_id=0, reverse=False):
+        for message in sorted(self.messages, key=lambda message: message.id, reverse=not reverse):
+            if message.id > min_id:
+                yield message
+
+
+async def run_checks():
+    import message_watermarks as watermarks_module
+    from message_watermarks import MessageWatermarks, fetch_new_messages
+
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    with open('message_watermarks.json', 'w', encoding='utf-8') as file:
+        json.dump({CHANNEL: 100}, file)
+    marks = MessageWatermarks('message_watermarks.json')
+    watermarks_module.message_watermarks = marks
+    check("dawny format pliku wczytany", marks.get(CHANNEL) == 100)
+
+    telegram = StandInTelegram()
+    for message_id in range(101, 106):
+        telegram.post(message_id)
+
+    handled = []
+
+    async def catch_up():
+        for message in await fetch_new_messages(telegram, None, CHANNEL):
+            if marks.is_new(CHANNEL, message.id):
+                handled.append(message.id)
+                marks.advance(CHANNEL, message.id)
+
+    # Zdarzenie na żywo dla 105 przychodzi przed nadrabianiem 101..104
+    handled.append(105)
+    marks.advance(CHANNEL, 105)
+    check("zdarzenie na żywo nie przesuwa znacznika ponad nieobsłużone id", marks.get(CHANNEL) == 100)
+
+    await catch_up()
+    check("nadrabianie obsługuje niższe id i pomija już obsłużone", handled == [105, 101, 102, 103, 104])
+    await catch_up()
+    check("znacznik po obsłużeniu ciągłego zakresu", marks.get(CHANNEL) == 105 and handled.count(105) == 1)
+
+    # Przerwa w działaniu: dwie stare wiadomości i jedna świeża
+    telegram.post(106, age_seconds=watermarks_module.MAX_SIGNAL_AGE + 3600)
+    telegram.post(107, age_seconds=watermarks_module.MAX_SIGNAL_AGE + 60)
+    telegram.post(108)
+    handled.clear()
+    await catch_up()
+    check("stare wiadomości nie trafiają do obsługi", handled == [108])
+    await catch_up()
+    check("stare wiadomości przesuwają znacznik", marks.get(CHANNEL) == 108)
+
+    check("brak pliku tymczasowego po zapisie", not [name for name in os.listdir('.') if name.endswith('.tmp')])
+    reloaded = MessageWatermarks('message_watermarks.json')
+    check("stan wczytany ponownie z pliku", reloaded.get(CHANNEL) == 108 and not reloaded.is_new(CHANNEL, 108))
+
+    # Bez znacznika (pierwsze uruchomienie): tylko ostatnie INITIAL_FETCH_LIMIT wiadomości
+    fresh_marks = MessageWatermarks('first_run.json')
+    watermarks_module.message_watermarks = fresh_marks
+    first = await fetch_new_messages(telegram, None, CHANNEL, initial_limit=3)
+    check("pierwsze uruchomienie - ostatnie wiadomości bez starych", [message.id for message in first] == [108])
+    return failures
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, PROJECT_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        failures = asyncio.run(run_checks())
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
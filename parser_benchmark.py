@@ -0,0 +1,211 @@
+"""
+Benchmark parserów sygnałów na oznaczonym korpusie parser_corpus.json.
+
+Dla każdego parsera (parse_signal_message, parse_signal_message_algo,
+parse_binance_killers_signal_message, parse_signal_message_byBit_standard) raportuje
+przepustowość (wiadomości/s), opóźnienie p50/p99, alokacje pamięci (tracemalloc) oraz
+trafność pól względem etykiet. Sprawdzana jest też trafność klasyfikacji signal_dispatcher.
+
+Korpus: wiadomości "real-*" pochodzą ze zrzutów last_5_messages.json
+i last_5_telegram_messages.json (kanał Crypto Signals), pozostałe ("constructed-*") są
+skonstruowane ręcznie na wzór formatów obsługiwanych przez parsery - zrzuty nie zawierają
+wiadomości z innych kanałów. Etykiety opisują to, co wynika z treści wiadomości, a nie
+bieżący wynik parsera; "expected": null oznacza, że parser powinien wiadomość odrzucić.
+
+Logi parserów (log_to_file) trafiają do katalogu tymczasowego, aby nie zaśmiecać logfile.txt,
+a ich komunikaty print są pomijane.
+
+    python parser_benchmark.py --repeat 200 --save-baseline parser_baseline.json
+    python parser_benchmark.py --baseline parser_baseline.json --max-slowdown 0.25
+
+Kod wyjścia 1 oznacza regresję przepustowości lub trafności względem progów.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from text_normalization import normalize_signal_text
+from signal_dispatcher import classify_message, CRYPTO_SIGNAL_ALERT, ALGO_BOT, BINANCE_KILLERS, BYBIT_STANDARD, CHANNEL_FORMATS
+from crypto_signals_channel import parse_signal_message, parse_signal_message_algo
+from binance_killers_signal_chanel import parse_binance_killers_signal_message
+from bybit_signals_channel import parse_signal_message_byBit_standard
+
+CORPUS_FILE = 'parser_corpus.json'
+
+PARSERS = {
+    CRYPTO_SIGNAL_ALERT: parse_signal_message,
+    ALGO_BOT: parse_signal_message_algo,
+    BINANCE_KILLERS: parse_binance_killers_signal_message,
+    BYBIT_STANDARD: parse_signal_message_byBit_standard,
+}
+
+PRICE_TOLERANCE = 1e-9  # Względna tolerancja porównania cen
+
+
+def load_corpus(path=CORPUS_FILE):
+    """Korpus z tekstami znormalizowanymi tak jak przed dyspozytorem (poza pomiarem czasu)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        corpus = json.load(file)
+    for entry in corpus:
+        entry["text"] = normalize_signal_text(entry["text"])
+    return corpus
+
+
+def values_equal(expected, actual):
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and \
+            all(values_equal(e, a) for e, a in zip(expected, actual))
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        return isinstance(actual, (int, float)) and math.isclose(expected, actual, rel_tol=PRICE_TOLERANCE)
+    return expected == actual
+
+
+def score_fields(expected, actual):
+    """(trafne, wszystkie) pola; odrzucenie wiadomości liczone jest jako jedno pole"""
+    if expected is None:
+        return (1 if actual is None else 0), 1
+    if actual is None:
+        return 0, len(expected)
+    correct = sum(1 for key, value in expected.items() if values_equal(value, actual.get(key)))
+    return correct, len(expected)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure_allocations(parse, texts):
+    """Średni i maksymalny szczyt pamięci (bajty) zaalokowanej podczas parsowania jednej wiadomości"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for text in texts:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            parse(text)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks), max(peaks)
+
+
+def benchmark_parser(parse, entries, repeat):
+    texts = [entry["text"] for entry in entries]
+
+    correct = total = 0
+    for entry in entries:
+        entry_correct, entry_total = score_fields(entry["expected"], parse(entry["text"]))
+        correct += entry_correct
+        total += entry_total
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            call_started = time.perf_counter_ns()
+            parse(text)
+            latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+
+    mean_alloc, max_alloc = measure_allocations(parse, texts)
+    return {
+        "messages": len(texts),
+        "messages_per_second": len(latencies) / elapsed,
+        "p50_us": percentile(latencies, 0.5) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "alloc_mean_bytes": mean_alloc,
+        "alloc_max_bytes": max_alloc,
+        "field_accuracy": correct / total if total else 1.0,
+    }
+
+
+def dispatch_accuracy(corpus):
+    """Odsetek wiadomości, które signal_dispatcher kieruje do właściwego parsera (lub odrzuca)"""
+    hits = sum(1 for entry in corpus
+               if classify_message(entry["text"], CHANNEL_FORMATS[entry["channel"]]) == entry["format"])
+    return hits / len(corpus)
+
+
+def run_benchmark(corpus, repeat):
+    results = {}
+    for signal_format, parse in PARSERS.items():
+        entries = [entry for entry in corpus if entry["format"] == signal_format]
+        if entries:
+            results[parse.__name__] = benchmark_parser(parse, entries, repeat)
+    results["signal_dispatcher"] = {"field_accuracy": dispatch_accuracy(corpus)}
+    return results
+
+
+def check_regressions(results, baseline, max_slowdown, min_accuracy):
+    """Lista opisów regresji względem linii bazowej i bezwzględnego progu trafności"""
+    failures = []
+    for name, result in results.items():
+        if result["field_accuracy"] < min_accuracy:
+            failures.append(f"{name}: trafność {result['field_accuracy']:.1%} poniżej progu {min_accuracy:.1%}")
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if result["field_accuracy"] < reference["field_accuracy"]:
+            failures.append(f"{name}: trafność spadła z {reference['field_accuracy']:.1%} "
+                            f"do {result['field_accuracy']:.1%}")
+        if "messages_per_second" in result and \
+                result["messages_per_second"] < reference["messages_per_second"] * (1 - max_slowdown):
+            failures.append(f"{name}: przepustowość spadła z {reference['messages_per_second']:,.0f} "
+                            f"do {result['messages_per_second']:,.0f} wiadomości/s")
+    return failures
+
+
+def print_results(results):
+    for name, result in results.items():
+        if "messages_per_second" not in result:
+            print(f"{name}: trafność klasyfikacji {result['field_accuracy']:.1%}")
+            continue
+        print(f"{name} ({result['messages']} wiadomości): {result['messages_per_second']:,.0f} wiadomości/s, "
+              f"p50={result['p50_us']:.1f} us, p99={result['p99_us']:.1f} us, "
+              f"alokacje śr.={result['alloc_mean_bytes'] / 1024:.1f} KiB, maks.={result['alloc_max_bytes'] / 1024:.1f} KiB, "
+              f"trafność pól {result['field_accuracy']:.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark parserów sygnałów na oznaczonym korpusie")
+    parser.add_argument('--corpus', default=CORPUS_FILE)
+    parser.add_argument('--repeat', type=int, default=200, help="Liczba przebiegów po korpusie")
+    parser.add_argument('--baseline', help="Plik JSON z wynikami odniesienia (z --save-baseline)")
+    parser.add_argument('--save-baseline', help="Zapisz bieżące wyniki jako linię bazową")
+    parser.add_argument('--max-slowdown', type=float, default=0.25,
+                        help="Dopuszczalny względny spadek przepustowości wobec linii bazowej")
+    parser.add_argument('--min-accuracy', type=float, default=0.0, help="Minimalna trafność pól każdego parsera")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull:
+        os.chdir(log_dir)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                results = run_benchmark(corpus, args.repeat)
+        finally:
+            os.chdir(working_dir)
+
+    print_results(results)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4, ensure_ascii=False)
+
+    failures = check_regressions(results, baseline, args.max_slowdown, args.min_accuracy)
+    for failure in failures:
+        print(f"REGRESJA: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from common import exchange_metadata, log_to_file
+from market_data_stream import MarketDataStream
+from signal_history_manager import check_and_update_signal_history, load_signal_history
+
+MIN_EVALUATION_INTERVAL = 2.0  # Sekundy między ocenami tej samej pary
+TRAILING_TICKS = 5  # Zgodnie z regułą w update_signal_high_price
+PRICE_MAX_AGE = 10  # Sekundy; starsze ceny z tablicy nie zastępują migawki REST
+
+
+def price_needs_evaluation(signal, price, tick_size):
+    """
+    Tani, lokalny test czy zmiana ceny może zmienić stan pozycji:
+    osiągnięcie kolejnego targetu, stop loss, nowe maksimum lub spadek o 5 ticków po targecie 1.
+    """
+    is_long = signal['signal_type'] == 'LONG'
+    targets = signal.get('targets') or []
+    level = signal.get('current_target_level', 0)
+
+    if level < len(targets):
+        next_target = float(targets[level])
+        if (is_long and price >= next_target) or (not is_long and price <= next_target):
+            return True
+
+    stop_loss = signal.get('stop_loss')
+    if stop_loss is not None:
+        if (is_long and price <= float(stop_loss)) or (not is_long and price >= float(stop_loss)):
+            return True
+
+    highest = signal.get('highest_price')
+    if highest is None:
+        return True
+    if (is_long and price > highest) or (not is_long and price < highest):
+        return True
+
+    if level >= 1 and tick_size and abs(highest - price) / tick_size >= TRAILING_TICKS:
+        return True
+
+    return False
+
+
+class StreamPositionMonitor:
+    """
+    Monitorowanie pozycji sterowane strumieniem cen.
+
+    Subskrybuje pary otwartych sygnałów (i wypisuje zamknięte), a przy każdej istotnej
+    zmianie ceny uruchamia istniejącą logikę targetów/stop loss z check_and_update_signal_history
+    tylko dla tej pary. Oceny tej samej pary są ograniczone do jednej na MIN_EVALUATION_INTERVAL
+    i wykonywane poza pętlą zdarzeń (blokujące zapytania REST).
+    """
+
+    def __init__(self, stream=None, min_interval=MIN_EVALUATION_INTERVAL):
+        self.stream = stream or MarketDataStream()
+        self.stream.on_price = self.on_price
+        self.min_interval = min_interval
+        self._signals = {}
+        self._last_evaluation = {}
+        self._in_flight = set()
+        self._loop = None
+        self._task = None
+
+    @property
+    def board(self):
+        return self.stream.board
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.sync_open_signals()
+        self._task = asyncio.create_task(self.stream.run())
+        return self._task
+
+    async def sync_open_signals(self):
+        """Odświeża listę otwartych sygnałów i subskrypcje strumienia"""
+        history = load_signal_history()
+        self._signals = {
+            signal['currency']: signal
+            for signal in history
+            if signal.get('status') == 'OPEN'
+        }
+        await self.stream.sync_symbols(self._signals.keys())
+
+    def fresh_prices(self, symbols):
+        """Ceny z tablicy strumienia, jeśli są świeże dla wszystkich podanych par, inaczej None"""
+        prices = self.board.snapshot(symbols, max_age=PRICE_MAX_AGE)
+        return prices if set(symbols) <= set(prices) else None
+
+    def on_price(self, symbol, price):
+        signal = self._signals.get(symbol)
+        if signal is None or symbol in self._in_flight:
+            return
+        if time.monotonic() - self._last_evaluation.get(symbol, 0) < self.min_interval:
+            return
+
+        filters = exchange_metadata.get_filters(symbol)
+        if not price_needs_evaluation(signal, price, filters.tick_size if filters else None):
+            return
+
+        self._in_flight.add(symbol)
+        self._last_evaluation[symbol] = time.monotonic()
+        self._loop.create_task(self._evaluate(symbol, price))
+
+    async def _evaluate(self, symbol, price):
+        try:
+            await self._loop.run_in_executor(
+                None, lambda: check_and_update_signal_history(prices={symbol: price}, symbols={symbol})
+            )
+            await self.sync_open_signals()
+        except Exception as e:
+            log_to_file(f"Błąd oceny pozycji {symbol} ze strumienia: {e}")
+        finally:
+            self._in_flight.discard(symbol)
@@ -0,0 +1,237 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Klasy priorytetu - mniejsza liczba oznacza wyższy priorytet
+PRIORITY_ORDER = 0    # Składanie i anulowanie zleceń, wszystko w ścieżce execute_trade/handle_targets
+PRIORITY_ACCOUNT = 1  # Odczyty konta potrzebne do decyzji handlowych
+PRIORITY_MONITOR = 2  # Odczyty monitoringu pozycji (ticker, otwarte zlecenia, historia)
+
+PRIORITY_NAMES = {
+    PRIORITY_ORDER: "order",
+    PRIORITY_ACCOUNT: "account",
+    PRIORITY_MONITOR: "monitor",
+}
+
+DEFAULT_WEIGHT_LIMIT = 6000  # REQUEST_WEIGHT na minutę dla IP (Binance spot)
+
+# Część limitu dostępna dla danej klasy; reszta jest rezerwą dla wyższych priorytetów
+PRIORITY_BUDGET_SHARE = {
+    PRIORITY_ORDER: 1.0,
+    PRIORITY_ACCOUNT: 0.85,
+    PRIORITY_MONITOR: 0.6,
+}
+
+# Przybliżone wagi metod klienta python-binance (dokumentacja Binance spot API)
+CLIENT_METHOD_WEIGHTS = {
+    'get_exchange_info': 20,
+    'get_symbol_info': 20,
+    'get_account': 20,
+    'get_asset_balance': 20,
+    'get_my_trades': 20,
+    'get_all_orders': 20,
+    'get_open_orders': 6,
+    'get_order': 4,
+    'get_ticker': 2,
+    'get_symbol_ticker': 4,  # 2 dla jednej pary, 4 dla wszystkich - liczymy pesymistycznie
+    'get_avg_price': 2,
+    'get_server_time': 1,
+    'create_order': 1,
+    'cancel_order': 1,
+}
+
+CLIENT_ORDER_METHODS = {
+    'create_order', 'cancel_order', 'order_market', 'order_market_buy', 'order_market_sell',
+    'order_limit', 'order_limit_buy', 'order_limit_sell', 'create_oco_order', 'order_oco_sell',
+    'order_oco_buy', 'cancel_orders',
+}
+
+BAN_STATUS_CODES = (418, 429)
+DEFAULT_BAN_SECONDS = 60
+
+
+def _header(headers, name):
+    """Odczyt nagłówka bez względu na wielkość liter (requests/aiohttp/dict)"""
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, val in headers.items():
+            if key.lower() == lowered:
+                return val
+    return value
+
+
+class RequestWeightScheduler:
+    """
+    Planista ruchu do Binance oparty na wadze zapytań.
+
+    Śledzi wykorzystanie limitu z nagłówków X-MBX-USED-WEIGHT-1M, dzieli zapytania na
+    klasy priorytetu i przepuszcza zlecenia przed odczytami monitoringu. Gdy budżet
+    danej klasy jest wyczerpany, zapytanie czeka do następnego okna zamiast kończyć
+    się błędem. Po odpowiedzi 429/418 wszystkie klasy czekają na koniec blokady.
+    """
+
+    def __init__(self, weight_limit=DEFAULT_WEIGHT_LIMIT, budget_share=None):
+        self.weight_limit = weight_limit
+        self.budget_share = dict(budget_share or PRIORITY_BUDGET_SHARE)
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._window = self._current_window()
+        self._used_weight = 0
+        self._banned_until = 0.0
+        self._waiting = {priority: 0 for priority in self.budget_share}
+        self._served = {priority: 0 for priority in self.budget_share}
+
+    @staticmethod
+    def _current_window():
+        return int(time.time() // 60)
+
+    def _roll_window(self):
+        window = self._current_window()
+        if window != self._window:
+            self._window = window
+            self._used_weight = 0
+
+    def _seconds_to_next_window(self):
+        return max(0.05, 60 - time.time() % 60)
+
+    def _higher_priority_waiting(self, priority):
+        return any(count for p, count in self._waiting.items() if p < priority)
+
+    def acquire(self, weight=1, priority=None):
+        """Blokuje do czasu, aż zapytanie o podanej wadze zmieści się w budżecie swojej klasy"""
+        if priority is None:
+            priority = self.current_priority(PRIORITY_MONITOR)
+        budget = self.weight_limit * self.budget_share.get(priority, 1.0)
+
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._roll_window()
+                    now = time.time()
+                    if now < self._banned_until:
+                        self._cond.wait(self._banned_until - now)
+                        continue
+                    if self._higher_priority_waiting(priority):
+                        self._cond.wait(0.5)
+                        continue
+                    if self._used_weight + weight <= budget:
+                        self._used_weight += weight
+                        self._served[priority] += 1
+                        return
+                    self._cond.wait(self._seconds_to_next_window())
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def update_from_headers(self, headers):
+        """Synchronizuje zużycie wagi z nagłówków odpowiedzi Binance"""
+        used = _header(headers, 'X-MBX-USED-WEIGHT-1M') or _header(headers, 'X-MBX-USED-WEIGHT')
+        if used is None:
+            return
+        with self._cond:
+            self._roll_window()
+            self._used_weight = int(used)
+            self._cond.notify_all()
+
+    def record_ban(self, status_code, headers=None):
+        """Rejestruje odpowiedź 429/418 i wstrzymuje ruch do końca blokady (Retry-After)"""
+        if status_code not in BAN_STATUS_CODES:
+            return
+        retry_after = _header(headers, 'Retry-After')
+        try:
+            seconds = float(retry_after) if retry_after is not None else DEFAULT_BAN_SECONDS
+        except ValueError:
+            seconds = DEFAULT_BAN_SECONDS
+        with self._cond:
+            self._banned_until = max(self._banned_until, time.time() + seconds)
+            self._cond.notify_all()
+
+    def current_priority(self, default=PRIORITY_MONITOR):
+        return getattr(self._local, 'priority', default)
+
+    @contextmanager
+    def priority(self, priority):
+        """Ustawia klasę priorytetu dla wszystkich zapytań wykonywanych w bieżącym wątku"""
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            if previous is None:
+                del self._local.priority
+            else:
+                self._local.priority = previous
+
+    def usage(self):
+        """Zwraca bieżące wykorzystanie budżetu wagi"""
+        with self._cond:
+            self._roll_window()
+            return {
+                "used_weight": self._used_weight,
+                "weight_limit": self.weight_limit,
+                "usage_percent": round(self._used_weight / self.weight_limit * 100, 2),
+                "banned_for": max(0.0, round(self._banned_until - time.time(), 1)),
+                "waiting": {PRIORITY_NAMES.get(p, p): n for p, n in self._waiting.items()},
+                "served": {PRIORITY_NAMES.get(p, p): n for p, n in self._served.items()},
+            }
+
+
+class ScheduledClient:
+    """
+    Nakładka na klienta python-binance kierująca każde wywołanie API przez RequestWeightScheduler.
+
+    Metody składania/anulowania zleceń mają domyślnie priorytet PRIORITY_ORDER, pozostałe
+    PRIORITY_MONITOR, chyba że wątek ustawił inny priorytet przez scheduler.priority(...).
+    Odczyty monitoringu zablokowane przez 429/418 są ponawiane po końcu blokady.
+
+    Nagłówki wagi są brane z odpowiedzi danego wywołania: hook sesji requests zapisuje ją
+    w zmiennej lokalnej wątku (client.response jest wspólne dla wszystkich wątków).
+    """
+
+    def __init__(self, client, scheduler):
+        self._client = client
+        self.scheduler = scheduler
+        self._local = threading.local()
+        session = getattr(client, 'session', None)
+        hooks = getattr(session, 'hooks', None)
+        if isinstance(hooks, dict):
+            hooks.setdefault('response', []).append(self._remember_response)
+
+    def _remember_response(self, response, *args, **kwargs):
+        self._local.response = response
+        return response
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_') or not name.split('_')[0] in ('get', 'create', 'cancel', 'order'):
+            return attr
+
+        weight = CLIENT_METHOD_WEIGHTS.get(name, 1)
+        default_priority = PRIORITY_ORDER if name in CLIENT_ORDER_METHODS else PRIORITY_MONITOR
+
+        def scheduled_call(*args, **kwargs):
+            priority = self.scheduler.current_priority(default_priority)
+            attempts = 2 if priority == PRIORITY_MONITOR else 1
+            for attempt in range(attempts):
+                self.scheduler.acquire(weight, priority)
+                self._local.response = None
+                try:
+                    result = attr(*args, **kwargs)
+                except Exception as e:
+                    response = getattr(e, 'response', None)
+                    status_code = getattr(e, 'status_code', None) or getattr(response, 'status_code', None)
+                    if status_code in BAN_STATUS_CODES:
+                        self.scheduler.record_ban(status_code, getattr(response, 'headers', None))
+                        if attempt < attempts - 1:
+                            continue
+                    raise
+                response = self._local.response
+                if response is not None:
+                    self.scheduler.update_from_headers(response.headers)
+                return result
+
+        return scheduled_call
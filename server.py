@@ -1,51 +1,149 @@
 from flask import Flask, request, jsonify
-import requests
+import asyncio
 import os
-from telethon import TelegramClient
-from telethon.tl.functions.messages import ReadHistoryRequest
+import queue
+import threading
+from datetime import datetime, timezone
 
 app = Flask(__name__)
 
-# Konfiguracja klienta Telegram
-api_id = os.getenv('API_ID')
-api_hash = os.getenv('API_HASH')
-client = TelegramClient('session_name', api_id, api_hash)
+WEBHOOK_QUEUE_SIZE = 1000  # Maksymalna liczba wiadomości czekających na worker
+
+# Webhook tylko przyjmuje wiadomość; obsługa odbywa się w jednym, długo żyjącym wątku
+webhook_queue = queue.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+
 
 # Funkcja do przetwarzania sygnałów
-async def process_signals(channel_name, limit=3):
-    async for dialog in client.iter_dialogs():
-        if dialog.name == channel_name and isinstance(dialog.entity, Channel):
-            channel = dialog.entity
-            break
-    else:
+async def process_signals(client, channel_name, formats, limit=3):
+    """Sygnały (w formatach kanału) spośród `limit` ostatnich wiadomości kanału"""
+    from telethon.tl.functions.messages import ReadHistoryRequest
+    from channel_registry import channel_registry
+    from signal_dispatcher import classify_message
+
+    channel = await channel_registry.get_channel(client, channel_name)
+    if channel is None:
         print(f"Kanał o nazwie '{channel_name}' nie został znaleziony.")
         return []
 
     signals = []
-    async for message in client.iter_messages(channel, search="Crypto Signal Alert:", limit=limit):
-        if message.text:
-            signals.append(message.text)
+    async for message in client.iter_messages(channel, limit=limit):
+        if classify_message(message.text, formats):
+            signals.append({
+                "text": message.text,
+                "date": message.date.isoformat() if message.date else None,
+            })
             # Oznacz wiadomość jako przeczytaną
             await client(ReadHistoryRequest(peer=channel, max_id=message.id))
     return signals
 
+
+def payload_to_message(payload):
+    """Wyciąga z payloadu webhooka {'text', 'date', 'channel'} albo None"""
+    message = payload.get('message') if isinstance(payload, dict) else None
+    if not isinstance(message, dict) or not isinstance(message.get('chat'), dict):
+        return None
+    date = message.get('date')
+    return {
+        "text": message.get('text', ''),
+        "date": datetime.fromtimestamp(date, tz=timezone.utc).isoformat() if isinstance(date, (int, float)) else date,
+        "channel": message['chat'].get('title'),
+    }
+
+
+class WebhookWorker(threading.Thread):
+    """
+    Jeden wątek z własną, trwałą pętlą asyncio, który obsługuje wiadomości z webhook_queue.
+
+    Klient Telegram łączy się raz przy starcie wątku (zamiast `with client:` przy każdym
+    zapytaniu), a zapytania do Binance idą przez wspólnego klienta z common. Dla testów
+    obciążeniowych można podać własny handler(message) zamiast obsługi sygnałów.
+
+    Endpoint nie jest uwierzytelniony, więc payload jest tylko wyzwalaczem: handel odbywa się
+    wyłącznie na wiadomościach pobranych z kanału przez klienta Telegram, nigdy na treści z zapytania.
+
+    Tryb webhook zastępuje main.py - nie uruchamiamy ich razem (deduplikacja sygnałów działa
+    w obrębie procesu), czego pilnuje claim_trading_process przy starcie serwera.
+    """
+
+    def __init__(self, work_queue=webhook_queue, handler=None):
+        super().__init__(name="webhook-worker", daemon=True)
+        self.work_queue = work_queue
+        self.handler = handler
+        self.client = None
+        self.loop = None
+        self.processed = 0
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._run())
+
+    async def _connect(self):
+        from common import create_telegram_client
+        self.client = create_telegram_client('session_name')
+        await self.client.start()
+
+    async def fetch_signals(self, channel_name, formats):
+        """Ostatnie sygnały kanału pobrane przez trwałe połączenie Telegram"""
+        return await process_signals(self.client, channel_name, formats)
+
+    async def handle_message(self, message):
+        from signal_dispatcher import process_message, CHANNEL_FORMATS
+
+        print(f"Otrzymano powiadomienie z kanału {message['channel']}")
+        # Tylko skonfigurowane kanały i tylko ich formaty (bez tego dowolny kanał z payloadu
+        # mógłby uruchomić parser innego kanału, a przy brakach pól także zapytanie do modelu)
+        formats = CHANNEL_FORMATS.get(message["channel"])
+        if formats is None:
+            print(f"Pomijam powiadomienie z nieobsługiwanego kanału: {message['channel']}")
+            return
+        # Treść payloadu nie trafia do dyspozytora - przetwarzane są tylko wiadomości z kanału
+        for signal in await self.fetch_signals(message["channel"], formats):
+            print(f"Przetwarzanie sygnału: {signal['text']}")
+            await process_message(signal, formats)
+
+    async def _run(self):
+        handler = self.handler
+        if handler is None:
+            await self._connect()
+            handler = self.handle_message
+        while True:
+            message = await self.loop.run_in_executor(None, self.work_queue.get)
+            try:
+                if message is None:
+                    break
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    await result
+                self.processed += 1
+            except Exception as e:
+                print(f"Błąd obsługi wiadomości z webhooka: {e}")
+            finally:
+                self.work_queue.task_done()
+        if self.client is not None:
+            await self.client.disconnect()
+
+    def stop(self):
+        self.work_queue.put(None)
+
+
 # Endpoint dla webhooka
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    data = request.json
-    if 'message' in data:
-        message_text = data['message'].get('text', '')
-        channel_name = data['message']['chat']['title']
-        print(f"Otrzymano wiadomość z kanału {channel_name}: {message_text}")
-
-        # Sprawdź, czy wiadomość zawiera sygnał handlowy
-        if "Crypto Signal Alert:" in message_text:
-            with client:
-                signals = client.loop.run_until_complete(process_signals(channel_name))
-                for signal in signals:
-                    print(f"Przetwarzanie sygnału: {signal}")
-                    # Tutaj dodaj kod do ustawienia transakcji
-    return jsonify({"status": "ok"})
+    message = payload_to_message(request.get_json(silent=True))
+    if message is None:
+        return jsonify({"status": "ignored"}), 200
+    try:
+        webhook_queue.put_nowait(message)
+    except queue.Full:
+        return jsonify({"status": "busy"}), 503
+    return jsonify({"status": "accepted"}), 202
+
 
 if __name__ == '__main__':
-    app.run(port=5000)
\ No newline at end of file
+    from common import claim_trading_process
+
+    if not claim_trading_process("server.py"):
+        raise SystemExit("Handel prowadzi już inny proces (main.py albo server.py) - zobacz logfile.txt")
+    WebhookWorker().start()
+    app.run(port=int(os.getenv('WEBHOOK_PORT', '5000')), threaded=True)
@@ -0,0 +1,106 @@
+import importlib
+import re
+
+from channel_registry import CRYPTO_SIGNALS_CHANNEL, BINANCE_KILLERS_CHANNEL, BYBIT_SIGNALS_CHANNEL
+from common import log_to_file
+from text_normalization import normalize_signal_text
+
+# Formaty sygnałów w kolejności pierwszeństwa (wiadomość pasująca do kilku trafia do pierwszego)
+CRYPTO_SIGNAL_ALERT = 'crypto_signal_alert'
+ALGO_BOT = 'algo_bot'
+BINANCE_KILLERS = 'binance_killers'
+BYBIT_STANDARD = 'bybit_standard'
+SIGNAL_FORMATS = (CRYPTO_SIGNAL_ALERT, ALGO_BOT, BINANCE_KILLERS, BYBIT_STANDARD)
+
+# Formaty dopuszczalne na poszczególnych kanałach
+CRYPTO_SIGNALS_FORMATS = (CRYPTO_SIGNAL_ALERT, ALGO_BOT)
+BINANCE_KILLERS_FORMATS = (BINANCE_KILLERS,)
+BYBIT_SIGNALS_FORMATS = (BYBIT_STANDARD,)
+CHANNEL_FORMATS = {
+    CRYPTO_SIGNALS_CHANNEL: CRYPTO_SIGNALS_FORMATS,
+    BINANCE_KILLERS_CHANNEL: BINANCE_KILLERS_FORMATS,
+    BYBIT_SIGNALS_CHANNEL: BYBIT_SIGNALS_FORMATS,
+}
+
+# Formaty, których parser uzupełnia brakujące pola szablonem albo modelem (parametr offline)
+AI_FILLED_FORMATS = (BINANCE_KILLERS,)
+
+# Wszystkie słowa kluczowe formatów w jednym wzorcu - wiadomość jest skanowana raz.
+# Żadne słowo nie zawiera innego, więc nienakładające się dopasowania finditer znajdują wszystkie.
+_KEYWORDS = re.compile(
+    r"Crypto Signal Alert:|Powered by @AlgoBot|SIGNAL ID:|Entry|Target|Stop-Loss|Take-Profit|#"
+)
+
+# Format -> (moduł, parser, funkcja przetwarzająca); importowane przy pierwszym użyciu,
+# bo moduły kanałów same korzystają z dyspozytora
+_ROUTES = {
+    CRYPTO_SIGNAL_ALERT: ('crypto_signals_channel', 'parse_signal_message', 'process_signal_message'),
+    ALGO_BOT: ('crypto_signals_channel', 'parse_signal_message_algo', 'process_algo_bot_message'),
+    BINANCE_KILLERS: ('binance_killers_signal_chanel', 'parse_binance_killers_signal_message',
+                      'process_binance_killers_signal_message'),
+    BYBIT_STANDARD: ('bybit_signals_channel', 'parse_signal_message_byBit_standard', 'process_byBit_standard_message'),
+}
+
+
+def _matches(signal_format, keywords):
+    if signal_format == CRYPTO_SIGNAL_ALERT:
+        return "Crypto Signal Alert:" in keywords
+    if signal_format == ALGO_BOT:
+        return "Powered by @AlgoBot" in keywords
+    if signal_format == BINANCE_KILLERS:
+        # Parser Binance Killers i tak odrzuca wiadomości bez Entry/Target/Stop-Loss
+        return "SIGNAL ID:" in keywords and not keywords.isdisjoint(("Entry", "Target", "Stop-Loss"))
+    if signal_format == BYBIT_STANDARD:
+        return "#" in keywords and not keywords.isdisjoint(("Entry", "Take-Profit"))
+    return False
+
+
+def classify_message(message_text, formats=SIGNAL_FORMATS):
+    """
+    Format sygnału wiadomości (jeden z `formats`, w kolejności pierwszeństwa SIGNAL_FORMATS)
+    albo None, jeśli wiadomość nie jest sygnałem - bez uruchamiania żadnego parsera.
+    """
+    if not message_text:
+        return None
+    keywords = set(_KEYWORDS.findall(message_text))
+    if not keywords:
+        return None
+    for signal_format in SIGNAL_FORMATS:
+        if signal_format in formats and _matches(signal_format, keywords):
+            return signal_format
+    return None
+
+
+def _route(signal_format, index):
+    module_name = _ROUTES[signal_format][0]
+    return getattr(importlib.import_module(module_name), _ROUTES[signal_format][index])
+
+
+def parse_message(message_text, formats=SIGNAL_FORMATS, offline=False):
+    """
+    (format, dane sygnału) z parsera właściwego dla wiadomości albo (None, None).
+    Tekst jest normalizowany raz (normalize_signal_text) przed klasyfikacją i parsowaniem.
+    offline=True: bez uzupełniania pól szablonem/modelem (AI_FILLED_FORMATS) - niepełne dane.
+    """
+    message_text = normalize_signal_text(message_text)
+    signal_format = classify_message(message_text, formats)
+    if signal_format is None:
+        return None, None
+    if offline and signal_format in AI_FILLED_FORMATS:
+        return signal_format, _route(signal_format, 1)(message_text, offline=True)
+    return signal_format, _route(signal_format, 1)(message_text)
+
+
+async def process_message(message, formats=SIGNAL_FORMATS):
+    """
+    Przekazuje wiadomość {'text', 'date'} do funkcji przetwarzającej jej format, z tekstem
+    znormalizowanym raz przed klasyfikacją. Zwraca rozpoznany format albo None, jeśli
+    wiadomość została odrzucona.
+    """
+    text = normalize_signal_text(message.get("text"))
+    signal_format = classify_message(text, formats)
+    if signal_format is not None:
+        log_to_file(f"Nowa wiadomość ({signal_format}): {text}")
+        print(f"Nowy sygnał: {text}")
+        await _route(signal_format, 2)({**message, "text": text})
+    return signal_format
@@ -0,0 +1,102 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+FINGERPRINT_TTL = 6 * 3600  # Sekundy, przez które odcisk sygnału blokuje duplikaty
+FINGERPRINT_MAX_SIZE = 1000
+TIME_BUCKET = 3600  # Sekundy; ten sam sygnał z innego kanału pojawia się zwykle w ciągu godziny
+PRICE_SIGNIFICANT_DIGITS = 4
+
+
+def round_significant(value, digits=PRICE_SIGNIFICANT_DIGITS):
+    """Zaokrąglenie do cyfr znaczących - różne kanały podają ceny z różną precyzją"""
+    value = float(value)
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, digits - 1 - int(math.floor(math.log10(abs(value)))))
+
+
+def normalize_symbol(currency):
+    return str(currency).upper().replace('/', '').replace('-', '').replace(' ', '')
+
+
+def signal_timestamp(signal):
+    date = signal.get("date")
+    if date:
+        try:
+            return datetime.fromisoformat(str(date).replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def signal_fingerprint(signal, bucket=None):
+    """
+    Znormalizowany odcisk sygnału: para, kierunek, zaokrąglone wejście i targety, przedział czasu.
+    Ten sam sygnał wysłany na kilka kanałów w innym formacie daje ten sam odcisk.
+    """
+    if bucket is None:
+        bucket = int(signal_timestamp(signal) // TIME_BUCKET)
+    targets = tuple(round_significant(target) for target in signal.get("targets") or [])
+    return (
+        normalize_symbol(signal.get("currency", "")),
+        str(signal.get("signal_type", "")).upper(),
+        round_significant(signal.get("entry") or 0),
+        targets,
+        bucket,
+    )
+
+
+class SignalFingerprintCache:
+    """
+    Ograniczony (max_size, najstarsze usuwane pierwsze) i wygasający (ttl) zbiór odcisków
+    obsłużonych sygnałów. Sprawdzany jest przedział czasu sygnału i oba sąsiednie, aby duplikat
+    wysłany tuż po granicy przedziału (albo starsza kopia obsłużona później, np. przy
+    nadrabianiu) również został rozpoznany.
+    """
+
+    def __init__(self, ttl=FINGERPRINT_TTL, max_size=FINGERPRINT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _expire(self, now):
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def check_and_add(self, signal):
+        """
+        True, jeśli sygnał jest nowy (odcisk zostaje zarezerwowany); False dla duplikatu.
+        Rezerwację sygnału, dla którego nie otwarto pozycji, zwalnia discard().
+        """
+        bucket = int(signal_timestamp(signal) // TIME_BUCKET)
+        fingerprint = signal_fingerprint(signal, bucket)
+        neighbours = (signal_fingerprint(signal, bucket - 1), signal_fingerprint(signal, bucket + 1))
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if fingerprint in self._entries or any(key in self._entries for key in neighbours):
+                return False
+            self._entries[fingerprint] = now + self.ttl
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True
+
+    def discard(self, signal):
+        """Usuwa odcisk sygnału - kopia tego sygnału znowu może zostać obsłużona"""
+        with self._lock:
+            self._entries.pop(signal_fingerprint(signal), None)
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._entries)
+
+
+signal_fingerprints = SignalFingerprintCache()
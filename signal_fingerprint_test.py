@@ -0,0 +1,87 @@
+"""
+Test odcisków sygnałów (signal_fingerprint.py) - bez sieci i bez Binance.
+
+Sprawdzane przypadki:
+- ten sam sygnał w innym zapisie (para ze "/", kierunek małymi literami, ceny z inną
+  precyzją, inna kolejność pól) daje ten sam odcisk,
+- inny sygnał (inna para, kierunek, wejście) nie jest duplikatem,
+- kopia z sąsiedniego przedziału czasu - późniejszego i wcześniejszego - jest duplikatem,
+  kopia dwa przedziały dalej już nie,
+- odcisk wygasa po ttl, a przy max_size usuwany jest najstarszy,
+- discard() zwalnia odcisk (transakcja nieudana przed zakupem).
+
+    python signal_fingerprint_test.py
+
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from signal_fingerprint import TIME_BUCKET, SignalFingerprintCache, signal_fingerprint
+
+BASE_DATE = datetime(2025, 1, 17, 12, 30, tzinfo=timezone.utc)
+
+
+def make_signal(currency="DOGEUSDT", signal_type="LONG", entry=0.41124, targets=(0.41946, 0.42358),
+                shift_seconds=0):
+    return {
+        "currency": currency,
+        "signal_type": signal_type,
+        "entry": entry,
+        "targets": list(targets),
+        "stop_loss": 0.39479,
+        "date": (BASE_DATE + timedelta(seconds=shift_seconds)).isoformat(),
+    }
+
+
+def run_checks():
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    signal = make_signal()
+    copy = make_signal(currency="doge/usdt", signal_type="long", entry=0.411241, targets=(0.419460001, 0.42358))
+    copy["stop_loss"] = 0.38
+    check("ten sam sygnał w innym zapisie daje ten sam odcisk", signal_fingerprint(signal) == signal_fingerprint(copy))
+    check("data z 'Z' jak z +00:00",
+          signal_fingerprint(dict(signal, date="2025-01-17T12:30:00Z")) == signal_fingerprint(signal))
+
+    cache = SignalFingerprintCache()
+    check("pierwszy sygnał jest nowy", cache.check_and_add(signal))
+    check("kopia z innego kanału jest duplikatem", not cache.check_and_add(copy))
+    check("inna para nie jest duplikatem", cache.check_and_add(make_signal(currency="ARBUSDT")))
+    check("inny kierunek nie jest duplikatem", cache.check_and_add(make_signal(signal_type="SHORT")))
+    check("inne wejście nie jest duplikatem", cache.check_and_add(make_signal(entry=0.43)))
+
+    check("kopia z następnego przedziału czasu jest duplikatem",
+          not cache.check_and_add(make_signal(shift_seconds=TIME_BUCKET)))
+    check("kopia z poprzedniego przedziału (obsłużona później) jest duplikatem",
+          not cache.check_and_add(make_signal(shift_seconds=-TIME_BUCKET)))
+    check("kopia dwa przedziały później nie jest duplikatem",
+          cache.check_and_add(make_signal(shift_seconds=2 * TIME_BUCKET)))
+
+    cache.discard(signal)
+    check("po discard() sygnał znowu jest nowy", cache.check_and_add(copy))
+
+    short_lived = SignalFingerprintCache(ttl=0.05)
+    short_lived.check_and_add(signal)
+    time.sleep(0.1)
+    check("odcisk wygasa po ttl", len(short_lived) == 0 and short_lived.check_and_add(signal))
+
+    small = SignalFingerprintCache(max_size=2)
+    for currency in ("AUSDT", "BUSDT", "CUSDT"):
+        small.check_and_add(make_signal(currency=currency))
+    check("przy max_size usuwany jest najstarszy odcisk",
+          len(small) == 2 and small.check_and_add(make_signal(currency="AUSDT"))
+          and not small.check_and_add(make_signal(currency="CUSDT")))
+    return failures
+
+
+if __name__ == '__main__':
+    failures = run_checks()
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -1,8 +1,10 @@
 import json
 import os
 import time
-from common import client, log_to_file, adjust_price, adjust_quantity, get_order_details, get_min_notional, create_oco_order_direct, get_order_reports, get_all_oco_orders_for_symbol
+from common import client, exchange_metadata, weight_scheduler, trade_history, balance_ledger, get_price_snapshot, log_to_file, adjust_price, adjust_quantity, get_order_details, get_min_notional, create_oco_order_direct, get_order_reports, get_all_oco_orders_for_symbol, history_lock, store_signal
 from binance.exceptions import BinanceAPIException
+from request_scheduler import PRIORITY_ORDER
+from user_data_stream import order_mirror, LIST_ACTIVE
 import traceback
 
 SIGNAL_HISTORY_FILE = 'signal_history.json'
@@ -20,32 +22,26 @@ def save_signal_history(history):
 def handle_critical_error(signal):
     symbol = signal["currency"]
     try:
-        account = client.get_account()
-        symbol_info = client.get_symbol_info(symbol)
-        base_asset = symbol_info['baseAsset']
-        base_balance = float(next((b['free'] for b in account['balances'] if b['asset'] == base_asset), 0))
+        # Ilość zamykającego zlecenia z aktualnego stanu konta (OCO mogło się zrealizować)
+        base_balance = get_base_balance(symbol, fresh=True)
 
         if base_balance > 0:
             closing_side = 'SELL' if signal['signal_type'] == 'LONG' else 'BUY'
             adjusted_quantity = adjust_quantity(symbol, base_balance)
 
             if adjusted_quantity > 0:
-                client.create_order(
+                order = client.create_order(
                     symbol=symbol,
                     side=closing_side,
                     type='MARKET',
                     quantity=adjusted_quantity
                 )
+                balance_ledger.apply_order_fill(order)
                 log_to_file(f"Awaryjne zamknięcie pozycji dla {symbol}, ilość: {adjusted_quantity}")
 
         signal["status"] = "CLOSED"
         signal["error"] = "CRITICAL_ERROR"
-        history = load_signal_history()
-        for i, s in enumerate(history):
-            if s["currency"] == signal["currency"] and s["date"] == signal["date"]:
-                history[i] = signal
-                break
-        save_signal_history(history)
+        store_signal(signal, append=False)
 
     except Exception as e:
         log_to_file(f"Błąd podczas obsługi sytuacji krytycznej dla {symbol}: {e}")
@@ -72,8 +68,7 @@ def update_signal_high_price(signal, current_price):
     
     # Sprawdź, czy osiągnięto cel 1 i czy cena spadła o 5 ticków poniżej maksymalnej
     if signal.get('current_target_level', 0) >= 1:
-        symbol_info = client.get_symbol_info(signal['currency'])
-        tick_size = float(next(filter(lambda f: f['filterType'] == 'PRICE_FILTER', symbol_info['filters']))['tickSize'])
+        tick_size = exchange_metadata.get_filters(signal['currency']).tick_size
         
         price_difference = abs(signal['highest_price'] - current_price)
         ticks_difference = price_difference / tick_size
@@ -90,15 +85,10 @@ def update_signal_high_price(signal, current_price):
 
 
 
-def get_base_balance(symbol):
-    """Pobiera saldo dla danej pary tradingowej"""
-    symbol_info = client.get_symbol_info(symbol)
-    base_asset = symbol_info['baseAsset']
-    account = client.get_account()
-    return float(next(
-        (b['free'] for b in account['balances'] if b['asset'] == base_asset),
-        0
-    ))
+def get_base_balance(symbol, fresh=False):
+    """Pobiera saldo dla danej pary tradingowej (fresh=True - aktualne, patrz BalanceLedger.get_free)"""
+    base_asset = exchange_metadata.get_filters(symbol).base_asset
+    return balance_ledger.get_free(base_asset, fresh=fresh)
 
 def calculate_profit(signal, exit_price, exit_quantity):
     """Oblicza zysk lub stratę na podstawie danych z sygnału i zlecenia."""
@@ -157,63 +147,111 @@ def update_signal_with_profit_info(signal, filled_order):
     except Exception as e:
         log_to_file(f"Błąd podczas aktualizacji informacji o zysku w sygnale: {e}")
 
+def value_balances_in_usdt(balances, prices):
+    """Wycenia salda w USDT na podstawie migawki cen z bieżącego cyklu"""
+    total = 0.0
+    for asset, amount in balances.items():
+        if asset == 'USDT':
+            total += amount
+        elif f"{asset}USDT" in prices:
+            total += amount * prices[f"{asset}USDT"]
+    return total
+
 def get_total_balance():
     """Pobiera pełne saldo (wolne + zablokowane) dla wszystkich aktywów."""
     try:
-        account = client.get_account()
-        balances = {}
-        for asset_info in account['balances']:
-            asset = asset_info['asset']
-            total = float(asset_info['free']) + float(asset_info['locked'])
-            if total > 0:
-                balances[asset] = total
-        return balances
+        return balance_ledger.totals()
     except Exception as e:
         log_to_file(f"Błąd podczas pobierania całkowitych sald: {e}")
         return {}
     
     
 
-def check_and_update_signal_history():
+def find_oco_fill_in_trades(signal, oco_order_id):
+    """
+    Szuka realizacji nogi OCO w przyrostowej historii transakcji (ścieżka REST, gdy strumień
+    nie zna listy). Pobierane są tylko transakcje nowsze niż ostatnio widziane.
+    """
+    symbol = signal["currency"]
+    oco_orders = signal.get("orders", [])
+    legs = [
+        o for o in oco_orders
+        if o["type"] in ("STOP_LOSS_LIMIT", "LIMIT_MAKER") and o.get("oco_group_id") == oco_order_id
+    ]
+    if not legs:
+        return None
+
+    trade_history.sync_trades(symbol)
+    for leg in legs:
+        fill = trade_history.get_order_fill(symbol, leg.get("orderId"), sync=False)
+        if fill:
+            fill['type'] = leg["type"]
+            return fill
+    return None
+
+def check_and_update_signal_history(prices=None, symbols=None):
+    """
+    Jeden cykl monitorowania otwartych sygnałów. Wszystkie sygnały oceniane są względem
+    tej samej migawki cen (jedno zapytanie na cykl zamiast tickera dla każdego sygnału).
+    Przy podanym `symbols` oceniane są tylko sygnały tych par (wyzwalanie ze strumienia cen).
+    """
+    # Cały cykl pod wspólną blokadą historii: cykl okresowy, wyzwalany strumieniem cen i zapisy
+    # z transakcji nie mogą jednocześnie modyfikować pliku
+    with history_lock:
+        _check_and_update_signal_history(prices, symbols)
+
+
+def _check_and_update_signal_history(prices, symbols):
     history = load_signal_history()
+    log_to_file(f"Wykorzystanie wagi API: {weight_scheduler.usage()}")
     updated = False
+
+    if not any(signal.get("status") == "OPEN" and (symbols is None or signal["currency"] in symbols) for signal in history):
+        return
     all_balances = get_total_balance()
 
+    if prices is None:
+        try:
+            prices = get_price_snapshot()
+        except Exception as e:
+            log_to_file(f"Błąd podczas pobierania migawki cen: {e}")
+            return
+    log_to_file(f"Wartość portfela: {value_balances_in_usdt(all_balances, prices):.2f} USDT")
+
     for signal in history:
         if signal.get("status") != "OPEN":
             continue
+        if symbols is not None and signal["currency"] not in symbols:
+            continue
 
         symbol = signal["currency"]
         base_asset = symbol.replace("USDT", "")
         active_oco = None
 
         try:
-            # Pobranie aktualnej ceny
-            current_price = float(client.get_symbol_ticker(symbol=symbol)['price'])
+            # Aktualna cena z migawki cyklu
+            if symbol in prices:
+                current_price = prices[symbol]
+            else:
+                current_price = float(client.get_symbol_ticker(symbol=symbol)['price'])
             signal = update_signal_high_price(signal, current_price)
             updated = True
 
             # Pobranie salda
             base_balance = all_balances.get(base_asset, 0)
 
-            # Pobranie informacji o symbolu, jeśli brak
-            if "symbol_info" not in signal:
-                signal["symbol_info"] = client.get_symbol_info(symbol)
-                log_to_file(f"Pobrano symbol_info dla {symbol}")
-            symbol_info = signal["symbol_info"]
-
-            # Minimalna wartość notionalna
-            notional_filter = next(
-                (f for f in symbol_info['filters'] if f['filterType'] == 'NOTIONAL'),
-                None
-            )
-            min_notional = float(notional_filter['minNotional']) if notional_filter else 0
+            # Minimalna wartość notionalna z cache exchangeInfo
+            min_notional = exchange_metadata.get_filters(symbol).min_notional
             notional_value = base_balance * current_price
 
-            # Sprawdzenie aktywnych zleceń OCO
-            all_oco_orders = client.get_open_orders(symbol=symbol)
+            # Sprawdzenie aktywnych zleceń OCO - z lokalnego odbicia strumienia, jeśli zna tę listę
             oco_order_id = signal.get("oco_order_id")
-            active_oco = any(order.get('orderListId') == oco_order_id for order in all_oco_orders)
+            list_state = order_mirror.list_state(oco_order_id) if order_mirror.synced else None
+            if list_state is None:
+                all_oco_orders = client.get_open_orders(symbol=symbol)
+                active_oco = any(order.get('orderListId') == oco_order_id for order in all_oco_orders)
+            else:
+                active_oco = list_state == LIST_ACTIVE
 
             # Określenie celów i osiągniętego celu
             targets = signal.get("targets", [])
@@ -237,62 +275,23 @@ def check_and_update_signal_history():
                 f"osiągnięty_cel={achieved_target if achieved_target else 'Brak'}"
             )
 
-            # Sprawdzenie historii OCO, jeśli nie jest aktywne, ale było zdefiniowane
+            # Sprawdzenie realizacji OCO, jeśli nie jest aktywne, ale było zdefiniowane
             if oco_order_id and not active_oco:
-                # Pobierz historię zleceń
-                trades = client.get_my_trades(symbol=symbol)
-                oco_orders = signal.get("orders", [])
-                
-                # Znajdź zlecenia OCO
-                stop_loss_order = next((o for o in oco_orders if o["type"] == "STOP_LOSS_LIMIT" and o["oco_group_id"] == oco_order_id), None)
-                take_profit_order = next((o for o in oco_orders if o["type"] == "LIMIT_MAKER" and o["oco_group_id"] == oco_order_id), None)
-                
-                # Sprawdź historię handlu, aby znaleźć zrealizowane zlecenie
-                filled_order = None
-                for trade in trades:
-                    # Sprawdź czy zlecenie Stop Loss zostało zrealizowane
-                    if stop_loss_order and trade.get("orderId") == stop_loss_order.get("orderId") and float(trade.get("qty", 0)) > 0:
-                        log_to_file(f"OCO dla {symbol} zrealizowane na Stop Loss przy cenie {trade['price']}")
-                        signal["status"] = "CLOSED"
-                        signal["status_description"] = f"Stop Loss wykonany przy cenie {trade['price']}"
-                        filled_order = {
-                            'price': trade['price'],
-                            'executedQty': trade['qty'],
-                            'type': 'STOP_LOSS_LIMIT',
-                            'time': trade['time']
-                        }
-                        signal["exit_time"] = trade["time"]
-                        updated = True
-                        break
-                    # Sprawdź czy zlecenie Take Profit zostało zrealizowane
-                    elif take_profit_order and trade.get("orderId") == take_profit_order.get("orderId") and float(trade.get("qty", 0)) > 0:
-                        log_to_file(f"OCO dla {symbol} zrealizowane na Take Profit przy cenie {trade['price']}")
-                        signal["status"] = "CLOSED"
-                        signal["status_description"] = f"Take Profit wykonany przy cenie {trade['price']}"
-                        filled_order = {
-                            'price': trade['price'],
-                            'executedQty': trade['qty'],
-                            'type': 'LIMIT_MAKER',
-                            'time': trade['time']
-                        }
-                        signal["exit_time"] = trade["time"]
-                        updated = True
-                        break
-                
+                if list_state is not None:
+                    filled_order = order_mirror.get_list_fill(oco_order_id)
+                else:
+                    filled_order = find_oco_fill_in_trades(signal, oco_order_id)
+
                 # Jeśli znaleziono zrealizowane zlecenie, aktualizuj informacje o zysku
                 if filled_order:
-                    update_signal_with_profit_info(signal, filled_order)
-                # Jeśli nie znaleziono realizacji w historii, ale saldo jest znacznie mniejsze niż poprzednio, 
-                # to zlecenie mogło zostać zrealizowane, ale nie znaleźliśmy go w historii
-                elif base_balance < float(signal.get('real_amount', 0)) * 0.5:
-                    log_to_file(f"OCO dla {symbol} prawdopodobnie zrealizowane, ale nie znaleziono w historii. Saldo: {base_balance}")
+                    leg_name = "Take Profit" if filled_order['type'] == 'LIMIT_MAKER' else "Stop Loss"
+                    log_to_file(f"OCO dla {symbol} zrealizowane na {leg_name} przy cenie {filled_order['price']}")
                     signal["status"] = "CLOSED"
-                    signal["status_description"] = "OCO prawdopodobnie zrealizowane"
-                    signal["exit_price"] = current_price
-                    signal["exit_time"] = int(time.time() * 1000)
-                    close_remaining_balance(signal)
+                    signal["status_description"] = f"{leg_name} wykonany przy cenie {filled_order['price']}"
+                    signal["exit_time"] = filled_order["time"]
+                    update_signal_with_profit_info(signal, filled_order)
                     updated = True
-                # Jeśli brak realizacji w historii, OCO mogło wygasnąć
+                # Jeśli brak realizacji, OCO mogło wygasnąć
                 elif base_balance > 0:
                     log_to_file(f"OCO dla {symbol} (ID: {oco_order_id}) wygasło, saldo nadal istnieje: {base_balance}")
                     # Zamykamy pozycję ręcznie
@@ -302,6 +301,12 @@ def check_and_update_signal_history():
                     signal["exit_time"] = int(time.time() * 1000)
                     close_remaining_balance(signal)
                     updated = True
+                else:
+                    log_to_file(f"Zamykanie sygnału {symbol}: Brak salda i aktywnego OCO (ID: {oco_order_id})")
+                    signal["status"] = "CLOSED"
+                    signal["status_description"] = "Brak salda i aktywnego OCO"
+                    signal["exit_time"] = int(time.time() * 1000)
+                    updated = True
 
             # Zamknięcie, jeśli wszystkie cele osiągnięte i brak OCO
             elif active_oco is False and achieved_target and achieved_target >= len(targets):
@@ -433,17 +438,19 @@ def close_remaining_balance(signal):
     """Zamyka pozostałe saldo dla danej waluty jako zlecenie market"""
     symbol = signal["currency"]
     try:
-        base_balance = get_base_balance(symbol)
+        # Ilość zamykającego zlecenia z aktualnego stanu konta (OCO mogło się zrealizować)
+        base_balance = get_base_balance(symbol, fresh=True)
         if base_balance > 0:
             adjusted_quantity = adjust_quantity(symbol, base_balance)
             if adjusted_quantity > 0:
                 closing_side = 'SELL' if signal['signal_type'] == 'LONG' else 'BUY'
-                client.create_order(
+                order = client.create_order(
                     symbol=symbol,
                     side=closing_side,
                     type='MARKET',
                     quantity=adjusted_quantity
                 )
+                balance_ledger.apply_order_fill(order)
                 log_to_file(f"Zamknięto pozostałe saldo dla {symbol}, ilość: {adjusted_quantity}")
             else:
                 log_to_file(f"Pozostałe saldo dla {symbol} zbyt małe do zamknięcia: {base_balance}")
@@ -454,8 +461,14 @@ def close_remaining_balance(signal):
 
 
 def handle_targets(signal, current_price, base_balance):
-    from binance_trading import add_order_to_history
     """Aktualizuje OCO przy osiągnięciu kolejnego targetu i według nowych zasad"""
+    # Przestawianie OCO to składanie/anulowanie zleceń - wyprzedza odczyty monitoringu
+    with weight_scheduler.priority(PRIORITY_ORDER):
+        return _handle_targets(signal, current_price, base_balance)
+
+
+def _handle_targets(signal, current_price, base_balance):
+    from binance_trading import add_order_to_history
     is_long = signal['signal_type'] == 'LONG'
     targets = validate_targets(signal)
     symbol = signal["currency"]
@@ -496,7 +509,7 @@ def handle_targets(signal, current_price, base_balance):
             if (is_long and is_downtrend) or (not is_long and is_uptrend):
                 log_to_file(f"Wykryto przeciwny trend dla {symbol} po osiągnięciu celu 1 - zamykanie pozycji")
                 closing_side = 'SELL' if is_long else 'BUY'
-                adjusted_quantity = adjust_quantity(symbol, base_balance)
+                adjusted_quantity = adjust_quantity(symbol, get_base_balance(symbol, fresh=True))
                 if adjusted_quantity > 0:
                     try:
                         order = client.create_order(
@@ -505,6 +518,7 @@ def handle_targets(signal, current_price, base_balance):
                             type='MARKET',
                             quantity=adjusted_quantity
                         )
+                        balance_ledger.apply_order_fill(order)
                         log_to_file(f"Zamknięto pozycję dla {symbol} z powodu przeciwnego trendu, ilość: {adjusted_quantity}")
                         signal["status"] = "CLOSED"
                         signal["status_description"] = "Closed due to adverse price trend after target 1"
@@ -539,6 +553,8 @@ def handle_targets(signal, current_price, base_balance):
                         else:
                             log_to_file(f"Błąd anulowania zlecenia: {cancel_error}")
                             raise
+            # Anulowanie odblokowuje środki, a OCO mogło zrealizować się częściowo - aktualne saldo z konta
+            base_balance = get_base_balance(symbol, fresh=True)
 
             # Calculate new OCO levels
             entry_price = float(signal['real_entry'])
@@ -594,6 +610,7 @@ def handle_targets(signal, current_price, base_balance):
 
             if oco_order:
                 signal['oco_order_id'] = oco_order['orderListId']
+                order_mirror.track_oco(oco_order)
                 add_order_to_history(signal, oco_order, "OCO")
                 log_to_file(f"Zaktualizowano OCO dla {symbol} po osiągnięciu targetu: SL={new_stop_loss}, TP={take_profit}, orderListId={oco_order['orderListId']}")
             else:
@@ -601,14 +618,15 @@ def handle_targets(signal, current_price, base_balance):
                 if current_level == 1 and reached_mid_point:
                     log_to_file(f"Nie udało się utworzyć OCO dla {symbol} na poziomie 1 z mid-point - natychmiastowe zamknięcie pozycji")
                     closing_side = 'SELL' if is_long else 'BUY'
-                    adjusted_quantity = adjust_quantity(symbol, base_balance)
+                    adjusted_quantity = adjust_quantity(symbol, get_base_balance(symbol, fresh=True))
                     if adjusted_quantity > 0:
-                        client.create_order(
+                        order = client.create_order(
                             symbol=symbol,
                             side=closing_side,
                             type='MARKET',
                             quantity=adjusted_quantity
                         )
+                        balance_ledger.apply_order_fill(order)
                         log_to_file(f"Natychmiastowe zamknięcie pozycji dla {symbol}, ilość: {adjusted_quantity}")
                     signal["status"] = "CLOSED"
                     signal["status_description"] = "Failed to create OCO at mid-point"
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from common import log_to_file
+from channel_registry import channel_registry
+from message_watermarks import fetch_new_messages
+
+SIGNAL_QUEUE_SIZE = 100  # Maksymalna liczba wiadomości czekających na obsługę
+
+
+class SignalWorkQueue:
+    """
+    Ograniczona kolejka wiadomości do obsłużenia przez handle_* kanałów.
+
+    Pobieranie kanałów tylko wrzuca wiadomości do kolejki, a obsługę (parsowanie, transakcja)
+    wykonuje worker, więc wolny kanał lub wolna transakcja nie wstrzymuje pozostałych kroków.
+    Przy pełnej kolejce put() czeka (backpressure). Wiadomość oczekująca w kolejce nie jest
+    dodawana ponownie, gdy kolejne pobranie zwróci ją jeszcze raz (nie jest jeszcze oznaczona
+    jako obsłużona).
+    """
+
+    def __init__(self, maxsize=SIGNAL_QUEUE_SIZE):
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._pending = set()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    async def put(self, name, handle, message, edited=False):
+        key = (name, message.id, edited)
+        if key in self._pending:
+            return False
+        self._pending.add(key)
+        await self._queue.put((key, handle, message))
+        return True
+
+    async def poll_channel(self, client_telegram, name, handle):
+        """Pobiera nowe wiadomości kanału (powyżej znacznika) i dodaje je do kolejki"""
+        channel = await channel_registry.get_channel(client_telegram, name)
+        if channel is None:
+            log_to_file(f"Kanał '{name}' nie został znaleziony.")
+            return
+        for message in await fetch_new_messages(client_telegram, channel, name):
+            await self.put(name, handle, message)
+
+    async def poll_channels(self, client_telegram, channel_handlers):
+        """Pobiera wszystkie kanały równolegle; błąd jednego kanału nie przerywa pozostałych"""
+        names = list(channel_handlers)
+        results = await asyncio.gather(
+            *(self.poll_channel(client_telegram, name, channel_handlers[name][0]) for name in names),
+            return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                log_to_file(f"Błąd pobierania wiadomości z kanału '{name}': {result}")
+
+    async def worker(self):
+        while True:
+            key, handle, message = await self._queue.get()
+            try:
+                await handle(message, edited=key[2])
+            except Exception as e:
+                log_to_file(f"Błąd obsługi wiadomości {key[1]} z kanału '{key[0]}': {e}")
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+
+async def run_periodic(name, interval, job):
+    """
+    Uruchamia job() co interval sekund (liczone od startu poprzedniego przebiegu).
+    Wyjątek jest logowany i nie zatrzymuje zadania.
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_to_file(f"Błąd zadania okresowego '{name}': {e}")
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
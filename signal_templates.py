@@ -0,0 +1,347 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from common import log_to_file
+
+SIGNAL_TEMPLATES_FILE = 'signal_templates.json'
+TEMPLATE_FIELDS = ('currency', 'signal_type', 'entry', 'targets', 'stop_loss')  # Pola uzupełniane przez model
+COUNTERS_SAVE_INTERVAL = 60  # Sekundy; same liczniki trafień nie są zapisywane przy każdej wiadomości
+TEMPLATE_CONFIRMATIONS = 1  # Zgodne odpowiedzi modelu potrzebne, zanim szablon zastąpi zapytanie
+FILE_LOCK_TIMEOUT = 5  # Sekundy czekania na blokadę pliku szablonów
+STALE_FILE_LOCK_AGE = 30  # Sekundy; starsza blokada pochodzi z przerwanego procesu
+
+# Zmienne miejsca wiadomości: waluta przed USDT, kierunek i liczby. Reszta tekstu to "kształt".
+# Numery etykiet ("Target 2", "TP3", "#1") należą do kształtu, a nie do wartości (L).
+_SLOT_PATTERN = re.compile(
+    r"(?P<C>\b[A-Z0-9]{2,15}(?=/?USDT\b))"
+    r"|(?P<D>\b(?:LONG|SHORT|Long|Short|long|short|BUY|SELL|Buy|Sell|buy|sell)\b)"
+    r"|(?P<L>(?:\b(?:[Tt]arget|TARGET|TP|Tp|tp)\s*|#)\d+(?![\d.]))"
+    r"|(?P<N>\d+(?:\.\d+)?)"
+)
+_DIRECTIONS = {"LONG": "LONG", "BUY": "LONG", "SHORT": "SHORT", "SELL": "SHORT"}
+
+
+def layout_shape(message_text):
+    """
+    (klucz kształtu, wartości miejsc) - wiadomości różniące się tylko walutą, kierunkiem,
+    liczbami i odstępami mają ten sam klucz.
+    """
+    slots = {"C": [], "D": [], "N": []}
+
+    def mask(match):
+        if match.lastgroup == "L":
+            return match.group()
+        slots[match.lastgroup].append(match.group())
+        return "{" + match.lastgroup + "}"
+
+    skeleton = " ".join(_SLOT_PATTERN.sub(mask, message_text).split())
+    return hashlib.sha1(skeleton.encode('utf-8')).hexdigest()[:16], slots
+
+
+def _same_number(token, value):
+    try:
+        return math.isclose(float(token), float(value), rel_tol=1e-9)
+    except (TypeError, ValueError):
+        return False
+
+
+def _number_index(value, slots):
+    """Jedyne miejsce liczby równej value; None, gdy brak lub kilka (położenie niejednoznaczne)"""
+    indexes = [i for i, token in enumerate(slots["N"]) if _same_number(token, value)]
+    return indexes[0] if len(indexes) == 1 else None
+
+
+def _locate(key, value, slots):
+    """Położenie wartości uzupełnionej przez model w miejscach wiadomości albo None"""
+    if key == "currency":
+        base = str(value).upper().replace('/', '').replace('USDT', '')
+        if slots["C"].count(base) == 1:
+            return {"slot": "C", "index": slots["C"].index(base)}
+        return None
+    if key == "signal_type":
+        indexes = [i for i, token in enumerate(slots["D"]) if _DIRECTIONS.get(token.upper()) == str(value).upper()]
+        return {"slot": "D", "index": indexes[0]} if len(indexes) == 1 else None
+    if isinstance(value, list):
+        indexes = []
+        for item in value:
+            index = _number_index(item, slots)
+            if index is None:
+                return None
+            indexes.append(index)
+        return {"slot": "N", "indexes": indexes}
+    index = _number_index(value, slots)
+    return {"slot": "N", "index": index} if index is not None else None
+
+
+def derive_template(slots, partial_signal_data, filled_signal_data):
+    """
+    Szablon dla pól uzupełnionych przez model: pole -> miejsce w wiadomości.
+    None, jeśli któregoś pola nie ma dosłownie w tekście (np. model je wyliczył) albo
+    wartość występuje w kilku miejscach i nie wiadomo, które z nich jest polem.
+    """
+    fields = {}
+    for key in TEMPLATE_FIELDS:
+        value = filled_signal_data.get(key)
+        if partial_signal_data.get(key) is not None or value is None or value == []:
+            continue
+        locator = _locate(key, value, slots)
+        if locator is None:
+            return None
+        fields[key] = locator
+    return fields or None
+
+
+def apply_template(fields, slots):
+    values = {}
+    for key, locator in fields.items():
+        tokens = slots[locator["slot"]]
+        indexes = locator.get("indexes", [locator.get("index")])
+        if any(index is None or index >= len(tokens) for index in indexes):
+            return None
+        if locator["slot"] == "C":
+            values[key] = f"{tokens[indexes[0]]}USDT"
+        elif locator["slot"] == "D":
+            values[key] = _DIRECTIONS[tokens[indexes[0]].upper()]
+        elif "indexes" in locator:
+            values[key] = [float(tokens[index]) for index in indexes]
+        else:
+            values[key] = float(tokens[indexes[0]])
+    return values
+
+
+def _same_value(key, expected, actual):
+    if actual is None:
+        return False
+    if key == "currency":
+        return str(expected).upper().replace('/', '') == str(actual).upper().replace('/', '')
+    if key == "signal_type":
+        return str(expected).upper() == str(actual).upper()
+    if isinstance(expected, list):
+        return (isinstance(actual, list) and len(expected) == len(actual)
+                and all(_same_number(a, b) for a, b in zip(sorted(expected), sorted(map(float, actual)))))
+    return _same_number(expected, actual)
+
+
+def template_agrees(fields, slots, signal_data):
+    """Czy szablon odczytuje z wiadomości te same wartości, które podał model"""
+    values = apply_template(fields, slots)
+    return values is not None and all(_same_value(key, values[key], signal_data.get(key)) for key in fields)
+
+
+@contextmanager
+def _file_lock(path, timeout=FILE_LOCK_TIMEOUT):
+    """Blokada między procesami przez wyłączne utworzenie pliku (O_EXCL) - działa też na Windows"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_FILE_LOCK_AGE:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue  # Blokada zwolniona w międzyczasie
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Blokada {path} zajęta dłużej niż {timeout} s")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _empty_channel():
+    return {"templates": {}, "template_hits": 0, "llm_fallbacks": 0}
+
+
+class SignalTemplates:
+    """
+    Wyuczone szablony układów wiadomości per kanał (signal_templates.json).
+
+    Gdy model uzupełnia brakujące pola, zapamiętywane jest, w którym miejscu wiadomości
+    (która liczba, waluta, kierunek) znalazł każdą wartość. Kolejna wiadomość o tym samym
+    kształcie (layout_shape) jest uzupełniana lokalnie, bez zapytania do modelu - ale dopiero
+    gdy szablon potwierdzi TEMPLATE_CONFIRMATIONS kolejnych odpowiedzi modelu dla tego kształtu.
+    Szablon niezgodny z odpowiedzią modelu jest zastępowany nowym (niepotwierdzonym) albo
+    usuwany; forget() usuwa szablony ręcznie. Liczniki trafień szablonów i odwołań do modelu
+    są zapisywane razem z szablonami (nowy szablon od razu, same trafienia najwyżej raz na
+    COUNTERS_SAVE_INTERVAL).
+
+    Plik może współdzielić kilka procesów: zapis pod blokadą pliku scala zmienione tu szablony
+    i przyrosty liczników ze stanem pliku, a błąd zapisu jest tylko logowany.
+    """
+
+    def __init__(self, path=SIGNAL_TEMPLATES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.channels = self._load()
+        self._changed = {}  # kanał -> kształty zmienione (lub usunięte) od ostatniego zapisu
+        self._deltas = {}  # kanał -> przyrosty liczników od ostatniego zapisu
+        self._saved_at = time.monotonic()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except (OSError, ValueError) as e:
+                log_to_file(f"Nie udało się wczytać {self.path}: {e}")
+        return {}
+
+    def _save(self):
+        """Scala własne zmiany ze stanem pliku i zapisuje wynik (wywoływane pod self._lock)"""
+        self._saved_at = time.monotonic()
+        try:
+            with _file_lock(f"{self.path}.lock"):
+                merged = self._load()
+                for channel, shapes in self._changed.items():
+                    templates = merged.setdefault(channel, _empty_channel())["templates"]
+                    local = self._channel(channel)["templates"]
+                    for shape in shapes:
+                        if shape in local:
+                            templates[shape] = local[shape]
+                        else:
+                            templates.pop(shape, None)
+                for channel, deltas in self._deltas.items():
+                    state = merged.setdefault(channel, _empty_channel())
+                    for counter, delta in deltas.items():
+                        state[counter] = state.get(counter, 0) + delta
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(merged, file, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Zmiany zostają w pamięci i trafią do pliku przy następnym zapisie
+            log_to_file(f"Nie udało się zapisać {self.path}: {e}")
+            return
+        self.channels = merged
+        self._changed.clear()
+        self._deltas.clear()
+
+    def _channel(self, channel):
+        return self.channels.setdefault(channel, _empty_channel())
+
+    def _mark_changed(self, channel, shape):
+        self._changed.setdefault(channel, set()).add(shape)
+
+    def _count(self, channel, counter):
+        self._channel(channel)[counter] += 1
+        deltas = self._deltas.setdefault(channel, {})
+        deltas[counter] = deltas.get(counter, 0) + 1
+
+    def stats(self, channel):
+        with self._lock:
+            state = self._channel(channel)
+            total = state["template_hits"] + state["llm_fallbacks"]
+            return {
+                "templates": len(state["templates"]),
+                "template_hits": state["template_hits"],
+                "llm_fallbacks": state["llm_fallbacks"],
+                "hit_rate": state["template_hits"] / total if total else 0.0,
+            }
+
+    def forget(self, channel, shape=None):
+        """Usuwa szablon kształtu (albo wszystkie szablony kanału); zwraca liczbę usuniętych"""
+        with self._lock:
+            templates = self._channel(channel)["templates"]
+            shapes = [shape] if shape is not None else list(templates)
+            removed = 0
+            for name in shapes:
+                if templates.pop(name, None) is not None:
+                    self._mark_changed(channel, name)
+                    removed += 1
+            if removed:
+                self._save()
+        return removed
+
+    def report(self, channel):
+        stats = self.stats(channel)
+        return (f"Szablony '{channel}': trafienia {stats['template_hits']}, model {stats['llm_fallbacks']} "
+                f"(trafność szablonów {stats['hit_rate']:.0%}, szablonów {stats['templates']})")
+
+    def fill(self, channel, message_text, partial_signal_data, ai_fill):
+        """
+        Uzupełnia brakujące pola szablonem kształtu wiadomości, a gdy go brak lub nie pasuje -
+        przez ai_fill(message_text, partial_signal_data), ucząc się szablonu z odpowiedzi.
+        """
+        shape, slots = layout_shape(message_text)
+        missing = [key for key in TEMPLATE_FIELDS if partial_signal_data.get(key) is None]
+
+        with self._lock:
+            template = self._channel(channel)["templates"].get(shape)
+        confirmed = template is not None and template.get("confirmations", 0) >= TEMPLATE_CONFIRMATIONS
+        if confirmed and all(key in template["fields"] for key in missing):
+            values = apply_template(template["fields"], slots)
+            if values is not None:
+                signal_data = partial_signal_data.copy()
+                for key in missing:
+                    signal_data[key] = values[key]
+                targets = signal_data.get("targets")
+                if targets and signal_data.get("signal_type") in ("LONG", "SHORT"):
+                    signal_data["targets"] = sorted(targets, reverse=signal_data["signal_type"] == "SHORT")
+                with self._lock:
+                    self._count(channel, "template_hits")
+                    stored = self._channel(channel)["templates"].get(shape)
+                    if stored is not None:
+                        stored["hits"] = stored.get("hits", 0) + 1
+                        self._mark_changed(channel, shape)
+                    if time.monotonic() - self._saved_at >= COUNTERS_SAVE_INTERVAL:
+                        self._save()
+                log_to_file(f"Pola {missing} uzupełnione szablonem {shape}. {self.report(channel)}")
+                return signal_data
+
+        signal_data = ai_fill(message_text, partial_signal_data)
+        fields = derive_template(slots, partial_signal_data, signal_data)
+        agrees = template is not None and template_agrees(template["fields"], slots, signal_data)
+        with self._lock:
+            self._count(channel, "llm_fallbacks")
+            templates = self._channel(channel)["templates"]
+            if agrees and shape in templates:
+                templates[shape]["confirmations"] = templates[shape].get("confirmations", 0) + 1
+            elif fields is not None:
+                templates[shape] = {"fields": fields, "learned": datetime.now().isoformat(),
+                                    "hits": 0, "confirmations": 0}
+            elif template is not None:
+                templates.pop(shape, None)
+            self._mark_changed(channel, shape)
+            self._save()
+        if agrees:
+            log_to_file(f"Szablon {shape} zgodny z odpowiedzią modelu. {self.report(channel)}")
+        elif fields is not None:
+            log_to_file(f"Nowy szablon {shape} dla pól {sorted(fields)} (do potwierdzenia). {self.report(channel)}")
+        elif template is not None:
+            log_to_file(f"Szablon {shape} niezgodny z odpowiedzią modelu - usunięty. {self.report(channel)}")
+        else:
+            log_to_file(f"Nie można wyprowadzić szablonu z odpowiedzi modelu ({shape}). {self.report(channel)}")
+        return signal_data
+
+
+signal_templates = SignalTemplates()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from channel_registry import CONFIGURED_CHANNELS
+
+    parser = argparse.ArgumentParser(description="Raport (albo usunięcie) wyuczonych szablonów wiadomości")
+    parser.add_argument("--forget", metavar="KANAŁ", help="usuń szablony kanału")
+    parser.add_argument("--shape", help="usuń tylko szablon tego kształtu (z --forget)")
+    args = parser.parse_args()
+
+    if args.forget:
+        print(f"Usunięte szablony: {signal_templates.forget(args.forget, args.shape)}")
+    for name in CONFIGURED_CHANNELS:
+        print(signal_templates.report(name))
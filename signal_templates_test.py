@@ -0,0 +1,138 @@
+"""
+Test wyuczonych szablonów wiadomości (signal_templates.py) z zamiennikiem zapytania do modelu.
+
+Zamiast modelu test podaje funkcję ai_fill, która zwraca z góry znane wartości pól i liczy
+wywołania. Sprawdzane przypadki:
+- numer etykiety ("Target 2") nie jest brany za wartość pola (entry = 2 przy "Target 2:"),
+- wartość występująca w kilku miejscach wiadomości nie daje szablonu,
+- nowy szablon jest używany dopiero po potwierdzeniu kolejną odpowiedzią modelu,
+- szablon niezgodny z odpowiedzią modelu jest zastępowany,
+- dwa układy wiadomości: liczniki trafień, odwołań do modelu i trafność w raporcie,
+- forget() usuwa szablony kanału,
+- dwie instancje na wspólnym pliku (jak procesy robocze) nie nadpisują sobie szablonów i liczników.
+
+    python signal_templates_test.py
+
+Plik szablonów i log trafiają do katalogu tymczasowego.
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import os
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHANNEL = "Binance Killers®"
+
+LAYOUT_TARGETS = "📍Coin : #{coin}/USDT\nLONG\nTarget 1: {t1}\nTarget 2: {t2}\nEntry: {entry}\nStop: {stop}"
+LAYOUT_TP = "{coin}/USDT SHORT\nEntry zone {entry}\nTP1 {t1}\nTP2 {t2}\nSL {stop}"
+
+
+def make_message(layout, coin, signal_type, entry, t1, t2, stop):
+    text = layout.format(coin=coin, entry=entry, t1=t1, t2=t2, stop=stop)
+    partial = {"currency": f"{coin}USDT", "signal_type": signal_type, "entry": None,
+               "targets": [float(t1), float(t2)], "stop_loss": float(stop)}
+    return text, partial, float(entry)
+
+
+class StandInModel:
+    """Odpowiedzi "modelu" - pole entry z przygotowanej wartości; liczy wywołania"""
+
+    def __init__(self):
+        self.calls = 0
+        self.answer = None
+
+    def __call__(self, message_text, partial_signal_data):
+        self.calls += 1
+        signal_data = partial_signal_data.copy()
+        signal_data["entry"] = self.answer
+        return signal_data
+
+
+def run_checks():
+    from signal_templates import SignalTemplates, apply_template, derive_template, layout_shape
+
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    templates = SignalTemplates(path='signal_templates.json')
+    model = StandInModel()
+
+    def fill(layout, coin, signal_type, entry, t1, t2, stop, answer=None):
+        text, partial, expected = make_message(layout, coin, signal_type, entry, t1, t2, stop)
+        model.answer = expected if answer is None else answer
+        return templates.fill(CHANNEL, text, partial, model)["entry"], expected
+
+    # Układ z etykietami "Target N:" - entry = 2 równa numerowi etykiety "Target 2"
+    fill(LAYOUT_TARGETS, "ARB", "LONG", "2", "2.10", "2.20", "1.8")
+    shape, _ = layout_shape(make_message(LAYOUT_TARGETS, "ARB", "LONG", "2", "2.10", "2.20", "1.8")[0])
+    learned = templates.channels[CHANNEL]["templates"].get(shape, {}).get("fields")
+    _, next_slots = layout_shape(make_message(LAYOUT_TARGETS, "SOL", "LONG", "180", "185", "190", "170")[0])
+    check("numer etykiety 'Target 2' nie jest miejscem pola entry",
+          learned is not None and apply_template(learned, next_slots) == {"entry": 180.0})
+
+    calls = model.calls
+    entry, expected = fill(LAYOUT_TARGETS, "SOL", "LONG", "180", "185", "190", "170")
+    check("niepotwierdzony szablon - pytany jest model", model.calls == calls + 1 and entry == expected)
+
+    calls = model.calls
+    entry, expected = fill(LAYOUT_TARGETS, "ETH", "LONG", "3000", "3100", "3200", "2900")
+    check("potwierdzony szablon uzupełnia entry bez modelu", model.calls == calls and entry == expected)
+
+    # Ta sama liczba w dwóch miejscach - nie wiadomo, które jest polem entry
+    _, slots = layout_shape("BTC/USDT LONG Entry 2 Leverage 2x Target 2.5 Stop 1.5")
+    check("wartość w kilku miejscach nie daje szablonu",
+          derive_template(slots, {"entry": None}, {"entry": 2.0}) is None)
+
+    # Układ TP - pierwsze uczenie, potem odpowiedź modelu niezgodna z szablonem
+    fill(LAYOUT_TP, "SOL", "SHORT", "150", "140", "130", "160")
+    calls = model.calls
+    entry, _ = fill(LAYOUT_TP, "AVAX", "SHORT", "30", "28", "26", "32", answer=28.0)
+    tp_shape, _ = layout_shape(make_message(LAYOUT_TP, "AVAX", "SHORT", "30", "28", "26", "32")[0])
+    replaced = templates.channels[CHANNEL]["templates"].get(tp_shape, {})
+    check("niezgodny szablon zastąpiony nowym, niepotwierdzonym",
+          model.calls == calls + 1 and entry == 28.0 and replaced.get("confirmations") == 0
+          and replaced.get("fields", {}).get("entry") == {"slot": "N", "index": 1})
+
+    fill(LAYOUT_TP, "DOT", "SHORT", "7", "6.5", "6", "7.5", answer=6.5)
+    calls = model.calls
+    entry, _ = fill(LAYOUT_TP, "LINK", "SHORT", "15", "14", "13", "16")
+    check("szablon potwierdzony odpowiedzią modelu jest używany", model.calls == calls and entry == 14.0)
+
+    # Dwa układy: "Target N" - 2 odwołania do modelu i 1 trafienie, "TP" - 3 odwołania i 1 trafienie
+    stats = templates.stats(CHANNEL)
+    check("liczniki trafień i odwołań do modelu dla dwóch układów",
+          stats["templates"] == 2 and stats["template_hits"] == 2 and stats["llm_fallbacks"] == 5)
+    check("trafność szablonów", abs(stats["hit_rate"] - 2 / 7) < 1e-9)
+    check("raport z trafnością", "trafność szablonów 29%" in templates.report(CHANNEL))
+
+    reloaded = SignalTemplates(path='signal_templates.json')
+    check("szablony i liczniki zapisane w pliku", reloaded.stats(CHANNEL)["llm_fallbacks"] == 5)
+
+    check("forget() usuwa szablony kanału", templates.forget(CHANNEL) == 2 and templates.stats(CHANNEL)["templates"] == 0)
+
+    # Dwa procesy (tu dwie instancje) uczą się naraz na wspólnym pliku - zapisy są scalane
+    first = SignalTemplates(path='shared_templates.json')
+    second = SignalTemplates(path='shared_templates.json')
+    for instance, layout, coin in ((first, LAYOUT_TARGETS, "ARB"), (second, LAYOUT_TP, "SOL")):
+        text, partial, expected = make_message(layout, coin, "LONG", "2", "2.10", "2.20", "1.8")
+        model.answer = expected
+        instance.fill(CHANNEL, text, partial, model)
+    shared = SignalTemplates(path='shared_templates.json').stats(CHANNEL)
+    check("wspólny plik zachowuje szablony i liczniki obu procesów",
+          shared["templates"] == 2 and shared["llm_fallbacks"] == 2)
+    check("brak pozostawionych plików tymczasowych i blokady",
+          not [name for name in os.listdir('.') if name.endswith(('.tmp', '.lock'))])
+    return failures
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, PROJECT_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        failures = run_checks()
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+
+from telethon.errors import FloodWaitError
+
+from common import create_telegram_client, log_to_file
+from channel_registry import channel_registry, CONFIGURED_CHANNELS
+
+CORPUS_DIR = 'corpus'
+CURSORS_FILE = 'cursors.json'
+PAGE_SIZE = 100  # Maksymalny rozmiar strony GetHistoryRequest
+PAGE_DELAY = 1.0  # Sekundy przerwy między stronami, aby nie wywoływać FloodWait
+FLOOD_WAIT_MARGIN = 1  # Dodatkowe sekundy ponad czas z FloodWaitError
+
+
+def channel_slug(name):
+    """Nazwa pliku korpusu dla kanału, np. 'Binance Killers®' -> 'binance_killers'"""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def corpus_path(name, corpus_dir=CORPUS_DIR):
+    return os.path.join(corpus_dir, f"{channel_slug(name)}.jsonl.gz")
+
+
+def message_record(name, message):
+    """Rekord korpusu; bez pobierania nadawcy (sender_id wystarcza i nie kosztuje zapytania)"""
+    return {
+        "id": message.id,
+        "channel": name,
+        "date": message.date.isoformat() if message.date else None,
+        "edit_date": message.edit_date.isoformat() if message.edit_date else None,
+        "sender_id": message.sender_id,
+        "text": message.text,
+    }
+
+
+def iter_corpus(name, corpus_dir=CORPUS_DIR):
+    """
+    Rekordy korpusu kanału rosnąco po id, bez duplikatów (wznowienie po przerwie
+    może dopisać ponownie ostatnią stronę).
+    """
+    path = corpus_path(name, corpus_dir)
+    if not os.path.exists(path):
+        return []
+    records = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                records[record["id"]] = record
+    return [records[message_id] for message_id in sorted(records)]
+
+
+class CorpusBackfill:
+    """
+    Pobiera pełną historię kanałów do korpusu corpus/<kanał>.jsonl.gz.
+
+    Plik jest tylko dopisywany (każda strona to osobny człon gzip, zapisany przed przesunięciem
+    kursora). Kursory w corpus/cursors.json pozwalają wznowić pobieranie: najpierw historia
+    wstecz od najnowszej wiadomości (offset_id), a po jej ukończeniu tylko nowe wiadomości (min_id).
+    """
+
+    def __init__(self, client_telegram, corpus_dir=CORPUS_DIR, page_size=PAGE_SIZE, page_delay=PAGE_DELAY):
+        self.client_telegram = client_telegram
+        self.corpus_dir = corpus_dir
+        self.page_size = page_size
+        self.page_delay = page_delay
+        os.makedirs(corpus_dir, exist_ok=True)
+        self.cursors_path = os.path.join(corpus_dir, CURSORS_FILE)
+        self.cursors = self._load_cursors()
+
+    def _load_cursors(self):
+        if os.path.exists(self.cursors_path):
+            with open(self.cursors_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def _save_cursors(self):
+        tmp_path = f"{self.cursors_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.cursors, file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.cursors_path)
+
+    def _append_page(self, name, messages):
+        with gzip.open(corpus_path(name, self.corpus_dir), 'at', encoding='utf-8') as file:
+            for message in messages:
+                file.write(json.dumps(message_record(name, message), ensure_ascii=False) + "\n")
+
+    async def _fetch_page(self, channel, **params):
+        """Jedna strona historii; przy FloodWait czeka wskazany czas i ponawia"""
+        while True:
+            try:
+                return await self.client_telegram.get_messages(channel, limit=self.page_size, **params)
+            except FloodWaitError as e:
+                log_to_file(f"FloodWait podczas pobierania historii - czekam {e.seconds} s")
+                await asyncio.sleep(e.seconds + FLOOD_WAIT_MARGIN)
+
+    async def backfill_channel(self, name, max_messages=None):
+        """Pobiera historię jednego kanału; zwraca liczbę zapisanych wiadomości"""
+        channel = await channel_registry.get_channel(self.client_telegram, name)
+        if channel is None:
+            log_to_file(f"Kanał '{name}' nie został znaleziony - pomijam backfill")
+            return 0
+
+        cursor = self.cursors.setdefault(name, {"oldest_id": None, "newest_id": None, "complete": False})
+        written = 0
+        while max_messages is None or written < max_messages:
+            if not cursor["complete"]:
+                # Historia wstecz: strona starsza niż najstarsza zapisana wiadomość
+                params = {"offset_id": cursor["oldest_id"]} if cursor["oldest_id"] else {}
+                messages = await self._fetch_page(channel, **params)
+            else:
+                # Historia kompletna: tylko wiadomości nowsze niż ostatnio zapisana
+                messages = await self._fetch_page(channel, min_id=cursor["newest_id"] or 0, reverse=True)
+
+            messages = [message for message in messages if message]
+            if not messages:
+                if cursor["complete"]:
+                    break
+                cursor["complete"] = True
+                self._save_cursors()
+                continue
+
+            self._append_page(name, messages)
+            ids = [message.id for message in messages]
+            if cursor["oldest_id"] is not None:
+                ids.append(cursor["oldest_id"])
+            if cursor["newest_id"] is not None:
+                ids.append(cursor["newest_id"])
+            cursor["oldest_id"] = min(ids)
+            cursor["newest_id"] = max(ids)
+            self._save_cursors()
+            written += len(messages)
+            await asyncio.sleep(self.page_delay)
+
+        log_to_file(f"Backfill '{name}': zapisano {written} wiadomości")
+        return written
+
+    async def backfill(self, names=CONFIGURED_CHANNELS, max_messages=None):
+        totals = {}
+        for name in names:
+            totals[name] = await self.backfill_channel(name, max_messages)
+        return totals
+
+
+async def run_backfill(names, max_messages=None):
+    client_telegram = create_telegram_client('session_name')
+    async with client_telegram:
+        totals = await CorpusBackfill(client_telegram).backfill(names, max_messages)
+    for name, count in totals.items():
+        print(f"{name}: {count} nowych wiadomości -> {corpus_path(name)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pobiera historię kanałów Telegram do korpusu JSONL (gzip)")
+    parser.add_argument('--channel', action='append', help="Nazwa kanału (domyślnie wszystkie skonfigurowane)")
+    parser.add_argument('--max-messages', type=int, default=None, help="Limit wiadomości na kanał w tym przebiegu")
+    args = parser.parse_args()
+    asyncio.run(run_backfill(args.channel or CONFIGURED_CHANNELS, args.max_messages))
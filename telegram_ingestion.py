@@ -0,0 +1,89 @@
+import asyncio
+
+from telethon import events
+
+from common import log_to_file
+from channel_registry import channel_registry, CRYPTO_SIGNALS_CHANNEL, BINANCE_KILLERS_CHANNEL
+from crypto_signals_channel import handle_crypto_signals_message, check_crypto_signals_messages
+from binance_killers_signal_chanel import handle_binance_killers_message, check_binance_killers_signals_messages
+
+CATCH_UP_INTERVAL = 300  # Sekundy między przebiegami pollingu uzupełniającego
+
+# Kanał -> (obsługa pojedynczej wiadomości, polling uzupełniający)
+DEFAULT_CHANNEL_HANDLERS = {
+    CRYPTO_SIGNALS_CHANNEL: (handle_crypto_signals_message, check_crypto_signals_messages),
+    BINANCE_KILLERS_CHANNEL: (handle_binance_killers_message, check_binance_killers_signals_messages),
+}
+
+
+class TelegramIngestion:
+    """
+    Odbiór wiadomości sterowany zdarzeniami Telethon (NewMessage/MessageEdited).
+
+    Nowe i edytowane wiadomości trafiają od razu do handle_* danego kanału. Polling
+    (dotychczasowe check_*) zostaje jako ścieżka uzupełniająca: przy starcie, po ponownym
+    połączeniu i co catch_up_interval sekund, aby wyłapać wiadomości z przerw w połączeniu.
+    Z podaną work_queue (SignalWorkQueue) zdarzenia i polling tylko dodają wiadomości do kolejki.
+    """
+
+    def __init__(self, client_telegram, channel_handlers=None, catch_up_interval=CATCH_UP_INTERVAL, work_queue=None):
+        self.client_telegram = client_telegram
+        self.channel_handlers = channel_handlers or DEFAULT_CHANNEL_HANDLERS
+        self.catch_up_interval = catch_up_interval
+        self.work_queue = work_queue
+        self._task = None
+
+    def _make_handler(self, name, handle, edited):
+        async def on_message(event):
+            try:
+                if self.work_queue is not None:
+                    await self.work_queue.put(name, handle, event.message, edited=edited)
+                else:
+                    await handle(event.message, edited=edited)
+            except Exception as e:
+                log_to_file(f"Błąd obsługi wiadomości z kanału '{name}': {e}")
+        return on_message
+
+    async def start(self):
+        for name, (handle, _) in self.channel_handlers.items():
+            channel = await channel_registry.get_channel(self.client_telegram, name)
+            if channel is None:
+                log_to_file(f"Kanał '{name}' nie został znaleziony - pomijam subskrypcję zdarzeń")
+                continue
+            self.client_telegram.add_event_handler(
+                self._make_handler(name, handle, edited=False), events.NewMessage(chats=channel)
+            )
+            self.client_telegram.add_event_handler(
+                self._make_handler(name, handle, edited=True), events.MessageEdited(chats=channel)
+            )
+            log_to_file(f"Subskrypcja zdarzeń kanału '{name}' aktywna")
+
+        await self.catch_up()
+        self._task = asyncio.create_task(self._catch_up_loop())
+        return self._task
+
+    async def catch_up(self):
+        """Jednorazowy polling wszystkich kanałów; wiadomości już obsłużone są pomijane"""
+        if self.work_queue is not None:
+            await self.work_queue.poll_channels(self.client_telegram, self.channel_handlers)
+            return
+        for name, (_, check) in self.channel_handlers.items():
+            try:
+                await check(self.client_telegram)
+            except Exception as e:
+                log_to_file(f"Błąd pollingu uzupełniającego kanału '{name}': {e}")
+
+    async def _catch_up_loop(self):
+        was_connected = True
+        elapsed = 0
+        while True:
+            await asyncio.sleep(1)
+            elapsed += 1
+            connected = self.client_telegram.is_connected()
+            reconnected = connected and not was_connected
+            was_connected = connected
+            if connected and (reconnected or elapsed >= self.catch_up_interval):
+                if reconnected:
+                    log_to_file("Ponowne połączenie z Telegramem - polling uzupełniający")
+                elapsed = 0
+                await self.catch_up()
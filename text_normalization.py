@@ -0,0 +1,81 @@
+import re
+
+# Znaki zamieniane lub usuwane: homoglify z cyrylicy, twarde i wąskie spacje, znaki zerowej
+# szerokości, selektory wariantu emoji (✅ i 🔥 zostają, znika tylko U+FE0F), typograficzne
+# myślniki oraz emoji-wskaźnik, który psuł dopasowania liczb. Dodatkowo pozostałości mojibake
+# w wiadomościach tylko częściowo uszkodzonych ('đź' to początek emoji zdekodowanego jako cp1250;
+# całe wiadomości naprawia repair_mojibake).
+REPLACEMENTS = {
+    'х': 'x', 'Х': 'X',  # cyrylickie "х" w "10х"
+    '\u00a0': ' ', '\u2002': ' ', '\u2003': ' ', '\u2007': ' ', '\u2009': ' ', '\u200a': ' ', '\u202f': ' ',
+    '\t': ' ',
+    '\u200b': '', '\u200c': '', '\u200d': '', '\u2060': '', '\ufeff': '',
+    '\ufe0e': '', '\ufe0f': '',
+    '\r': '',
+    '\u2013': '-', '\u2014': '-', '\u2212': '-',
+    '\U0001f449': '',  # 👉
+    'ń…': 'x', 'đź': '',
+}
+
+# Pojedyncze znaki: jedna prekompilowana klasa znaków - tekst przechodzony jest raz, a funkcja
+# zamiany wywoływana tylko dla (rzadkich) dopasowań. Szybsze niż str.translate z tabelą-słownikiem.
+# Ciągi wieloznakowe są zamieniane osobno (alternatywa w tym samym wzorcu kilkukrotnie go spowalnia).
+_REPLACEMENT_PATTERN = re.compile("[" + "".join(re.escape(key) for key in REPLACEMENTS if len(key) == 1) + "]")
+_MULTI_CHAR_REPLACEMENTS = tuple((key, value) for key, value in REPLACEMENTS.items() if len(key) > 1)
+
+# Ciągi spacji zwijane do jednej, spacje na końcu linii usuwane (podział na linie zostaje)
+_SPACE_RUNS = re.compile(r" +(\n|$)| {2,}")
+
+MOJIBAKE_ENCODINGS = ('latin1', 'cp1250')
+_MOJIBAKE_MAX_CHAR = '\u2122'  # Najwyższy znak kodowań z MOJIBAKE_ENCODINGS ("™" w cp1250)
+
+
+def repair_mojibake(text):
+    """
+    UTF-8 błędnie zdekodowany jako latin1 albo cp1250 - naprawiany tylko wtedy, gdy cały tekst
+    daje się zakodować z powrotem i poprawnie odczytać jako UTF-8 (poprawny tekst zostaje bez zmian).
+    """
+    if text.isascii():
+        return text
+    for encoding in MOJIBAKE_ENCODINGS:
+        try:
+            return text.encode(encoding).decode('utf-8')
+        except UnicodeEncodeError as e:
+            # Znak spoza wszystkich kodowań (np. emoji) - pozostałych prób nie ma sensu robić
+            if text[e.start] > _MOJIBAKE_MAX_CHAR:
+                return text
+        except UnicodeDecodeError:
+            continue
+    return text
+
+
+def _replace(match):
+    return REPLACEMENTS[match.group()]
+
+
+def _replace_characters(text):
+    for key, value in _MULTI_CHAR_REPLACEMENTS:
+        if key in text:
+            text = text.replace(key, value)
+    return _REPLACEMENT_PATTERN.sub(_replace, text)
+
+
+def _fold_spaces(match):
+    return match.group(1) if match.group(1) is not None else " "
+
+
+def normalize_signal_text(text):
+    """
+    Jednolita normalizacja wiadomości przed klasyfikacją i parsowaniem: naprawa mojibake,
+    zamiana znaków i zwinięcie odstępów. Dla tekstu już znormalizowanego nic nie zmienia.
+    Kosztowne kroki są pomijane, gdy szybkie sprawdzenia (isascii, `in`) wykluczają ich potrzebę.
+    """
+    if not text:
+        return ""
+    if not text.isascii():
+        text = _replace_characters(repair_mojibake(text))
+    elif '\t' in text or '\r' in text:
+        text = _REPLACEMENT_PATTERN.sub(_replace, text)
+    if "  " in text or " \n" in text:
+        text = _SPACE_RUNS.sub(_fold_spaces, text)
+    return text.strip()
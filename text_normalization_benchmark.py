@@ -0,0 +1,89 @@
+"""
+Wzorcowe wyniki (golden) i benchmark normalizacji tekstu wiadomości (text_normalization.py).
+
+Plik text_normalization_golden.json zawiera pary wejście -> oczekiwany wynik
+normalize_signal_text. Wejścia "real-*" to wiadomości ze zrzutów last_5_messages.json
+i last_5_telegram_messages.json; wejścia "constructed-*" są skonstruowane ręcznie
+(mojibake latin1/cp1250, twarde spacje, znaki zerowej szerokości, CRLF, cyrylickie "х"),
+bo zrzuty nie zawierają uszkodzonych wiadomości. Oczekiwane wyniki były sprawdzane ręcznie;
+--update nadpisuje je bieżącymi wynikami i wymaga ponownego przejrzenia zmian w pliku.
+
+Benchmark porównuje jeden etap normalizacji z poprzednią normalizacją w parserach
+(latin1 -> utf-8 dla Binance Killers i łańcuch str.replace dla Bybit). Poprzednia robiła
+mniej (bez odstępów, znaków niewidocznych i cp1250), więc jest szybsza; ważne, żeby koszt
+jednego etapu pozostał mały wobec samego parsowania (parser_benchmark.py).
+
+    python text_normalization_benchmark.py --repeat 2000
+
+Kod wyjścia 1 oznacza rozbieżność z wynikami wzorcowymi.
+"""
+import argparse
+import json
+import sys
+import time
+
+from text_normalization import normalize_signal_text
+
+GOLDEN_FILE = 'text_normalization_golden.json'
+
+
+def legacy_normalize(message_text):
+    """Suma poprzednich normalizacji z parse_binance_killers_signal_message i parse_signal_message_byBit_standard"""
+    try:
+        message_text = message_text.encode('latin1').decode('utf-8')
+    except Exception:
+        pass
+    return message_text.replace('ń…', 'x').replace('đź', '').replace('х', 'x').replace('👉', '')
+
+
+def load_golden(path=GOLDEN_FILE):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def check_golden(golden):
+    """Lista identyfikatorów wpisów, dla których wynik różni się od wzorca"""
+    failures = []
+    for entry in golden:
+        actual = normalize_signal_text(entry["input"])
+        if actual != entry["expected"]:
+            failures.append(entry["id"])
+            print(f"RÓŻNICA {entry['id']}:\n  oczekiwane: {entry['expected']!r}\n  otrzymane:  {actual!r}")
+        elif normalize_signal_text(actual) != actual:
+            failures.append(entry["id"])
+            print(f"NIEIDEMPOTENTNE {entry['id']}: {actual!r}")
+    return failures
+
+
+def measure(normalize, texts, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            normalize(text)
+    return repeat * len(texts) / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Wzorcowe wyniki i benchmark normalizacji tekstu")
+    parser.add_argument('--golden', default=GOLDEN_FILE)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--update', action='store_true', help="Zapisz bieżące wyniki jako wzorcowe")
+    args = parser.parse_args()
+
+    golden = load_golden(args.golden)
+    if args.update:
+        for entry in golden:
+            entry["expected"] = normalize_signal_text(entry["input"])
+        with open(args.golden, 'w', encoding='utf-8') as file:
+            json.dump(golden, file, indent=4, ensure_ascii=False)
+        print(f"Zaktualizowano {len(golden)} wyników wzorcowych - przejrzyj zmiany przed zatwierdzeniem")
+
+    failures = check_golden(golden)
+    print(f"Wyniki wzorcowe: {len(golden) - len(failures)}/{len(golden)} zgodnych")
+
+    texts = [entry["input"] for entry in golden]
+    legacy_rate = measure(legacy_normalize, texts, args.repeat)
+    rate = measure(normalize_signal_text, texts, args.repeat)
+    print(f"Poprzednia normalizacja w parserach: {legacy_rate:,.0f} wiadomości/s")
+    print(f"normalize_signal_text: {rate:,.0f} wiadomości/s ({rate / legacy_rate:.1f}x)")
+    sys.exit(1 if failures else 0)
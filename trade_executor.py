@@ -0,0 +1,77 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from binance_trading import execute_trade
+from common import log_to_file, store_signal, MAX_HISTORY_SIZE
+
+# Jeden wątek: transakcje wykonują się poza pętlą zdarzeń, ale nadal kolejno (saldo konta).
+# Plik historii sygnałów chroni history_lock - piszą do niego także monitor i przetwarzanie wiadomości
+TRADE_WORKERS = 1
+
+LAG_SAMPLE_INTERVAL = 0.1  # Sekundy między próbkami opóźnienia pętli
+LAG_REPORT_INTERVAL = 300  # Sekundy między wpisami do logu
+LAG_MAX_SAMPLES = 3000
+
+trade_pool = ThreadPoolExecutor(max_workers=TRADE_WORKERS, thread_name_prefix="trade")
+
+
+async def execute_trade_async(signal, percentage=20):
+    """
+    Wykonuje execute_trade w dedykowanej puli wątków i zwraca jego wynik.
+    Blokujące zapytania REST nie zatrzymują pętli Telethon (aktualizacje, keepalive).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(trade_pool, execute_trade, signal, percentage)
+
+
+async def record_signal_async(signal):
+    """
+    Zapisuje sygnał w historii po transakcji (wczytanie -> zmiana -> zapis pod history_lock).
+    Historia jest wczytywana dopiero teraz, więc zmiany monitora i execute_trade z czasu
+    transakcji zostają. Poza pętlą zdarzeń, bo blokadę może trzymać cykl monitorowania.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, store_signal, signal, True, MAX_HISTORY_SIZE)
+
+
+class EventLoopLagMonitor:
+    """
+    Mierzy opóźnienie pętli zdarzeń: o ile później niż zaplanowano budzi się asyncio.sleep.
+    Wartości bliskie zeru oznaczają, że nic nie blokuje pętli; sekundy - blokujące wywołanie.
+    """
+
+    def __init__(self, interval=LAG_SAMPLE_INTERVAL, report_interval=LAG_REPORT_INTERVAL, max_samples=LAG_MAX_SAMPLES):
+        self.interval = interval
+        self.report_interval = report_interval
+        self._samples = deque(maxlen=max_samples)
+
+    def stats(self):
+        """{'samples', 'p50', 'p99', 'max'} w milisekundach albo None bez próbek"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return {
+            'samples': len(ordered),
+            'p50': ordered[len(ordered) // 2] * 1000,
+            'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            'max': ordered[-1] * 1000,
+        }
+
+    async def run(self):
+        last_report = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._samples.append(max(0.0, now - started - self.interval))
+
+            if now - last_report >= self.report_interval:
+                stats = self.stats()
+                log_to_file(
+                    f"Opóźnienie pętli zdarzeń: p50={stats['p50']:.1f} ms, "
+                    f"p99={stats['p99']:.1f} ms, max={stats['max']:.1f} ms ({stats['samples']} próbek)"
+                )
+                self._samples.clear()
+                last_report = now
@@ -0,0 +1,110 @@
+import threading
+
+TRADES_PAGE_LIMIT = 1000  # Maksymalny limit myTrades/allOrders w jednym zapytaniu
+MAX_RECORDS_PER_SYMBOL = 2000
+
+ACTIVE_ORDER_STATUSES = ('NEW', 'PARTIALLY_FILLED', 'PENDING_NEW', 'PENDING_CANCEL')
+
+
+class TradeHistoryCache:
+    """
+    Lokalna, przyrostowa historia transakcji i zleceń per para.
+
+    Dla każdej pary pamiętany jest kursor (ostatnie id transakcji, najstarsze wciąż aktywne
+    id zlecenia), więc kolejne synchronizacje pobierają tylko nowsze rekordy (fromId/orderId)
+    zamiast całej historii. Zapytania "czy zlecenie X zostało zrealizowane i po jakiej cenie"
+    obsługiwane są z lokalnego indeksu.
+    """
+
+    def __init__(self, client, max_records=MAX_RECORDS_PER_SYMBOL):
+        self.client = client
+        self.max_records = max_records
+        self._lock = threading.RLock()
+        self._trades = {}        # symbol -> {trade_id: trade}
+        self._trade_cursor = {}  # symbol -> ostatnie znane id transakcji
+        self._orders = {}        # symbol -> {order_id: order}
+        self._order_cursor = {}  # symbol -> id, od którego pobierać przy następnej synchronizacji
+
+    @staticmethod
+    def _trim(records, max_records):
+        if len(records) > max_records:
+            for key in sorted(records)[:len(records) - max_records]:
+                del records[key]
+
+    def sync_trades(self, symbol):
+        """Dociąga transakcje nowsze niż kursor pary"""
+        with self._lock:
+            trades = self._trades.setdefault(symbol, {})
+            cursor = self._trade_cursor.get(symbol)
+            while True:
+                if cursor is None:
+                    page = self.client.get_my_trades(symbol=symbol, limit=TRADES_PAGE_LIMIT)
+                else:
+                    page = self.client.get_my_trades(symbol=symbol, fromId=cursor + 1, limit=TRADES_PAGE_LIMIT)
+                for trade in page:
+                    trades[trade['id']] = trade
+                if page:
+                    cursor = max(trade['id'] for trade in page)
+                    self._trade_cursor[symbol] = cursor
+                if len(page) < TRADES_PAGE_LIMIT:
+                    break
+            self._trim(trades, self.max_records)
+
+    def sync_orders(self, symbol, start_time=None):
+        """
+        Dociąga zlecenia od kursora pary. Kursor wskazuje najstarsze zlecenie wciąż aktywne,
+        aby zmiany statusu (np. NEW -> FILLED) także zostały pobrane.
+        """
+        with self._lock:
+            orders = self._orders.setdefault(symbol, {})
+            cursor = self._order_cursor.get(symbol)
+            while True:
+                if cursor is None:
+                    # Bez jawnego limitu Binance zwraca 500 rekordów - pełna strona wyglądałaby na ostatnią
+                    params = {'symbol': symbol, 'limit': TRADES_PAGE_LIMIT}
+                    if start_time is not None:
+                        params['startTime'] = start_time
+                    page = self.client.get_all_orders(**params)
+                else:
+                    page = self.client.get_all_orders(symbol=symbol, orderId=cursor, limit=TRADES_PAGE_LIMIT)
+                for order in page:
+                    orders[order['orderId']] = order
+                if page:
+                    cursor = max(order['orderId'] for order in page) + 1
+                if len(page) < TRADES_PAGE_LIMIT:
+                    break
+
+            active_ids = [order_id for order_id, order in orders.items() if order['status'] in ACTIVE_ORDER_STATUSES]
+            if active_ids:
+                cursor = min(active_ids)
+            if cursor is not None:
+                self._order_cursor[symbol] = cursor
+            self._trim(orders, self.max_records)
+
+    def get_order_fill(self, symbol, order_id, sync=True):
+        """
+        Zwraca realizację zlecenia z lokalnego indeksu transakcji:
+        {'price' (średnia), 'executedQty', 'time' (ostatniej transakcji)} albo None.
+        """
+        if sync:
+            self.sync_trades(symbol)
+        with self._lock:
+            fills = [t for t in self._trades.get(symbol, {}).values() if t.get('orderId') == order_id]
+        quantity = sum(float(t['qty']) for t in fills)
+        if quantity <= 0:
+            return None
+        quote = sum(float(t['quoteQty']) if 'quoteQty' in t else float(t['qty']) * float(t['price']) for t in fills)
+        return {
+            'price': quote / quantity,
+            'executedQty': quantity,
+            'time': max(t['time'] for t in fills),
+        }
+
+    def get_orders(self, symbol, start_time=None):
+        """Zlecenia pary (rosnąco po orderId), opcjonalnie od start_time (ms)"""
+        self.sync_orders(symbol, start_time)
+        with self._lock:
+            orders = [self._orders[symbol][order_id] for order_id in sorted(self._orders.get(symbol, {}))]
+        if start_time is not None:
+            orders = [order for order in orders if order.get('time', 0) >= start_time]
+        return orders
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import threading
+import time
+
+from common import client, log_to_file, testmode
+
+LIVE_USER_STREAM_URL = 'wss://stream.binance.com:9443/ws'
+TESTNET_USER_STREAM_URL = 'wss://testnet.binance.vision/ws'
+
+LISTEN_KEY_KEEPALIVE = 30 * 60  # Sekundy; listenKey wygasa po 60 minutach
+RECONNECT_DELAY = 5  # Sekundy
+
+LIST_ACTIVE = "ACTIVE"
+LIST_DONE = "DONE"
+
+ACTIVE_ORDER_STATUSES = ('NEW', 'PARTIALLY_FILLED', 'PENDING_NEW', 'PENDING_CANCEL')
+
+
+class OrderStateMirror:
+    """
+    Lokalne odbicie stanu zleceń i list OCO zasilane zdarzeniami executionReport/listStatus.
+
+    Sprawdzenie, czy OCO zostało zrealizowane i po jakiej cenie, to odczyt z pamięci bez
+    zapytań REST. Mirror jest wiarygodny tylko przy aktywnym strumieniu (`synced`);
+    dla list, o których nic nie wie, zwraca None i wywołujący używa ścieżki REST.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = {}
+        self._lists = {}
+        self._listeners = []
+        self.synced = False
+
+    def add_listener(self, callback):
+        """Rejestruje callback(order_state) wywoływany po każdym executionReport"""
+        self._listeners.append(callback)
+
+    def _list_entry(self, order_list_id, symbol):
+        return self._lists.setdefault(order_list_id, {
+            "symbol": symbol,
+            "orderListId": order_list_id,
+            "listStatusType": None,
+            "listOrderStatus": None,
+            "orderIds": set(),
+        })
+
+    def apply_execution_report(self, event):
+        order_list_id = event.get("g", -1)
+        order = {
+            "symbol": event["s"],
+            "orderId": event["i"],
+            "orderListId": order_list_id,
+            "side": event.get("S"),
+            "type": event.get("o"),
+            "status": event.get("X"),
+            "executionType": event.get("x"),
+            "origQty": float(event.get("q", 0)),
+            "executedQty": float(event.get("z", 0)),
+            "cummulativeQuoteQty": float(event.get("Z", 0)),
+            "lastPrice": float(event.get("L", 0)),
+            "lastQty": float(event.get("l", 0)),
+            "commission": float(event.get("n") or 0),
+            "commissionAsset": event.get("N"),
+            "time": event.get("T") or event.get("E"),
+        }
+        with self._lock:
+            self._orders[order["orderId"]] = order
+            if order_list_id not in (None, -1):
+                self._list_entry(order_list_id, order["symbol"])["orderIds"].add(order["orderId"])
+
+        for listener in self._listeners:
+            try:
+                listener(order)
+            except Exception as e:
+                log_to_file(f"Błąd listenera executionReport: {e}")
+
+    def apply_list_status(self, event):
+        with self._lock:
+            entry = self._list_entry(event["g"], event["s"])
+            entry["listStatusType"] = event.get("l")
+            entry["listOrderStatus"] = event.get("L")
+            for order in event.get("O", []):
+                entry["orderIds"].add(order["i"])
+
+    def track_oco(self, oco_order):
+        """Zapisuje OCO z odpowiedzi create_oco_order_direct, zanim przyjdą zdarzenia strumienia"""
+        with self._lock:
+            entry = self._list_entry(oco_order["orderListId"], oco_order.get("symbol"))
+            entry["listStatusType"] = entry["listStatusType"] or oco_order.get("listStatusType")
+            entry["listOrderStatus"] = entry["listOrderStatus"] or oco_order.get("listOrderStatus")
+            for report in oco_order.get("orderReports") or []:
+                entry["orderIds"].add(report["orderId"])
+                self._orders.setdefault(report["orderId"], {
+                    "symbol": report["symbol"],
+                    "orderId": report["orderId"],
+                    "orderListId": oco_order["orderListId"],
+                    "side": report.get("side"),
+                    "type": report.get("type"),
+                    "status": report.get("status"),
+                    "origQty": float(report.get("origQty", 0)),
+                    "executedQty": float(report.get("executedQty", 0)),
+                    "cummulativeQuoteQty": float(report.get("cummulativeQuoteQty", 0)),
+                    "time": report.get("transactTime"),
+                })
+
+    def seed_open_orders(self, open_orders):
+        """Uzupełnia stan o otwarte zlecenia pobrane przez REST po (ponownym) połączeniu"""
+        open_list_ids = {order.get("orderListId") for order in open_orders}
+        with self._lock:
+            # Listy uznawane za aktywne, których nie ma wśród otwartych zleceń, mogły zostać
+            # zrealizowane podczas przerwy - zapominamy je, aby wywołujący użył ścieżki REST
+            for order_list_id, entry in list(self._lists.items()):
+                if order_list_id not in open_list_ids and entry["listOrderStatus"] != "ALL_DONE":
+                    del self._lists[order_list_id]
+            for order in open_orders:
+                order_list_id = order.get("orderListId", -1)
+                self._orders[order["orderId"]] = {
+                    "symbol": order["symbol"],
+                    "orderId": order["orderId"],
+                    "orderListId": order_list_id,
+                    "side": order.get("side"),
+                    "type": order.get("type"),
+                    "status": order.get("status"),
+                    "origQty": float(order.get("origQty", 0)),
+                    "executedQty": float(order.get("executedQty", 0)),
+                    "cummulativeQuoteQty": float(order.get("cummulativeQuoteQty", 0)),
+                    "time": order.get("updateTime") or order.get("time"),
+                }
+                if order_list_id not in (None, -1):
+                    entry = self._list_entry(order_list_id, order["symbol"])
+                    entry["orderIds"].add(order["orderId"])
+                    entry["listOrderStatus"] = entry["listOrderStatus"] or "EXECUTING"
+
+    def get_order(self, order_id):
+        with self._lock:
+            order = self._orders.get(order_id)
+            return dict(order) if order else None
+
+    def list_state(self, order_list_id):
+        """LIST_ACTIVE, LIST_DONE albo None, jeśli mirror nie zna tej listy"""
+        if order_list_id is None:
+            return None
+        with self._lock:
+            entry = self._lists.get(order_list_id)
+            if entry is None:
+                return None
+            if entry["listOrderStatus"] == "ALL_DONE" or entry["listStatusType"] == "ALL_DONE":
+                return LIST_DONE
+            statuses = [self._orders[i]["status"] for i in entry["orderIds"] if i in self._orders]
+            if statuses and all(status not in ACTIVE_ORDER_STATUSES for status in statuses):
+                return LIST_DONE
+            return LIST_ACTIVE
+
+    def get_list_fill(self, order_list_id):
+        """
+        Zwraca zrealizowaną nogę OCO w formacie używanym przez update_signal_with_profit_info
+        ({'price', 'executedQty', 'type', 'time'}) albo None.
+        """
+        with self._lock:
+            entry = self._lists.get(order_list_id)
+            if entry is None:
+                return None
+            legs = [self._orders[i] for i in entry["orderIds"] if i in self._orders]
+
+        filled = [leg for leg in legs if leg["executedQty"] > 0]
+        if not filled:
+            return None
+        leg = max(filled, key=lambda o: o["executedQty"])
+        return {
+            'price': leg["cummulativeQuoteQty"] / leg["executedQty"],
+            'executedQty': leg["executedQty"],
+            'type': leg["type"],
+            'time': leg["time"],
+            'orderId': leg["orderId"],
+        }
+
+
+order_mirror = OrderStateMirror()
+
+
+class UserDataStream:
+    """
+    Strumień danych użytkownika Binance (listenKey) zasilający OrderStateMirror.
+
+    Zdarzenia inne niż executionReport/listStatus (np. outboundAccountPosition)
+    przekazywane są do zarejestrowanych handlerów przez on_event(), a zmiany stanu
+    synchronizacji (True po połączeniu, False po rozłączeniu) - do handlerów on_sync().
+    """
+
+    def __init__(self, mirror=None, url=None, rest_client=None):
+        self.mirror = mirror or order_mirror
+        self._sync_handlers = []
+        self.base_url = url or (TESTNET_USER_STREAM_URL if testmode else LIVE_USER_STREAM_URL)
+        self.rest_client = rest_client or client
+        self._handlers = {}
+        self._listen_key = None
+        self._running = False
+        self._ws = None
+
+    def on_event(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def on_sync(self, handler):
+        self._sync_handlers.append(handler)
+
+    def _set_synced(self, synced):
+        self.mirror.synced = synced
+        for handler in self._sync_handlers:
+            try:
+                handler(synced)
+            except Exception as e:
+                log_to_file(f"Błąd obsługi zmiany synchronizacji strumienia: {e}")
+
+    def _dispatch(self, raw):
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        # Format nowego WebSocket API opakowuje zdarzenie w "event"
+        event = event.get("event", event)
+        event_type = event.get("e")
+        if event_type == "executionReport":
+            self.mirror.apply_execution_report(event)
+        elif event_type == "listStatus":
+            self.mirror.apply_list_status(event)
+        for handler in self._handlers.get(event_type, []):
+            try:
+                handler(event)
+            except Exception as e:
+                log_to_file(f"Błąd obsługi zdarzenia {event_type}: {e}")
+
+    async def _keepalive(self):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE)
+            try:
+                await loop.run_in_executor(None, lambda: self.rest_client.stream_keepalive(self._listen_key))
+            except Exception as e:
+                log_to_file(f"Błąd odświeżania listenKey: {e}")
+
+    async def run(self):
+        """Pętla połączenia; działa do wywołania stop()"""
+        # websockets jest potrzebny tylko przy włączonym strumieniu - moduły handlu importują stąd order_mirror
+        import websockets
+
+        self._running = True
+        loop = asyncio.get_running_loop()
+        keepalive_task = None
+        while self._running:
+            try:
+                self._listen_key = await loop.run_in_executor(None, self.rest_client.stream_get_listen_key)
+                if keepalive_task is None:
+                    keepalive_task = asyncio.create_task(self._keepalive())
+                async with websockets.connect(f"{self.base_url}/{self._listen_key}", ping_interval=20) as ws:
+                    self._ws = ws
+                    # Zdarzenia sprzed połączenia nie dotrą - uzupełniamy stan otwartych zleceń przez REST
+                    open_orders = await loop.run_in_executor(None, self.rest_client.get_open_orders)
+                    self.mirror.seed_open_orders(open_orders)
+                    self._set_synced(True)
+                    log_to_file("Połączono ze strumieniem danych użytkownika")
+                    async for raw in ws:
+                        self._dispatch(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_to_file(f"Strumień danych użytkownika rozłączony: {e}")
+            finally:
+                self._set_synced(False)
+                self._ws = None
+            if self._running:
+                await asyncio.sleep(RECONNECT_DELAY)
+        if keepalive_task is not None:
+            keepalive_task.cancel()
+
+    async def stop(self):
+        self._running = False
+        if self._ws is not None:
+            await self._ws.close()
+
+
+class MockUserDataServer:
+    """
+    Lokalny zamiennik strumienia danych użytkownika do testów offline.
+    Klient łączy się pod url/<dowolny listenKey>, a push() rozsyła zdarzenie do wszystkich klientów.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._clients = set()
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        import websockets
+
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handler(self, websocket, path=None):
+        self._clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._clients.discard(websocket)
+
+    async def push(self, event):
+        event.setdefault("E", int(time.time() * 1000))
+        for websocket in list(self._clients):
+            await websocket.send(json.dumps(event))
+
+
+class MockRestClient:
+    """Minimalny zamiennik klienta REST dla UserDataStream w testach offline"""
+
+    def __init__(self, open_orders=None):
+        self.open_orders = open_orders or []
+
+    def stream_get_listen_key(self):
+        return "mock-listen-key"
+
+    def stream_keepalive(self, listen_key):
+        return {}
+
+    def get_open_orders(self, **params):
+        return list(self.open_orders)
@@ -0,0 +1,156 @@
+"""
+Test śledzenia OCO ze strumienia danych użytkownika (user_data_stream.py) na lokalnych zamiennikach.
+
+UserDataStream łączy się z MockUserDataServer (REST przez MockRestClient), a test wysyła
+sekwencję zdarzeń jak Binance przy realizacji OCO: executionReport obu nóg (NEW),
+listStatus EXEC_STARTED, executionReport realizacji nogi LIMIT_MAKER (częściowo, potem FILLED),
+executionReport wygaśnięcia nogi STOP_LOSS_LIMIT i listStatus ALL_DONE. Sprawdzane jest, co
+OrderStateMirror zwraca po każdym kroku (list_state, get_list_fill) oraz zachowanie po
+ponownym połączeniu (seed_open_orders zapomina listy, które zniknęły z otwartych zleceń).
+Księga sald podłączona przez on_sync sprawdza, że odczyt fresh=True pobiera snapshot
+get_account tylko bez zsynchronizowanego strumienia.
+
+    python user_data_stream_test.py
+
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import user_data_stream
+from balance_ledger import BalanceLedger
+from user_data_stream import (LIST_ACTIVE, LIST_DONE, MockRestClient, MockUserDataServer, OrderStateMirror,
+                              UserDataStream)
+
+WAIT_TIMEOUT = 5  # Sekundy na dotarcie zdarzenia
+
+SYMBOL = "ARBUSDT"
+LIST_ID = 9001
+TAKE_PROFIT_ID = 501
+STOP_LOSS_ID = 502
+
+
+def execution_report(order_id, order_type, status, execution_type, executed_qty=0.0, quote_qty=0.0, last_price=0.0):
+    return {
+        "e": "executionReport", "s": SYMBOL, "i": order_id, "g": LIST_ID, "S": "SELL", "o": order_type,
+        "X": status, "x": execution_type, "q": "100.0", "z": str(executed_qty), "Z": str(quote_qty),
+        "L": str(last_price), "l": "0", "n": "0", "N": None, "T": 1700000000000,
+    }
+
+
+def list_status(status_type, order_status):
+    return {
+        "e": "listStatus", "s": SYMBOL, "g": LIST_ID, "c": "OCO", "l": status_type, "L": order_status,
+        "O": [{"s": SYMBOL, "i": TAKE_PROFIT_ID, "c": "tp"}, {"s": SYMBOL, "i": STOP_LOSS_ID, "c": "sl"}],
+    }
+
+
+async def wait_for(condition, timeout=WAIT_TIMEOUT):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def run_checks():
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    user_data_stream.RECONNECT_DELAY = 0.1
+
+    server = await MockUserDataServer().start()
+    port = server.port
+    mirror = OrderStateMirror()
+    rest_client = MockRestClient()
+    stream = UserDataStream(mirror=mirror, url=server.url, rest_client=rest_client)
+    reports = []
+    mirror.add_listener(reports.append)
+    positions = []
+    stream.on_event('outboundAccountPosition', positions.append)
+    # Księga sald zasilana strumieniem jak w main.py; liczymy snapshoty get_account
+    account_calls = []
+    account_client = SimpleNamespace(get_account=lambda: account_calls.append(1) or {
+        "balances": [{"asset": "ARB", "free": "100.0", "locked": "0.0"}]})
+    ledger = BalanceLedger(account_client, metadata=None)
+    stream.on_event('outboundAccountPosition', ledger.apply_account_position)
+    stream.on_sync(ledger.set_stream_synced)
+    ledger.get_free("ARB", fresh=True)
+    check("bez strumienia fresh=True pobiera snapshot", len(account_calls) == 1)
+    task = asyncio.create_task(stream.run())
+
+    check("mirror zsynchronizowany po połączeniu", await wait_for(lambda: mirror.synced and server._clients))
+    calls = len(account_calls)
+    ledger.get_free("ARB", fresh=True)
+    check("po połączeniu księga pobiera jeden nowy snapshot", len(account_calls) == calls + 1)
+    check("nieznana lista -> None (ścieżka REST)", mirror.list_state(LIST_ID) is None)
+
+    await server.push(execution_report(TAKE_PROFIT_ID, "LIMIT_MAKER", "NEW", "NEW"))
+    await server.push(execution_report(STOP_LOSS_ID, "STOP_LOSS_LIMIT", "NEW", "NEW"))
+    await server.push(list_status("EXEC_STARTED", "EXECUTING"))
+    await wait_for(lambda: len(reports) == 2)
+    check("po złożeniu OCO lista aktywna", mirror.list_state(LIST_ID) == LIST_ACTIVE)
+    check("brak realizacji przed wykonaniem", mirror.get_list_fill(LIST_ID) is None)
+
+    await server.push(execution_report(TAKE_PROFIT_ID, "LIMIT_MAKER", "PARTIALLY_FILLED", "TRADE", 40.0, 44.0, 1.1))
+    await wait_for(lambda: len(reports) == 3)
+    check("częściowa realizacja - lista nadal aktywna", mirror.list_state(LIST_ID) == LIST_ACTIVE)
+    partial = mirror.get_list_fill(LIST_ID)
+    check("częściowa realizacja widoczna w get_list_fill",
+          partial is not None and partial["executedQty"] == 40.0 and abs(partial["price"] - 1.1) < 1e-9)
+
+    await server.push(execution_report(TAKE_PROFIT_ID, "LIMIT_MAKER", "FILLED", "TRADE", 100.0, 111.0, 1.12))
+    await server.push(execution_report(STOP_LOSS_ID, "STOP_LOSS_LIMIT", "EXPIRED", "EXPIRED"))
+    await server.push(list_status("ALL_DONE", "ALL_DONE"))
+    await wait_for(lambda: len(reports) == 5)
+    await asyncio.sleep(0.1)
+    check("po ALL_DONE lista zakończona", mirror.list_state(LIST_ID) == LIST_DONE)
+    fill = mirror.get_list_fill(LIST_ID)
+    check("realizacja: noga LIMIT_MAKER, średnia cena z Z/z",
+          fill is not None and fill["type"] == "LIMIT_MAKER" and fill["orderId"] == TAKE_PROFIT_ID
+          and fill["executedQty"] == 100.0 and abs(fill["price"] - 1.11) < 1e-9)
+    check("stan nogi STOP_LOSS_LIMIT zapisany", (mirror.get_order(STOP_LOSS_ID) or {}).get("status") == "EXPIRED")
+    check("listenery dostają każdy executionReport", [r["status"] for r in reports] ==
+          ["NEW", "NEW", "PARTIALLY_FILLED", "FILLED", "EXPIRED"])
+
+    await server.push({"e": "outboundAccountPosition", "B": [{"a": "USDT", "f": "111.0", "l": "0.0"}]})
+    check("inne zdarzenia trafiają do handlerów on_event", await wait_for(lambda: len(positions) == 1))
+    calls = len(account_calls)
+    ledger.get_free("USDT", fresh=True)
+    check("przy zsynchronizowanym strumieniu fresh=True czyta z księgi bez get_account",
+          len(account_calls) == calls and ledger.get_free("USDT", fresh=True) == 111.0)
+
+    # Druga lista aktywna w chwili zerwania połączenia; po ponownym połączeniu nie ma jej
+    # wśród otwartych zleceń, więc mogła zostać zrealizowana w przerwie - mirror ją zapomina
+    mirror.track_oco({"orderListId": LIST_ID + 1, "symbol": SYMBOL, "listStatusType": "EXEC_STARTED",
+                      "listOrderStatus": "EXECUTING",
+                      "orderReports": [{"symbol": SYMBOL, "orderId": 601, "type": "LIMIT_MAKER", "status": "NEW"}]})
+    check("OCO z odpowiedzi REST aktywne przed zdarzeniami", mirror.list_state(LIST_ID + 1) == LIST_ACTIVE)
+
+    await server.stop()
+    check("po rozłączeniu mirror niezsynchronizowany", await wait_for(lambda: not mirror.synced))
+    calls = len(account_calls)
+    ledger.get_free("ARB", fresh=True)
+    check("po rozłączeniu fresh=True znowu pobiera snapshot", len(account_calls) == calls + 1)
+    server = await MockUserDataServer(port=port).start()
+    check("ponowne połączenie", await wait_for(lambda: mirror.synced and server._clients))
+    check("lista spoza otwartych zleceń zapomniana po ponownym połączeniu", mirror.list_state(LIST_ID + 1) is None)
+    check("zakończona lista zostaje zakończona", mirror.list_state(LIST_ID) == LIST_DONE)
+
+    await stream.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await server.stop()
+    return failures
+
+
+if __name__ == '__main__':
+    failures = asyncio.run(run_checks())
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,168 @@
+"""
+Test bezpieczeństwa webhooka: spreparowany POST /webhook nie może doprowadzić do transakcji.
+
+Uruchamia aplikację Flask z server.py i WebhookWorker z prawdziwą obsługą wiadomości
+(handle_message -> dyspozytor -> parsery -> przetwarzanie sygnału). Zamiast Telegrama
+worker "pobiera" wiadomości kanału z listy w teście, a execute_trade_async we wszystkich
+modułach przetwarzających sygnały jest zastąpione rejestratorem wywołań - nic nie trafia do Binance.
+
+Sprawdzane przypadki:
+- payload z pełnym sygnałem, którego nie ma w kanale -> brak transakcji,
+- payload z sygnałem innego formatu niż kanał -> brak transakcji,
+- payload-wyzwalacz, gdy w kanale jest prawdziwy sygnał -> transakcja tylko na sygnale z kanału,
+- payload z nazwą kanału spoza konfiguracji -> kanał nie jest nawet pobierany,
+- wiadomość w kanale w formacie innego kanału -> brak transakcji (tylko CHANNEL_FORMATS kanału),
+- payload z message/chat innym niż obiekt -> "ignored" zamiast błędu 500,
+- drugi proces handlujący (main.py przy działającym server.py) nie dostaje blokady.
+
+    python webhook_forged_post_test.py
+
+Pliki stanu (historia sygnałów, odciski, log) trafiają do katalogu tymczasowego.
+Kod wyjścia 1 oznacza niespełnione sprawdzenie.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_FILE = os.path.join(PROJECT_DIR, 'parser_corpus.json')
+
+
+def load_sample(entry_id):
+    with open(CORPUS_FILE, 'r', encoding='utf-8') as file:
+        return next(entry for entry in json.load(file) if entry["id"] == entry_id)
+
+
+def post(url, payload):
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def post_status(url, payload):
+    """Kod odpowiedzi i pole status z treści"""
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, json.loads(response.read()).get("status")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def make_payload(channel, text):
+    return {"message": {"message_id": 1, "date": int(time.time()), "chat": {"title": channel}, "text": text}}
+
+
+def run_checks():
+    from werkzeug.serving import make_server
+
+    import server
+    from signal_dispatcher import _ROUTES, classify_message
+
+    failures = []
+
+    def check(name, passed):
+        print(f"{'OK' if passed else 'BŁĄD'}: {name}")
+        if not passed:
+            failures.append(name)
+
+    trades = []
+
+    async def record_trade(signal, percentage=20):
+        trades.append(signal)
+        return True
+
+    import importlib
+    for module_name, _, _ in _ROUTES.values():
+        importlib.import_module(module_name).execute_trade_async = record_trade
+
+    channel_messages = {}
+    fetched_channels = []
+
+    class StandInWorker(server.WebhookWorker):
+        """Worker bez połączenia z Telegramem; wiadomości kanału pochodzą z channel_messages"""
+
+        async def _connect(self):
+            self.client = None
+
+        async def fetch_signals(self, channel_name, formats):
+            # Jak process_signals: tylko wiadomości w formatach kanału
+            fetched_channels.append(channel_name)
+            return [message for message in channel_messages.get(channel_name, [])
+                    if classify_message(message["text"], formats)]
+
+    worker = StandInWorker()
+    worker.start()
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    url = f"http://127.0.0.1:{http_server.server_port}/webhook"
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    crypto = load_sample('constructed-crypto-1')
+    killers = load_sample('constructed-killers-1')
+    genuine = load_sample('constructed-crypto-2')
+
+    status = post(url, make_payload(crypto["channel"], crypto["text"]))
+    server.webhook_queue.join()
+    check("spreparowany sygnał przyjęty tylko jako powiadomienie (202)", status == 202)
+    check("sygnał spoza kanału nie prowadzi do transakcji", not trades)
+
+    post(url, make_payload(crypto["channel"], killers["text"]))
+    server.webhook_queue.join()
+    check("sygnał innego formatu nie prowadzi do transakcji", not trades)
+
+    channel_messages[genuine["channel"]] = [{"text": genuine["text"], "date": "2025-01-01T00:00:00+00:00"}]
+    post(url, make_payload(genuine["channel"], crypto["text"]))
+    server.webhook_queue.join()
+    check("transakcja tylko na sygnale pobranym z kanału",
+          [signal["currency"] for signal in trades] == [genuine["expected"]["currency"]])
+
+    trades.clear()
+    post(url, make_payload("Fake Pump Channel", crypto["text"]))
+    server.webhook_queue.join()
+    check("nieskonfigurowany kanał nie jest pobierany", "Fake Pump Channel" not in fetched_channels)
+    check("nieskonfigurowany kanał nie prowadzi do transakcji", not trades)
+
+    # Sygnał Binance Killers opublikowany w kanale Crypto Signals nie pasuje do jego formatów
+    channel_messages[genuine["channel"]] = [{"text": killers["text"], "date": "2025-01-02T00:00:00+00:00"}]
+    post(url, make_payload(genuine["channel"], ""))
+    server.webhook_queue.join()
+    check("format innego kanału nie prowadzi do transakcji", not trades)
+
+    malformed = [
+        {"message": {"chat": None, "text": crypto["text"]}},
+        {"message": "tekst"},
+        {"message": {"chat": "Crypto Signals", "text": crypto["text"]}},
+    ]
+    check("payload z message/chat innym niż obiekt -> ignored",
+          all(post_status(url, payload) == (200, "ignored") for payload in malformed))
+
+    http_server.shutdown()
+    worker.stop()
+
+    from common import claim_trading_process
+    check("proces handlujący zajmuje blokadę", claim_trading_process("server.py"))
+    other = subprocess.run([sys.executable, "-c", "import sys; from common import claim_trading_process; "
+                            "sys.exit(0 if claim_trading_process('main.py') else 3)"],
+                           env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}, capture_output=True)
+    check("drugi proces handlujący nie dostaje blokady", other.returncode == 3)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, PROJECT_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        failures = run_checks()
+    print(f"Niespełnione sprawdzenia: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,93 @@
+"""
+Test obciążeniowy webhooka na lokalnym zamienniku.
+
+Uruchamia aplikację Flask z server.py na lokalnym porcie z workerem, który zamiast Telegrama
+i Binance wykonuje handler-atrapę (stały czas obsługi), a następnie wysyła równolegle zapytania
+POST /webhook. Raportuje przepustowość przyjmowania (zapytania/s), opóźnienia odpowiedzi
+(p50/p99) oraz czas, po którym worker obsłużył całą kolejkę.
+
+    python webhook_load_test.py --requests 2000 --concurrency 32 --work-ms 5
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+import server
+
+
+def make_payload(i):
+    return {
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": {"title": "Crypto Signals"},
+            "text": f"Crypto Signal Alert: #{i}",
+        }
+    }
+
+
+def post(url, payload):
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load_test(total_requests, concurrency, work_ms, port=0):
+    def stand_in_handler(message):
+        time.sleep(work_ms / 1000)
+
+    worker = server.WebhookWorker(handler=stand_in_handler)
+    worker.start()
+
+    http_server = make_server('127.0.0.1', port, server.app, threaded=True)
+    url = f"http://127.0.0.1:{http_server.server_port}/webhook"
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: post(url, make_payload(i)), range(total_requests)))
+    accept_elapsed = time.perf_counter() - started
+
+    server.webhook_queue.join()
+    drain_elapsed = time.perf_counter() - started
+
+    http_server.shutdown()
+    worker.stop()
+
+    latencies = [latency for _, latency in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"Zapytania: {total_requests}, równoległość: {concurrency}, czas obsługi atrapy: {work_ms} ms")
+    print(f"Statusy: {statuses}")
+    print(f"Przyjmowanie: {total_requests / accept_elapsed:.0f} zapytań/s ({accept_elapsed:.2f} s)")
+    print(f"Opóźnienie odpowiedzi: p50={percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f} ms, max={max(latencies) * 1000:.1f} ms")
+    print(f"Worker obsłużył {worker.processed} wiadomości w {drain_elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test obciążeniowy webhooka na lokalnym zamienniku")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--work-ms', type=float, default=5.0, help="Czas obsługi jednej wiadomości przez atrapę")
+    args = parser.parse_args()
+    run_load_test(args.requests, args.concurrency, args.work_ms)